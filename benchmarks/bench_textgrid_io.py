@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.textgrid_io import TextGrid, IntervalTier, read_textgrid, write_textgrid
+
+"""
+Benchmark common/textgrid_io.py against praatio on a large synthetic TextGrid.
+The TextGrid has the word/syllable/phonetic/error tiers produced by csv_to_textgrid, with a configurable number of
+words. Timed operations: reading, writing (long format), and cropping one sub-TextGrid per phonetic interval
+(the work crop_textgrid does). praatio is optional; without it only the in-house timings are reported.
+
+CLI usage example:
+python bench_textgrid_io.py --words 20000 --repeat 3
+"""
+
+
+def make_textgrid(words, seed=0):
+    """A TextGrid with `words` labelled words separated by silences, two syllables per word."""
+    rng = random.Random(seed)
+    word_entries, syllable_entries, phonetic_entries, error_entries = [], [], [], []
+    time_now = 0.0
+    for index in range(words):
+        silence_end = round(time_now + rng.uniform(0.2, 1.0), 3)
+        word_end = round(silence_end + rng.uniform(0.3, 0.8), 3)
+        middle = round((silence_end + word_end) / 2, 3)
+        for entries in (word_entries, syllable_entries, phonetic_entries, error_entries):
+            entries.append((time_now, silence_end, ""))
+        word_entries.append((silence_end, word_end, f"word{index % 40}"))
+        syllable_entries += [(silence_end, middle, "s1"), (middle, word_end, "s2")]
+        phonetic_entries.append((silence_end, word_end, "k, ʌ, p"))
+        error_entries.append((silence_end, word_end, ""))
+        time_now = word_end
+    tiers = [IntervalTier.from_entries(name, entries, 0, time_now) for name, entries in
+             [("word", word_entries), ("syllable", syllable_entries), ("phonetic", phonetic_entries), ("error", error_entries)]]
+    return TextGrid(0, time_now, tiers)
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(words, repeat, crop_limit):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "large.TextGrid")
+        write_textgrid(make_textgrid(words), path)
+        tg = read_textgrid(path)
+        windows = list(zip(tg.get_tier("phonetic").starts.tolist(), tg.get_tier("phonetic").ends.tolist()))[:crop_limit]
+        print(f"{words} words, {sum(len(tier) for tier in tg)} intervals, {os.path.getsize(path) / 1e6:.1f} MB; "
+              f"cropping {len(windows)} windows; best of {repeat}")
+
+        results = [
+            ("read", "textgrid_io", best_of(repeat, lambda: read_textgrid(path))),
+            ("write", "textgrid_io", best_of(repeat, lambda: write_textgrid(tg, os.path.join(directory, "out.TextGrid")))),
+            ("crop", "textgrid_io", best_of(repeat, lambda: [tg.crop(start, end, rebase_to_zero=True) for start, end in windows])),
+        ]
+        try:
+            from praatio import textgrid as praatio_textgrid
+        except ImportError:
+            print("praatio is not installed: skipping the comparison.")
+        else:
+            praatio_tg = praatio_textgrid.openTextgrid(path, includeEmptyIntervals=True)
+            results += [
+                ("read", "praatio", best_of(repeat, lambda: praatio_textgrid.openTextgrid(path, includeEmptyIntervals=True))),
+                ("write", "praatio", best_of(repeat, lambda: praatio_tg.save(os.path.join(directory, "out.TextGrid"),
+                                                                             format="long_textgrid", includeBlankSpaces=False))),
+                ("crop", "praatio", best_of(repeat, lambda: [praatio_tg.crop(start, end, mode="truncated", rebaseToZero=False)
+                                                             for start, end in windows])),
+            ]
+
+    print(f"{'operation':<10}{'library':<14}{'seconds':>10}")
+    for operation, library, seconds in sorted(results):
+        print(f"{operation:<10}{library:<14}{seconds:>10.4f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the in-house TextGrid reader/writer against praatio.")
+    parser.add_argument('--words', type=int, default=20000, help="Number of words in the synthetic TextGrid.")
+    parser.add_argument('--repeat', type=int, default=3, help="Repetitions per operation (the best time is reported).")
+    parser.add_argument('--crop-limit', type=int, default=500, help="Number of phonetic intervals to crop.")
+    args = parser.parse_args()
+    run(args.words, args.repeat, args.crop_limit)
+
+
+if __name__ == '__main__':
+    main()
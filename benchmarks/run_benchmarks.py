@@ -0,0 +1,163 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from collections import defaultdict
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.append(ROOT)
+from benchmarks.synthetic_corpus import generate_corpus
+from data_prepprocessing import preprocessing_audio, crop_textgrid
+from data_annotation import csv_to_textgrid
+from data_analysis import AI_clinician_agreement
+
+"""
+Benchmark suite for the pipeline, run on a synthetic corpus (synthetic_corpus.py).
+
+Each benchmark times one entry point over the whole corpus (best of --repeat runs), reports its throughput in
+natural units (words, clips, seconds of audio, files...) and measures the peak Python heap of one extra run with
+tracemalloc (NumPy buffers included). Results are written as JSON; with --baseline they are compared with a saved
+run, and a throughput drop or a peak-memory growth beyond --tolerance is reported as a regression (exit code 1).
+Save a baseline on the machine the comparisons will run on: timings do not transfer between machines.
+
+Benchmarks: extract_syllables, extract_words, resample_audio, segment_audio, crop_textgrid, read_csv, process_stage.
+
+CLI usage example:
+python run_benchmarks.py --save-baseline baseline.json
+python run_benchmarks.py --baseline baseline.json --output latest.json
+python run_benchmarks.py --only segment_audio crop_textgrid --duration 600 --words-per-minute 30
+"""
+
+
+def setup_benchmarks(items, corpus_root, work_directory):
+    """name -> (function running the benchmark over the corpus, units processed per run, unit name)."""
+    textgrids = [item["textgrid_path"] for item in items]
+    words = sum(len(item["words"]) for item in items)
+    audio_seconds = sum(preprocessing_audio.sf.info(item["audio_path"]).duration for item in items)
+    boundaries = {item["textgrid_path"]: preprocessing_audio.extract_words(item["textgrid_path"]) for item in items}
+    clips = sum(len(boundaries[path]) for path in textgrids)
+    # segment_audio cuts the resampled recordings, as in process_audio
+    resampled = {item["audio_path"]: preprocessing_audio.resample_audio(item["audio_path"]) for item in items}
+    agreement_files = defaultdict(list)
+    for item in items:
+        for path, stage_name in item["agreement_files"]:
+            agreement_files[stage_name].append(path)
+    ground_truth = AI_clinician_agreement.load_ground_truth(os.path.join(corpus_root, "stages_words.csv"))
+
+    def segment():
+        for item in items:
+            preprocessing_audio.segment_audio(resampled[item["audio_path"]], boundaries[item["textgrid_path"]], item["children_type"],
+                                              item["band_id"], item["participant_id"], item["audio_id"],
+                                              output_directory_base=work_directory)
+
+    def crop():
+        for item in items:
+            crop_textgrid.crop_textgrid(crop_textgrid.load_textgrid_file(item["textgrid_path"]), "phonetic",
+                                        os.path.join(work_directory, "rebase_to_zero_TG"), item["participant_id"], item["audio_id"])
+
+    def agreement():
+        for stage_name, files in agreement_files.items():
+            AI_clinician_agreement.process_stage(files, stage_name, ground_truth)
+
+    return {
+        "extract_syllables": (lambda: [preprocessing_audio.extract_syllables(path) for path in textgrids], words, "words"),
+        "extract_words": (lambda: [preprocessing_audio.extract_words(path) for path in textgrids], words, "words"),
+        "resample_audio": (lambda: [preprocessing_audio.resample_audio(item["audio_path"]) for item in items], audio_seconds, "audio seconds"),
+        "segment_audio": (segment, clips, "clips"),
+        "crop_textgrid": (crop, words, "crops"),
+        "read_csv": (lambda: [csv_to_textgrid.read_csv(item["csv_path"]) for item in items], words, "rows"),
+        "process_stage": (agreement, sum(len(files) for files in agreement_files.values()), "files"),
+    }
+
+
+def measure(function, units, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    best = min(timings)
+    return {"seconds": best, "throughput": units / best if best > 0 else float("inf"), "units": units, "peak_memory_mb": peak / 2 ** 20}
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against a baseline: (benchmark, metric, baseline value, current value)."""
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        reference = baseline.get("benchmarks", {}).get(name)
+        if reference is None:
+            continue
+        if result["throughput"] < reference["throughput"] * (1 - tolerance):
+            regressions.append((name, "throughput", reference["throughput"], result["throughput"]))
+        if result["peak_memory_mb"] > reference["peak_memory_mb"] * (1 + tolerance):
+            regressions.append((name, "peak_memory_mb", reference["peak_memory_mb"], result["peak_memory_mb"]))
+    return regressions
+
+
+def run(participants, recordings, duration, words_per_minute, repeat, only=None):
+    work_directory = tempfile.mkdtemp(prefix="smaat_bench_")
+    try:
+        corpus_root = os.path.join(work_directory, "corpus")
+        items = generate_corpus(corpus_root, participants, recordings, duration, words_per_minute)
+        benchmarks = setup_benchmarks(items, corpus_root, os.path.join(work_directory, "output"))
+        results = {
+            "corpus": {"participants": participants, "recordings": recordings, "duration": duration, "words_per_minute": words_per_minute},
+            "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+            "benchmarks": {},
+        }
+        for name, (function, units, unit) in benchmarks.items():
+            if only and name not in only:
+                continue
+            results["benchmarks"][name] = dict(measure(function, units, repeat), unit=unit)
+        return results
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the preprocessing, annotation and analysis entry points on a synthetic corpus.")
+    parser.add_argument('--participants', type=int, default=2, help="Participants in the synthetic corpus.")
+    parser.add_argument('--recordings', type=int, default=2, help="Recordings per participant.")
+    parser.add_argument('--duration', type=float, default=300.0, help="Length of each recording in seconds.")
+    parser.add_argument('--words-per-minute', type=float, default=20, help="Word density of the recordings.")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per benchmark (the best is kept).")
+    parser.add_argument('--only', nargs='+', help="Only run these benchmarks.")
+    parser.add_argument('--output', type=str, default=None, help="Write the results to this JSON file.")
+    parser.add_argument('--baseline', type=str, default=None, help="Compare with the results saved in this JSON file.")
+    parser.add_argument('--save-baseline', type=str, default=None, help="Save the results as the new baseline to this JSON file.")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Relative throughput drop or memory growth reported as a regression.")
+    args = parser.parse_args()
+
+    results = run(args.participants, args.recordings, args.duration, args.words_per_minute, args.repeat, args.only)
+
+    print(f"{'benchmark':<20}{'seconds':>10}{'throughput':>14}  {'unit':<16}{'peak MB':>9}")
+    for name, result in results["benchmarks"].items():
+        print(f"{name:<20}{result['seconds']:>10.4f}{result['throughput']:>14.1f}  {result['unit'] + '/s':<16}{result['peak_memory_mb']:>9.1f}")
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, metric, reference, current in regressions:
+            print(f"REGRESSION {name} {metric}: {reference:.2f} -> {current:.2f}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression beyond {args.tolerance:.0%} against {args.baseline}.")
+
+
+if __name__ == '__main__':
+    main()
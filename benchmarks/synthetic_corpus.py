@@ -0,0 +1,217 @@
+import os
+import sys
+import random
+import argparse
+import numpy as np
+import soundfile as sf
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.textgrid_io import TextGrid, IntervalTier, write_textgrid
+from data_analysis.ipa_normalization import ipa_to_cv
+
+"""
+Generate a synthetic SMAAT corpus for benchmarks and smoke tests.
+
+For every participant and recording it writes, in the layout the pipeline reads:
+    <root>/<children_type>/<band_id>/new_TG/<participant_id>/<audio_id>.wav        PCM_16 noise + tones
+    <root>/<children_type>/<band_id>/new_TG/<participant_id>/<audio_id>.TextGrid   word/syllable/phonetic/error tiers
+    <root>/<children_type>/<band_id>/new_TG/<participant_id>/<audio_id>.csv        Premiere marker export (read_csv input)
+    <root>/<children_type>/<band_id>/<participant_id>/ml_tg_no_max_before_using_smaat/*.TextGrid   one per word, with
+        phoneme_ipa/structure/phonetic tiers as AI_clinician_agreement reads them
+and once for the corpus <root>/stages_words.csv, the ground truth of the PROMPT words used.
+
+The annotated TextGrid has the tiers csv_to_textgrid.generate_textgrid creates (silences as empty intervals between
+words), filled in the way the annotators do: one phonetic interval per word ("k, ʌ, p") and one syllable interval
+per syllable. Word times are whole 60 fps frames, so the CSV timecodes convert back to the TextGrid times exactly.
+Length is set by the recording duration and density by the number of words per minute.
+
+CLI usage example:
+python synthetic_corpus.py /tmp/synthetic_corpus --participants 4 --recordings 2 --duration 300 --words-per-minute 30
+"""
+
+FRAME_RATE = 60
+
+# PROMPT words: stage, IPA phonemes and syllable count
+LEXICON = {
+    "ba": ("stage3", ["b", "a"], 1),
+    "eye": ("stage3", ["aɪ"], 1),
+    "map": ("stage3", ["m", "æ", "p"], 1),
+    "papa": ("stage3", ["p", "a", "p", "a"], 2),
+    "boy": ("stage4", ["b", "ɔɪ"], 1),
+    "peep": ("stage4", ["p", "i", "p"], 1),
+    "moon": ("stage4", ["m", "u", "n"], 1),
+    "fish": ("stage4", ["f", "ɪ", "ʃ"], 1),
+    "ten": ("stage5", ["t", "ɛ", "n"], 1),
+    "sun": ("stage5", ["s", "ʌ", "n"], 1),
+    "cake": ("stage5", ["k", "eɪ", "k"], 1),
+    "cupcake": ("stage6", ["k", "ʌ", "p", "k", "eɪ", "k"], 2),
+    "robot": ("stage6", ["r", "oʊ", "b", "ɒ", "t"], 2),
+    "banana": ("stage6", ["b", "ə", "n", "a", "n", "ə"], 3),
+    "umbrella": ("stage6", ["ʌ", "m", "b", "r", "ɛ", "l", "ə"], 3),
+}
+SUBSTITUTES = ["p", "b", "t", "d", "k", "m", "n", "w", "a", "ə", "ɪ", "ʌ"]
+
+
+def timecode(seconds):
+    """HH:MM:SS:FF at FRAME_RATE, the format convert_time_format reads."""
+    frames = int(round(seconds * FRAME_RATE))
+    return f"{frames // (3600 * FRAME_RATE):02d}:{frames // (60 * FRAME_RATE) % 60:02d}:{frames // FRAME_RATE % 60:02d}:{frames % FRAME_RATE:02d}"
+
+
+def plan_words(duration, words_per_minute, rng):
+    """(onset, offset, word) of the words of a recording, on whole frames, spread over its duration."""
+    total_frames = int(duration * FRAME_RATE)
+    # frames from one onset to the next; words last 1/4 to 1/2 s and silences at least 1/10 s
+    period = int(60 * FRAME_RATE / words_per_minute)
+    shortest_silence = FRAME_RATE // 10
+    words = []
+    frame = 0
+    names = sorted(LEXICON)
+    while True:
+        onset = frame + rng.randint(max(shortest_silence, period - 3 * FRAME_RATE // 4), max(shortest_silence, period - FRAME_RATE // 4))
+        offset = onset + rng.randint(FRAME_RATE // 4, FRAME_RATE // 2)
+        if offset >= total_frames - FRAME_RATE // 10:
+            break
+        words.append((onset / FRAME_RATE, offset / FRAME_RATE, rng.choice(names)))
+        frame = offset
+    return words
+
+
+def annotated_textgrid(words, duration):
+    """The word/syllable/phonetic/error TextGrid of a recording."""
+    word_entries, syllable_entries, phonetic_entries, error_entries = [], [], [], []
+    previous = 0.0
+    for onset, offset, word in words:
+        for entries in (word_entries, syllable_entries, phonetic_entries, error_entries):
+            entries.append((previous, onset, ''))
+        _, phonemes, syllables = LEXICON[word]
+        word_entries.append((onset, offset, word))
+        phonetic_entries.append((onset, offset, ", ".join(phonemes)))
+        error_entries.append((onset, offset, ''))
+        bounds = np.linspace(onset, offset, syllables + 1)
+        for index, part in enumerate(np.array_split(np.array(phonemes, dtype=object), syllables)):
+            syllable_entries.append((float(bounds[index]), offset if index == syllables - 1 else float(bounds[index + 1]), "".join(part)))
+        previous = offset
+    for entries in (word_entries, syllable_entries, phonetic_entries, error_entries):
+        entries.append((previous, duration, ''))
+    tiers = [IntervalTier.from_entries(name, entries, 0, duration) for name, entries in
+             [("word", word_entries), ("syllable", syllable_entries), ("phonetic", phonetic_entries), ("error", error_entries)]]
+    return TextGrid(0, duration, tiers)
+
+
+def prediction_textgrid(word, rng, error_rate=0.2):
+    """A model output TextGrid for one word: the label phonemes with random substitutions and deletions."""
+    _, phonemes, _ = LEXICON[word]
+    predicted = []
+    for phoneme in phonemes:
+        draw = rng.random()
+        if draw < error_rate / 2:
+            continue
+        predicted.append(rng.choice(SUBSTITUTES) if draw < error_rate else phoneme)
+    predicted = predicted or [phonemes[0]]
+    step = 0.1
+    duration = step * len(predicted) + 0.2
+    prediction = [(0.1 + i * step, 0.1 + (i + 1) * step, phoneme) for i, phoneme in enumerate(predicted)]
+    tiers = [
+        IntervalTier.from_entries("phoneme_ipa", prediction, 0, duration),
+        IntervalTier.from_entries("structure", [(start, end, ipa_to_cv(phoneme)) for start, end, phoneme in prediction], 0, duration),
+        IntervalTier.from_entries("phonetic", [(0.1, duration - 0.1, ", ".join(phonemes))], 0, duration),
+    ]
+    return TextGrid(0, duration, tiers)
+
+
+def write_wav(path, duration, sample_rate, words, rng, block_seconds=30):
+    """Low-level noise with a tone burst per word, written block by block so memory stays flat."""
+    generator = np.random.default_rng(rng.randrange(2 ** 32))
+    total = int(duration * sample_rate)
+    with sf.SoundFile(path, 'w', samplerate=sample_rate, channels=1, subtype='PCM_16') as f:
+        for start in range(0, total, block_seconds * sample_rate):
+            stop = min(start + block_seconds * sample_rate, total)
+            block = 0.01 * generator.standard_normal(stop - start).astype(np.float32)
+            times = np.arange(start, stop) / sample_rate
+            for onset, offset, _ in words:
+                if offset * sample_rate < start or onset * sample_rate >= stop:
+                    continue
+                inside = (times >= onset) & (times < offset)
+                block[inside] += 0.3 * np.sin(2 * np.pi * 220 * times[inside]).astype(np.float32)
+            f.write(block)
+
+
+def write_marker_csv(path, words):
+    """The UTF-16, tab-separated marker export read_csv expects."""
+    lines = ["Marker Name\tDescription\tIn\tOut\tDuration\tMarker Type"]
+    for onset, offset, word in words:
+        lines.append(f"{word}\t\t{timecode(onset)}\t{timecode(offset)}\t{timecode(offset - onset)}\tComment")
+    with open(path, 'w', encoding='utf-16', newline='') as f:
+        f.write("\r\n".join(lines) + "\r\n")
+
+
+def write_ground_truth(path):
+    """stages_words.csv for the LEXICON words."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("Stage,Word,IPA Transcription,Syllable Structure\n")
+        for word, (stage, phonemes, _) in LEXICON.items():
+            f.write(f'{stage},{word},"{",".join(phonemes)}",{"".join(ipa_to_cv(phoneme) for phoneme in phonemes)}\n')
+
+
+def generate_corpus(root, participants=2, recordings=1, duration=120.0, words_per_minute=20, sample_rate=44100,
+                    children_type="TD", band_id="Band_3", seed=0):
+    """
+    Write a synthetic corpus under root and return one item per recording, with the keys batch_preprocessing
+    uses (textgrid_path, audio_path, children_type, band_id, participant_id, audio_id) plus csv_path, words
+    and agreement_files.
+    """
+    rng = random.Random(seed)
+    items = []
+    for participant in range(participants):
+        participant_id = f"{300 + participant}_P{participant:03d}"
+        directory = os.path.join(root, children_type, band_id, "new_TG", participant_id)
+        agreement_directory = os.path.join(root, children_type, band_id, participant_id, "ml_tg_no_max_before_using_smaat")
+        os.makedirs(directory, exist_ok=True)
+        os.makedirs(agreement_directory, exist_ok=True)
+        for recording in range(recordings):
+            audio_id = f"A{recording:03d}_C{participant:03d}"
+            words = plan_words(duration, words_per_minute, rng)
+            item = {
+                "textgrid_path": os.path.join(directory, f"{audio_id}.TextGrid"),
+                "audio_path": os.path.join(directory, f"{audio_id}.wav"),
+                "csv_path": os.path.join(directory, f"{audio_id}.csv"),
+                "children_type": children_type,
+                "band_id": band_id,
+                "participant_id": participant_id,
+                "audio_id": audio_id,
+                "words": words,
+                "agreement_files": [],
+            }
+            write_textgrid(annotated_textgrid(words, duration), item["textgrid_path"])
+            write_wav(item["audio_path"], duration, sample_rate, words, rng)
+            write_marker_csv(item["csv_path"], words)
+            for index, (_, _, word) in enumerate(words):
+                # six underscores before the word, as AI_clinician_agreement splits the filename
+                path = os.path.join(agreement_directory, f"{participant_id.split('_')[1]}_{audio_id}_{index:04d}_ml_tg_{word}.TextGrid")
+                write_textgrid(prediction_textgrid(word, rng), path)
+                item["agreement_files"].append((path, LEXICON[word][0]))
+            items.append(item)
+    write_ground_truth(os.path.join(root, "stages_words.csv"))
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic SMAAT corpus (WAV, TextGrid, marker CSV and agreement TextGrids).")
+    parser.add_argument('root', type=str, help="Output corpus root.")
+    parser.add_argument('--participants', type=int, default=2, help="Number of participants.")
+    parser.add_argument('--recordings', type=int, default=1, help="Recordings per participant.")
+    parser.add_argument('--duration', type=float, default=120.0, help="Length of each recording in seconds.")
+    parser.add_argument('--words-per-minute', type=float, default=20, help="Word density.")
+    parser.add_argument('--sample-rate', type=int, default=44100, help="Sampling rate of the WAVs.")
+    parser.add_argument('--children-type', type=str, default="TD", help="Children type directory.")
+    parser.add_argument('--band', type=str, default="Band_3", help="Band directory.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    items = generate_corpus(args.root, args.participants, args.recordings, args.duration, args.words_per_minute,
+                            args.sample_rate, args.children_type, args.band, args.seed)
+    print(f"Wrote {len(items)} recording(s), {sum(len(item['words']) for item in items)} word(s) under {args.root}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+import soundfile as sf
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.textgrid_io import read_textgrid_text, summarize_textgrid
+
+"""
+Persistent SQLite manifest of a corpus, so that the pipeline stages query an index instead of walking directories.
+
+Corpus layout (the one batch_preprocessing and participant_pipeline process):
+    <corpus_root>/<children_type>/<band_id>/new_TG/<participant_id>/<audio_id>.TextGrid
+    <corpus_root>/<children_type>/<band_id>/new_TG/<participant_id>/<audio_id>.wav
+Derived files (<audio_id>_16000Hz.wav, the clip and crop directories) are not recordings.
+
+scan() records one row per recording: paths, size and mtime of both files, the WAV header (sampling rate,
+channels, frames, duration) and the TextGrid tier headers (class, name, interval count), taken with
+summarize_textgrid without building the tiers. The headers are read by a pool of worker processes, and only
+for files whose size or mtime changed since the last scan. Each recording gets a list of issues:
+    missing_audio, missing_textgrid        one of the pair is not there
+    missing_tier                           no "word" or no "phonetic" tier
+    tier_mismatch                          word and phonetic tiers have different interval counts (crop_textgrid
+                                           would stop with TierMismatchError)
+    unreadable_audio, unreadable_textgrid  the header could not be read
+    duration_mismatch                      TextGrid and WAV lengths differ by more than DURATION_TOLERANCE (warning)
+All but duration_mismatch are BLOCKING_ISSUES: the recording cannot be processed.
+
+Directory listings are cached too (listdir): a listing is reused while the directory's mtime is unchanged, so a
+repeated scan costs one stat per directory and per file instead of one listdir per directory. A directory modified
+within RACY_SECONDS of its listing is listed again, as its mtime may not have ticked since.
+AI_clinician_agreement lists the model output TextGrids of a band through the same cache.
+
+CLI usage example (scan a corpus and print its problems):
+python corpus_manifest.py /mnt/data/ying/SMAAT_1st_iterative_learning --manifest corpus_manifest.sqlite --workers 8
+"""
+
+BLOCKING_ISSUES = ("missing_audio", "missing_textgrid", "missing_tier", "tier_mismatch", "unreadable_audio", "unreadable_textgrid")
+DURATION_TOLERANCE = 0.05
+RACY_SECONDS = 2.0
+_DERIVED_AUDIO = re.compile(r'_\d+Hz\.wav$')
+
+
+def file_signature(path):
+    """(mtime in ns, size) of a file, or None when it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def read_headers(textgrid_path, audio_path, word_tier="word", split_tier="phonetic"):
+    """
+    Header fields and issues of one recording (either path may be None). Only the WAV header is read; the TextGrid
+    is summarized (summarize_textgrid), not parsed.
+    """
+    record = {"sample_rate": None, "channels": None, "frames": None, "duration": None, "textgrid_xmax": None, "tiers": [], "issues": []}
+    issues = record["issues"]
+    if audio_path is None:
+        issues.append("missing_audio")
+    else:
+        try:
+            info = sf.info(audio_path)
+            record.update(sample_rate=info.samplerate, channels=info.channels, frames=info.frames, duration=info.frames / info.samplerate)
+        except Exception:
+            issues.append("unreadable_audio")
+            record["error"] = traceback.format_exc(limit=1)
+    if textgrid_path is None:
+        issues.append("missing_textgrid")
+    else:
+        try:
+            _, xmax, tiers = summarize_textgrid(read_textgrid_text(textgrid_path))
+            record.update(textgrid_xmax=xmax, tiers=tiers)
+            sizes = {name: size for _, name, size in tiers}
+            if word_tier not in sizes or split_tier not in sizes:
+                issues.append("missing_tier")
+            elif sizes[word_tier] != sizes[split_tier]:
+                issues.append("tier_mismatch")
+        except Exception:
+            issues.append("unreadable_textgrid")
+            record["error"] = traceback.format_exc(limit=1)
+    if record["duration"] is not None and record["textgrid_xmax"] is not None and abs(record["duration"] - record["textgrid_xmax"]) > DURATION_TOLERANCE:
+        issues.append("duration_mismatch")
+    return record
+
+
+def _read_headers_task(paths):
+    return read_headers(*paths)
+
+
+def describe_issues(recording):
+    """A one-line explanation of the issues of a recording, for reports."""
+    details = []
+    sizes = {name: size for _, name, size in recording["tiers"]}
+    for issue in recording["issues"]:
+        if issue == "tier_mismatch":
+            details.append(f"tier_mismatch (word: {sizes.get('word')} intervals, phonetic: {sizes.get('phonetic')})")
+        elif issue == "duration_mismatch":
+            details.append(f"duration_mismatch (TextGrid {recording['textgrid_xmax']:.3f} s, WAV {recording['duration']:.3f} s)")
+        else:
+            details.append(issue)
+    return ", ".join(details)
+
+
+class CorpusManifest:
+    def __init__(self, database_path):
+        self.database_path = database_path
+        self.connection = sqlite3.connect(database_path, timeout=60)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, "
+                                    "listed_at REAL NOT NULL, entries TEXT NOT NULL)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS recordings (key TEXT PRIMARY KEY, corpus_root TEXT NOT NULL, "
+                                    "children_type TEXT NOT NULL, band_id TEXT NOT NULL, participant_id TEXT NOT NULL, audio_id TEXT NOT NULL, "
+                                    "textgrid_path TEXT, textgrid_signature TEXT, audio_path TEXT, audio_signature TEXT, "
+                                    "sample_rate INTEGER, channels INTEGER, frames INTEGER, duration REAL, textgrid_xmax REAL, "
+                                    "tiers TEXT NOT NULL, issues TEXT NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS recordings_by_root ON recordings (corpus_root, children_type, band_id, participant_id)")
+
+    def close(self):
+        self.connection.close()
+
+    def listdir(self, directory):
+        """
+        [(name, is_directory)] of a directory in os.scandir order, from the cache while the directory is unchanged.
+        Returns [] when the directory does not exist.
+        """
+        directory = os.path.abspath(directory)
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        row = self.connection.execute("SELECT mtime_ns, listed_at, entries FROM directories WHERE path = ?", (directory,)).fetchone()
+        if row is not None and row[0] == mtime_ns and mtime_ns / 1e9 < row[1] - RACY_SECONDS:
+            return [tuple(entry) for entry in json.loads(row[2])]
+        listed_at = time.time()
+        with os.scandir(directory) as iterator:
+            entries = [(entry.name, entry.is_dir()) for entry in iterator]
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO directories VALUES (?, ?, ?, ?)",
+                                    (directory, mtime_ns, listed_at, json.dumps(entries, ensure_ascii=False)))
+        return entries
+
+    def _subdirectories(self, directory):
+        return sorted(name for name, is_directory in self.listdir(directory) if is_directory)
+
+    def _discover(self, corpus_root, children_types=None, bands=None, participants=None):
+        """(key, children_type, band_id, participant_id, audio_id, textgrid_path, audio_path) of every recording."""
+        found = []
+        for children_type in self._subdirectories(corpus_root):
+            if children_types and children_type not in children_types:
+                continue
+            for band_id in self._subdirectories(os.path.join(corpus_root, children_type)):
+                if bands and band_id not in bands:
+                    continue
+                band_directory = os.path.join(corpus_root, children_type, band_id, "new_TG")
+                for participant_id in self._subdirectories(band_directory):
+                    if participants and participant_id not in participants:
+                        continue
+                    participant_directory = os.path.join(band_directory, participant_id)
+                    textgrids, audios = set(), set()
+                    for name, is_directory in self.listdir(participant_directory):
+                        if is_directory:
+                            continue
+                        if name.endswith('.TextGrid'):
+                            textgrids.add(name[:-len('.TextGrid')])
+                        elif name.endswith('.wav') and not _DERIVED_AUDIO.search(name):
+                            audios.add(name[:-len('.wav')])
+                    for audio_id in sorted(textgrids | audios):
+                        found.append((os.path.join(participant_directory, audio_id), children_type, band_id, participant_id, audio_id,
+                                      os.path.join(participant_directory, f"{audio_id}.TextGrid") if audio_id in textgrids else None,
+                                      os.path.join(participant_directory, f"{audio_id}.wav") if audio_id in audios else None))
+        return found
+
+    def scan(self, corpus_root, workers=None, children_types=None, bands=None, participants=None, chunk_size=16):
+        """
+        Bring the manifest of (part of) a corpus up to date. Headers are only read for new or changed files.
+        Returns the counts {"recordings", "read", "removed", "problems"}.
+        """
+        corpus_root = os.path.abspath(corpus_root)
+        found = self._discover(corpus_root, children_types, bands, participants)
+        stored = {key: (textgrid_signature, audio_signature) for key, textgrid_signature, audio_signature in self.connection.execute(
+            "SELECT key, textgrid_signature, audio_signature FROM recordings WHERE corpus_root = ?", (corpus_root,))}
+
+        changed = []
+        for key, children_type, band_id, participant_id, audio_id, textgrid_path, audio_path in found:
+            signatures = (json.dumps(file_signature(textgrid_path)) if textgrid_path else None,
+                          json.dumps(file_signature(audio_path)) if audio_path else None)
+            if stored.get(key) != signatures:
+                changed.append((key, children_type, band_id, participant_id, audio_id, textgrid_path, audio_path, signatures))
+
+        tasks = [(textgrid_path, audio_path) for *_, textgrid_path, audio_path, _ in changed]
+        if workers == 1 or len(tasks) <= chunk_size:
+            headers = [read_headers(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                headers = list(executor.map(_read_headers_task, tasks, chunksize=chunk_size))
+
+        in_scope = {key for key, *_ in found}
+        removed = [key for key in stored if key not in in_scope and self._in_scope(key, corpus_root, children_types, bands, participants)]
+        with self.connection:
+            for (key, children_type, band_id, participant_id, audio_id, textgrid_path, audio_path, signatures), header in zip(changed, headers):
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO recordings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, corpus_root, children_type, band_id, participant_id, audio_id, textgrid_path, signatures[0], audio_path,
+                     signatures[1], header["sample_rate"], header["channels"], header["frames"], header["duration"],
+                     header["textgrid_xmax"], json.dumps(header["tiers"], ensure_ascii=False), json.dumps(header["issues"])))
+            self.connection.executemany("DELETE FROM recordings WHERE key = ?", [(key,) for key in removed])
+        issues = dict(self.connection.execute("SELECT key, issues FROM recordings WHERE corpus_root = ?", (corpus_root,)))
+        problems = sum(1 for key in in_scope if json.loads(issues[key]))
+        return {"recordings": len(found), "read": len(changed), "removed": len(removed), "problems": problems}
+
+    @staticmethod
+    def _in_scope(key, corpus_root, children_types, bands, participants):
+        # key: <corpus_root>/<children_type>/<band_id>/new_TG/<participant_id>/<audio_id>
+        children_type, band_id, _, participant_id = os.path.relpath(key, corpus_root).split(os.sep)[:4]
+        return ((not children_types or children_type in children_types) and (not bands or band_id in bands)
+                and (not participants or participant_id in participants))
+
+    def recordings(self, corpus_root, children_types=None, bands=None, participant_id=None):
+        """
+        Recordings of a scanned corpus in corpus order, as dicts with the keys batch_preprocessing uses
+        (textgrid_path, audio_path, children_type, band_id, participant_id, audio_id) plus the header fields and issues.
+        """
+        query = "SELECT * FROM recordings WHERE corpus_root = ?"
+        parameters = [os.path.abspath(corpus_root)]
+        for column, values in (("children_type", children_types), ("band_id", bands)):
+            if values:
+                query += f" AND {column} IN ({', '.join('?' * len(values))})"
+                parameters += list(values)
+        if participant_id is not None:
+            query += " AND participant_id = ?"
+            parameters.append(participant_id)
+        cursor = self.connection.execute(query + " ORDER BY children_type, band_id, participant_id, audio_id", parameters)
+        columns = [description[0] for description in cursor.description]
+        recordings = []
+        for row in cursor.fetchall():
+            recording = dict(zip(columns, row))
+            recording["tiers"] = [tuple(tier) for tier in json.loads(recording["tiers"])]
+            recording["issues"] = json.loads(recording["issues"])
+            recordings.append(recording)
+        return recordings
+
+    def problems(self, corpus_root, blocking_only=False):
+        """The recordings with issues (only those that cannot be processed when blocking_only)."""
+        return [recording for recording in self.recordings(corpus_root)
+                if any(issue in BLOCKING_ISSUES or not blocking_only for issue in recording["issues"])]
+
+    def agreement_files(self, band_directory, subdirectory="ml_tg_no_max_before_using_smaat"):
+        """
+        (file path, file name) of the model output TextGrids under <band_directory>/<participant>/<subdirectory>/,
+        in os.listdir order, through the listing cache.
+        """
+        files = []
+        for participant, is_directory in self.listdir(band_directory):
+            if not is_directory:
+                continue
+            input_directory = os.path.join(band_directory, participant, subdirectory)
+            files += [(os.path.join(input_directory, name), name) for name, _ in self.listdir(input_directory)]
+        return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan a corpus into the manifest and report recordings that cannot be processed.")
+    parser.add_argument('corpus_root', type=str, help="Corpus root containing <children_type>/<band_id>/new_TG/<participant_id>/.")
+    parser.add_argument('--manifest', type=str, default="corpus_manifest.sqlite", help="SQLite manifest file.")
+    parser.add_argument('--children-type', dest='children_types', nargs='+', help="Only scan these children types (e.g., TD SSD).")
+    parser.add_argument('--band', dest='bands', nargs='+', help="Only scan these bands (e.g., Band_3).")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes reading headers (1 runs in-process).")
+    args = parser.parse_args()
+
+    manifest = CorpusManifest(args.manifest)
+    summary = manifest.scan(args.corpus_root, args.workers, args.children_types, args.bands)
+    print(f"{summary['recordings']} recording(s), {summary['read']} (re)read, {summary['removed']} removed, {summary['problems']} with issues.")
+    blocked = False
+    for recording in manifest.recordings(args.corpus_root, args.children_types, args.bands):
+        if recording["issues"]:
+            print(f"{recording['key']}: {describe_issues(recording)}")
+            blocked = blocked or any(issue in BLOCKING_ISSUES for issue in recording["issues"])
+    manifest.close()
+    if blocked:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
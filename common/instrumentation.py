@@ -0,0 +1,155 @@
+import json
+import time
+import cProfile
+import logging
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+"""
+Logging, stage timers, counters and profiling shared by the preprocessing, annotation and analysis scripts.
+
+- Logging: get_logger(name) returns a logger under "smaat". Nothing is emitted until configure_logging is
+  called (the CLIs call it with --log-level, WARNING by default), so debug output in the hot loops costs a
+  level check only.
+- Timers and counters: `with timer("parse"):` / `@timed("parse")` add the elapsed time to the stage, count(name)
+  adds to a counter. They go to the current Metrics registry. `with collecting() as metrics:` makes a fresh
+  registry current for a block of work, which is how a batch worker returns the timings of one task
+  (metrics.snapshot()) for the parent to merge().
+- Profiling: `with profiling(path):` runs the block under cProfile and dumps the statistics to path
+  (no-op when path is None). Read them with `python -m pstats path`.
+- write_summary(path) dumps the timers and counters of the current registry as JSON.
+
+Stage names used across the project: parse, resample, segment, crop, metric, and export_wait (time spent
+waiting for background writes, see data_prepprocessing/export_queue.py; it is part of the segment or crop time).
+"""
+
+LOGGER_NAME = "smaat"
+logging.getLogger(LOGGER_NAME).addHandler(logging.NullHandler())
+
+
+def get_logger(name):
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def configure_logging(level="WARNING"):
+    """Send the project's log records at `level` and above to stderr."""
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    if not any(isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.NullHandler) for handler in logger.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        logger.addHandler(handler)
+
+
+class Metrics:
+    """Per-stage timers (calls, total and longest seconds) and named counters."""
+
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        """Plain-dict copy, picklable and JSON serialisable."""
+        with self._lock:
+            return {
+                "timers": {name: {"calls": calls, "total_seconds": total, "max_seconds": longest}
+                           for name, (calls, total, longest) in self.timers.items()},
+                "counters": dict(self.counters),
+            }
+
+    def merge(self, snapshot):
+        """Add a snapshot (e.g. returned by a worker process) to this registry."""
+        with self._lock:
+            for name, timer in snapshot["timers"].items():
+                current = self.timers.setdefault(name, [0, 0.0, 0.0])
+                current[0] += timer["calls"]
+                current[1] += timer["total_seconds"]
+                current[2] = max(current[2], timer["max_seconds"])
+            for name, amount in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self):
+        """snapshot() with the mean seconds per call, stages sorted by total time."""
+        snapshot = self.snapshot()
+        timers = {}
+        for name, timer in sorted(snapshot["timers"].items(), key=lambda item: -item[1]["total_seconds"]):
+            timers[name] = dict(timer, mean_seconds=timer["total_seconds"] / timer["calls"] if timer["calls"] else 0.0)
+        return {"timers": timers, "counters": snapshot["counters"]}
+
+
+_registries = [Metrics()]
+
+
+def current_metrics():
+    return _registries[-1]
+
+
+@contextmanager
+def collecting():
+    """Make a fresh Metrics registry current for the block and yield it; the previous one is restored after."""
+    metrics = Metrics()
+    _registries.append(metrics)
+    try:
+        yield metrics
+    finally:
+        _registries.remove(metrics)
+
+
+@contextmanager
+def timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current_metrics().add_time(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """Decorator form of timer(name)."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, amount=1):
+    current_metrics().count(name, amount)
+
+
+@contextmanager
+def profiling(output_path=None):
+    """Run the block under cProfile and dump the statistics to output_path; does nothing when it is None."""
+    if output_path is None:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output_path)
+
+
+def write_summary(output_path, metrics=None, **extra):
+    """Write the timing summary of a registry (the current one by default) as JSON, with extra top-level fields."""
+    summary = dict(extra, **(metrics or current_metrics()).summary())
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    return summary
@@ -0,0 +1,393 @@
+import re
+import sys
+import numpy as np
+
+"""
+Lightweight TextGrid reader/writer shared by the preprocessing, annotation and analysis scripts.
+
+A tier is stored column-wise: NumPy float64 arrays for the interval start/end times (or point times) and an
+object array of interned labels, instead of one Python object per interval. Both the long ("normal") and the
+short text formats are parsed by the same tokenizer, and files are written in the exact layout praatio produces,
+so replacing praatio does not change any output file.
+
+Conventions (the same as praatio):
+- Labels are stripped of surrounding whitespace when read.
+- read_textgrid(..., include_empty_intervals=False) drops the intervals and points whose label is empty.
+read_textgrid(..., round_digits=5, strip_labels=False) reads a file the way the textgrid package
+(textgrid.TextGrid.fromFile) does instead: times rounded to 5 decimals, intervals the rounding leaves without
+duration dropped, and labels kept as written.
+
+summarize_textgrid returns only the tier headers (class, name, number of intervals or points), which is what the
+corpus manifest (common/corpus_manifest.py) needs to validate a TextGrid, without building the tiers. The short
+format is still tokenized from start to end to step over the intervals.
+
+Usage example:
+    tg = read_textgrid("/path/to/file.TextGrid")
+    phonetic = tg.get_tier("phonetic")
+    for start, end, label in phonetic.entries:
+        ...
+    write_textgrid(tg.crop(1.2, 1.8, rebase_to_zero=True), "/path/to/word.TextGrid")
+"""
+
+INTERVAL_TIER = "IntervalTier"
+POINT_TIER = "TextTier"
+
+# Quoted strings (with "" as an escaped quote), the <exists>/<absent> flags, numbers, and the [n] item
+# indices of the long format, which carry no information and are dropped.
+_TOKEN = re.compile(r'"(?:[^"]|"")*"|<exists>|<absent>|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|\[\s*\d*\s*\]')
+# In the long format every value follows "key =", which is much cheaper to scan for.
+_LONG_VALUE = re.compile(r'=\s*("(?:[^"]|"")*"|\S+)')
+_LONG_TIERS_FLAG = re.compile(r'tiers\?\s*(<exists>|<absent>)')
+_LONG_TIER_HEADER = re.compile(r'class\s*=\s*"((?:[^"]|"")*)"\s*name\s*=\s*"((?:[^"]|"")*)"\s*xmin\s*=\s*\S+\s*xmax\s*=\s*\S+\s*'
+                               r'(?:intervals|points)\s*:\s*size\s*=\s*(\d+)')
+_LONG_XMIN = re.compile(r'xmin\s*=\s*(\S+)')
+_LONG_XMAX = re.compile(r'xmax\s*=\s*(\S+)')
+
+
+def _unquote(token):
+    return sys.intern(token[1:-1].replace('""', '"').strip())
+
+
+def _unquote_raw(token):
+    return sys.intern(token[1:-1].replace('""', '"'))
+
+
+def _times(tokens, round_digits=None):
+    if round_digits is None:
+        return np.array(tokens, dtype=np.float64)
+    # Python's round() on every value, as the textgrid package rounds each time it reads
+    return np.array([round(float(token), round_digits) for token in tokens], dtype=np.float64)
+
+
+def _labels(labels):
+    array = np.empty(len(labels), dtype=object)
+    array[:] = [sys.intern(label) for label in labels]
+    return array
+
+
+class IntervalTier:
+    __slots__ = ("name", "xmin", "xmax", "starts", "ends", "labels")
+
+    def __init__(self, name, starts, ends, labels, xmin=None, xmax=None):
+        self.name = name
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        self.labels = labels if isinstance(labels, np.ndarray) and labels.dtype == object else _labels(labels)
+        self.xmin = float(xmin) if xmin is not None else (float(self.starts[0]) if len(self.starts) else 0.0)
+        self.xmax = float(xmax) if xmax is not None else (float(self.ends[-1]) if len(self.ends) else 0.0)
+
+    @classmethod
+    def from_entries(cls, name, entries, xmin=None, xmax=None):
+        """Build a tier from (start, end, label) tuples."""
+        entries = list(entries)
+        return cls(name, [entry[0] for entry in entries], [entry[1] for entry in entries],
+                   [entry[2] for entry in entries], xmin, xmax)
+
+    @property
+    def entries(self):
+        """The intervals as a list of (start, end, label) tuples of Python values."""
+        return list(zip(self.starts.tolist(), self.ends.tolist(), self.labels.tolist()))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def without_empty(self):
+        """A copy of the tier without the intervals whose label is empty."""
+        keep = self.labels != ""
+        return IntervalTier(self.name, self.starts[keep], self.ends[keep], self.labels[keep], self.xmin, self.xmax)
+
+    def crop(self, crop_start, crop_end, rebase_to_zero=False):
+        """
+        Keep the intervals overlapping [crop_start, crop_end], truncated to it (praatio's mode="truncated").
+        Both bounds are found with a binary search, since the intervals of a tier are sorted and do not overlap.
+        """
+        lo = np.searchsorted(self.ends, crop_start, side="right")
+        hi = np.searchsorted(self.starts, crop_end, side="left")
+        offset = crop_start if rebase_to_zero else 0.0
+        starts = np.maximum(self.starts[lo:hi], crop_start) - offset
+        ends = np.minimum(self.ends[lo:hi], crop_end) - offset
+        return IntervalTier(self.name, starts, ends, self.labels[lo:hi], crop_start - offset, crop_end - offset)
+
+    def rebase(self, origin):
+        """A copy of the tier with every time taken relative to origin (crop(...).rebase(start) == crop(..., rebase_to_zero=True))."""
+        return IntervalTier(self.name, self.starts - origin, self.ends - origin, self.labels, self.xmin - origin, self.xmax - origin)
+
+    def validate(self):
+        """Raise ValueError if an interval is empty or reversed, or if two intervals overlap (as praatio does)."""
+        bad = np.flatnonzero(self.starts >= self.ends)
+        if len(bad):
+            raise ValueError(f"Tier '{self.name}': the start time of an interval ({self.starts[bad[0]]}) "
+                             f"cannot occur after its end time ({self.ends[bad[0]]})")
+        overlap = np.flatnonzero(self.ends[:-1] > self.starts[1:])
+        if len(overlap):
+            raise ValueError(f"Tier '{self.name}': two intervals overlap in time at {self.starts[overlap[0] + 1]}")
+
+
+class PointTier:
+    __slots__ = ("name", "xmin", "xmax", "times", "labels")
+
+    def __init__(self, name, times, labels, xmin=None, xmax=None):
+        self.name = name
+        self.times = np.asarray(times, dtype=np.float64)
+        self.labels = labels if isinstance(labels, np.ndarray) and labels.dtype == object else _labels(labels)
+        self.xmin = float(xmin) if xmin is not None else (float(self.times[0]) if len(self.times) else 0.0)
+        self.xmax = float(xmax) if xmax is not None else (float(self.times[-1]) if len(self.times) else 0.0)
+
+    @classmethod
+    def from_entries(cls, name, entries, xmin=None, xmax=None):
+        """Build a tier from (time, label) tuples."""
+        entries = list(entries)
+        return cls(name, [entry[0] for entry in entries], [entry[1] for entry in entries], xmin, xmax)
+
+    @property
+    def entries(self):
+        """The points as a list of (time, label) tuples of Python values."""
+        return list(zip(self.times.tolist(), self.labels.tolist()))
+
+    def __len__(self):
+        return len(self.times)
+
+    def without_empty(self):
+        """A copy of the tier without the points whose label is empty."""
+        keep = self.labels != ""
+        return PointTier(self.name, self.times[keep], self.labels[keep], self.xmin, self.xmax)
+
+    def crop(self, crop_start, crop_end, rebase_to_zero=False):
+        """Keep the points inside [crop_start, crop_end]."""
+        lo = np.searchsorted(self.times, crop_start, side="left")
+        hi = np.searchsorted(self.times, crop_end, side="right")
+        offset = crop_start if rebase_to_zero else 0.0
+        return PointTier(self.name, self.times[lo:hi] - offset, self.labels[lo:hi], crop_start - offset, crop_end - offset)
+
+    def rebase(self, origin):
+        """A copy of the tier with every time taken relative to origin."""
+        return PointTier(self.name, self.times - origin, self.labels, self.xmin - origin, self.xmax - origin)
+
+    def validate(self):
+        pass
+
+
+class TextGrid:
+    __slots__ = ("xmin", "xmax", "tiers")
+
+    def __init__(self, xmin=None, xmax=None, tiers=()):
+        self.xmin = xmin
+        self.xmax = xmax
+        self.tiers = []
+        for tier in tiers:
+            self.add_tier(tier)
+
+    def add_tier(self, tier):
+        """Append a tier; the TextGrid bounds grow to cover it."""
+        if tier.name in self.tier_names:
+            raise ValueError(f"The TextGrid already contains a tier named '{tier.name}'.")
+        self.tiers.append(tier)
+        self.xmin = tier.xmin if self.xmin is None else min(self.xmin, tier.xmin)
+        self.xmax = tier.xmax if self.xmax is None else max(self.xmax, tier.xmax)
+
+    @property
+    def tier_names(self):
+        return [tier.name for tier in self.tiers]
+
+    def get_tier(self, name):
+        for tier in self.tiers:
+            if tier.name == name:
+                return tier
+        raise KeyError(f"The TextGrid has no tier named '{name}' (tiers: {self.tier_names}).")
+
+    def __getitem__(self, key):
+        """Tiers by position (as the textgrid package does) or by name (as praatio's getTier does)."""
+        return self.get_tier(key) if isinstance(key, str) else self.tiers[key]
+
+    def __iter__(self):
+        return iter(self.tiers)
+
+    def __len__(self):
+        return len(self.tiers)
+
+    def crop(self, crop_start, crop_end, rebase_to_zero=False):
+        """Crop every tier to [crop_start, crop_end] (intervals are truncated, as in praatio's mode="truncated")."""
+        offset = crop_start if rebase_to_zero else 0.0
+        return TextGrid(crop_start - offset, crop_end - offset,
+                        [tier.crop(crop_start, crop_end, rebase_to_zero) for tier in self.tiers])
+
+    def rebase(self, origin):
+        """A copy with every time taken relative to origin, e.g. a crop rebased to zero without cropping again."""
+        return TextGrid(self.xmin - origin, self.xmax - origin, [tier.rebase(origin) for tier in self.tiers])
+
+    def validate(self):
+        for tier in self.tiers:
+            tier.validate()
+
+
+def _tokenize(text):
+    """The values of a TextGrid in file order, whatever the text format."""
+    tiers_flag = _LONG_TIERS_FLAG.search(text)
+    if tiers_flag is None:
+        return [token for token in _TOKEN.findall(text) if token[0] != "["]
+    # long format: the tiers flag is the only value without a key
+    tokens = _LONG_VALUE.findall(text)
+    tokens.insert(4, tiers_flag.group(1))
+    return tokens
+
+
+def parse_textgrid(text, include_empty_intervals=True, round_digits=None, strip_labels=True):
+    """
+    Parse the content of a long or short text-format TextGrid.
+    round_digits: round every time to this many decimals and drop the intervals left without duration, as the
+    textgrid package does. strip_labels=False keeps the whitespace around labels (the textgrid package does not strip).
+    """
+    tokens = _tokenize(text)
+    if len(tokens) < 4 or not tokens[0].startswith('"ooTextFile') or tokens[1] != '"TextGrid"':
+        raise ValueError("Not a text-format TextGrid (binary TextGrids are not supported).")
+
+    unquote = _unquote if strip_labels else _unquote_raw
+    xmin, xmax = _times(tokens[2:4], round_digits).tolist()
+    tg = TextGrid(xmin, xmax)
+    if len(tokens) == 4 or tokens[4] == "<absent>":
+        return tg
+
+    position = 6
+    for _ in range(int(tokens[5])):
+        tier_class = tokens[position][1:-1]
+        name = tokens[position + 1][1:-1].replace('""', '"')
+        xmin, xmax = _times(tokens[position + 2:position + 4], round_digits).tolist()
+        size = int(tokens[position + 4])
+        position += 5
+        if tier_class == INTERVAL_TIER:
+            block = tokens[position:position + 3 * size]
+            position += 3 * size
+            labels = np.empty(size, dtype=object)
+            labels[:] = [unquote(token) for token in block[2::3]]
+            starts, ends = _times(block[0::3], round_digits), _times(block[1::3], round_digits)
+            if round_digits is not None:
+                keep = starts < ends
+                starts, ends, labels = starts[keep], ends[keep], labels[keep]
+            tier = IntervalTier(name, starts, ends, labels, xmin, xmax)
+        elif tier_class == POINT_TIER:
+            block = tokens[position:position + 2 * size]
+            position += 2 * size
+            labels = np.empty(size, dtype=object)
+            labels[:] = [unquote(token) for token in block[1::2]]
+            tier = PointTier(name, _times(block[0::2], round_digits), labels, xmin, xmax)
+        else:
+            raise ValueError(f"Unknown tier class '{tier_class}'.")
+        if not include_empty_intervals:
+            tier = tier.without_empty()
+        tg.tiers.append(tier)
+    return tg
+
+
+def summarize_textgrid(text):
+    """
+    (xmin, xmax, [(tier class, tier name, number of intervals or points)]) of a TextGrid, without building its tiers.
+    The long format is matched on its tier headers. The short format has no keys to find them by, so the whole file
+    is tokenized to step over the intervals, but no time or label is converted.
+    """
+    if _LONG_TIERS_FLAG.search(text) is not None:
+        # the first xmin/xmax of the long format are the TextGrid's own
+        tiers = [(tier_class, name.replace('""', '"'), int(size)) for tier_class, name, size in _LONG_TIER_HEADER.findall(text)]
+        return float(_LONG_XMIN.search(text).group(1)), float(_LONG_XMAX.search(text).group(1)), tiers
+
+    tokens = _tokenize(text)
+    if len(tokens) < 4 or not tokens[0].startswith('"ooTextFile') or tokens[1] != '"TextGrid"':
+        raise ValueError("Not a text-format TextGrid (binary TextGrids are not supported).")
+    tiers = []
+    if len(tokens) > 4 and tokens[4] == "<exists>":
+        position = 6
+        for _ in range(int(tokens[5])):
+            tier_class, size = tokens[position][1:-1], int(tokens[position + 4])
+            tiers.append((tier_class, tokens[position + 1][1:-1].replace('""', '"'), size))
+            position += 5 + (3 if tier_class == INTERVAL_TIER else 2) * size
+    return float(tokens[2]), float(tokens[3]), tiers
+
+
+def read_textgrid_text(file_path):
+    """The text of a TextGrid file saved as UTF-8 or UTF-16 (with or without byte order mark)."""
+    with open(file_path, "rb") as f:
+        data = f.read()
+    if data.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return data.decode("utf-16")
+    if data.startswith(b"\xef\xbb\xbf"):
+        return data.decode("utf-8-sig")
+    if b"\x00" in data[:64]:
+        # UTF-16 without a byte order mark: the ASCII header has a zero byte after (LE) or before (BE) each character
+        return data.decode("utf-16-le" if data[1:2] == b"\x00" else "utf-16-be")
+    return data.decode("utf-8")
+
+
+def read_textgrid(file_path, include_empty_intervals=True, round_digits=None, strip_labels=True):
+    """Read a TextGrid file saved as UTF-8 or UTF-16 (with or without byte order mark); options as parse_textgrid."""
+    return parse_textgrid(read_textgrid_text(file_path), include_empty_intervals, round_digits, strip_labels)
+
+
+def _format_number(value):
+    """Format a timestamp the way praatio does: integers without a decimal point, other values with repr()."""
+    value = float(value)
+    if abs(value - int(value)) <= 1e-14 * max(abs(value), abs(int(value))):
+        return "%d" % value
+    return repr(value)
+
+
+def _format_numbers(values):
+    """_format_number for a whole array, with the integer test done in NumPy."""
+    truncated = np.trunc(values)
+    integral = np.abs(values - truncated) <= 1e-14 * np.maximum(np.abs(values), np.abs(truncated))
+    return [("%d" % value) if is_integral else repr(value) for value, is_integral in zip(values.tolist(), integral.tolist())]
+
+
+def _quote(label):
+    return '"%s"' % label.replace('"', '""')
+
+
+def _format_long(tg):
+    lines = ['File type = "ooTextFile"', 'Object class = "TextGrid"', '',
+             f"xmin = {_format_number(tg.xmin)} ", f"xmax = {_format_number(tg.xmax)} ",
+             "tiers? <exists> ", f"size = {len(tg.tiers)} ", "item []: "]
+    tab = " " * 4
+    for tier_number, tier in enumerate(tg.tiers, start=1):
+        is_interval = isinstance(tier, IntervalTier)
+        lines.append(f"{tab}item [{tier_number}]:")
+        lines.append(f'{tab * 2}class = "{INTERVAL_TIER if is_interval else POINT_TIER}" ')
+        lines.append(f"{tab * 2}name = {_quote(tier.name)} ")
+        lines.append(f"{tab * 2}xmin = {_format_number(tier.xmin)} ")
+        lines.append(f"{tab * 2}xmax = {_format_number(tier.xmax)} ")
+        labels = [_quote(label) for label in tier.labels.tolist()]
+        if is_interval:
+            lines.append(f"{tab * 2}intervals: size = {len(tier)} ")
+            lines += [f"{tab * 2}intervals [{number}]:\n{tab * 3}xmin = {start} \n{tab * 3}xmax = {end} \n{tab * 3}text = {label} "
+                      for number, start, end, label in zip(range(1, len(tier) + 1), _format_numbers(tier.starts),
+                                                           _format_numbers(tier.ends), labels)]
+        else:
+            lines.append(f"{tab * 2}points: size = {len(tier)} ")
+            lines += [f"{tab * 2}points [{number}]:\n{tab * 3}number = {time} \n{tab * 3}mark = {label} "
+                      for number, time, label in zip(range(1, len(tier) + 1), _format_numbers(tier.times), labels)]
+    return "\n".join(lines) + "\n"
+
+
+def _format_short(tg):
+    lines = ['File type = "ooTextFile"', 'Object class = "TextGrid"', '',
+             _format_number(tg.xmin), _format_number(tg.xmax), "<exists>", str(len(tg.tiers))]
+    for tier in tg.tiers:
+        is_interval = isinstance(tier, IntervalTier)
+        lines += [f'"{INTERVAL_TIER if is_interval else POINT_TIER}"', _quote(tier.name),
+                  _format_number(tier.xmin), _format_number(tier.xmax), str(len(tier))]
+        for entry in tier.entries:
+            lines += [_format_number(value) for value in entry[:-1]]
+            lines.append(_quote(entry[-1]))
+    return "\n".join(lines) + "\n"
+
+
+def format_textgrid(tg, format="long"):
+    """Return the TextGrid as text in the "long" (normal) or "short" format."""
+    if format == "long":
+        return _format_long(tg)
+    if format == "short":
+        return _format_short(tg)
+    raise ValueError(f"Unknown TextGrid format '{format}' (expected 'long' or 'short').")
+
+
+def write_textgrid(tg, file_path, format="long"):
+    """Save the TextGrid as UTF-8 text."""
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(format_textgrid(tg, format))
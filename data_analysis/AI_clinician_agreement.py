@@ -12,30 +12,41 @@ Future improvement:
     Handle diacritics in IPA transcription more effectively.
 '''
 
-from jiwer import wer
-from praatio import textgrid
 import os
-import re
-import unicodedata
+import sys
 import pandas as pd
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.textgrid_io import read_textgrid
+from common.corpus_manifest import CorpusManifest
+from common.instrumentation import get_logger, configure_logging, collecting, current_metrics, timer, count, profiling, write_summary
+from data_analysis.edit_distance import pairwise_error_rates, file_error_rates
+from data_analysis.ipa_normalization import ipa_to_cv, split_label
+from data_analysis.result_store import ResultStore, textgrid_digest, ground_truth_digest
+from data_analysis.phoneme_index import PhonemeIndex
+from data_analysis.bootstrap import RATE_NAMES, count_columns, file_counts, confidence_table
+from data_analysis.confusion import aggregate
+
+# Bump when the computation of the rows changes, so that stored results are recomputed
+METRIC_VERSION = "2"
+
+logger = get_logger("AI_clinician_agreement")
 
 def character_error_rate(pred_str, label_str):
-    # pred_str/label_str: list
-    print("***************** WER ***********************")
-    print(pred_str)
-    print(label_str)
-    print("*****************  ***********************")
-    error = wer(label_str, pred_str)
-    return error
+    # pred_str/label_str: list; same value as jiwer.wer(" ".join(label_str), " ".join(pred_str))
+    rates, _ = pairwise_error_rates([label_str], [pred_str])
+    return float(rates[0])
 
 def get_prediction_label(file_path):
     
-    tg = textgrid.openTextgrid(file_path, includeEmptyIntervals=False)
+    with timer("parse"):
+        tg = read_textgrid(file_path, include_empty_intervals=False)
     # prediction
-    prediction_tier = tg.getTier("phoneme_ipa")
-    prediction_tier_cv = tg.getTier("structure")
+    prediction_tier = tg.get_tier("phoneme_ipa")
+    prediction_tier_cv = tg.get_tier("structure")
     # label
-    label_tier = tg.getTier("phonetic")
+    label_tier = tg.get_tier("phonetic")
 
     predictions = []
     predictions_cv = []
@@ -43,10 +54,10 @@ def get_prediction_label(file_path):
         if text == "ɪ/ɪə":
             text = "ɪ"
         predictions.append(text)
-    print("predictions", predictions)
+    logger.debug("predictions %s", predictions)
     for start, end, text in prediction_tier_cv.entries:
         predictions_cv.append(text)
-    print("predictions_cv", predictions_cv)
+    logger.debug("predictions_cv %s", predictions_cv)
 
     for start, end, text in label_tier.entries:
        
@@ -54,110 +65,199 @@ def get_prediction_label(file_path):
         #     print("item",item)
         #     labels.append(item.strip())    
         # print(labels)
-        print("text", text)
         # broad = narrow_to_broad(text)
         broad = text
-        print(f"Narrow: {text} → Broad: {broad}")
-        labels = []
-        labels_cv = []
-        labels = [phoneme.strip() for phoneme in broad.split(',')]
-        print("labels", labels)
-        for item in labels:
-            item_cv = mapping_ipa2cv(item)
-            labels_cv.append(item_cv)
+        logger.debug("Narrow: %s → Broad: %s", text, broad)
+        labels, labels_cv = (list(phonemes) for phonemes in split_label(broad))
+        logger.debug("labels %s", labels)
         # print("labels",labels)
     return predictions, labels, predictions_cv, labels_cv
 
 
 def mapping_ipa2cv(item):
-    vowels = {'u', 'j', 'ɯ', 'ʊ', 'a', 'ɘ', 'ɐ', 'i', 'ʌ', 'æ', 'ɒ', 'o', 'e', 'ɛ', 'ɜ', 'ɑ', 'ɨ', 'ɔ', 'ɵ', 'ɛ','ə','ɪ', 'ʉ', "aɪ","eɪ","oʊ","aʊ","ɔɪ","ɪə","eə","ai"}
-    consonants = {'m', 't', 'b', 'f', 'x', 'ɱ', 'ɹ', 'v', 'c', 'w', 'β', 'n', 'h', 'r', 'ʧ', 'd', 's', 'p', 'q', 'ɤ', 'ŋ', 'ʔ', 'ɾ', 'k', 'g', 'l', 'ʤ', 'ɡ','ʦ','ʃ'}
-    if item in vowels:
-        return "V"
-    elif item in consonants:
-        return "C"
-    else:
-        return "U"
-
-# def remove_diacritics(text):
-#     """Removes diacritics from narrow IPA transcription."""
-#     return ''.join([char for char in unicodedata.normalize('NFD', text) if unicodedata.category(char) != 'Mn'])
-# 1: Remove all diacritics
-def remove_diacritics(ipa_text):
-    """Removes all diacritics from narrow IPA transcription while preserving base phonemes."""
-    return ''.join(
-        char for char in unicodedata.normalize('NFD', ipa_text) 
-        if unicodedata.category(char) not in ['Mn', 'Sk','Lm','Po'] or char == ','
-    )
-
-# 2: Define phoneme mappings for broad IPA transcription
-def narrow_to_broad(narrow_ipa):
-    # Step 2: Define phoneme mappings for broad transcription
-    phoneme_mapping = {
-        'ʈ': 't',   # Retroflex "ʈ" → Alveolar "t"
-        'ʋ': 'v',   # Labiodental approximant "ʋ" → "v"
-        'ɦ': 'h',   # Voiced glottal fricative "ɦ" → "h"
-        'ɸ': 'f',   # Bilabial fricative "ɸ" → "f"
-        'ɣ': 'ɡ',   # Voiced velar fricative "ɣ" → "ɡ"
-        'ɭ': 'l',   # Retroflex lateral "ɭ" → "l"
-        'ʂ': 'ʃ',   # Retroflex fricative "ʂ" → "ʃ"
-        'ǃ': 'ʔ',   # Click "ǃ" → Glottal stop "ʔ"
-        'ǂ': 'ʔ',   # Alveolar click "ǂ" → Glottal stop "ʔ"
-        'ʘ': 'p',   # Bilabial click "ʘ" → Bilabial stop "p"
-        'ɶ': 'a',   # Open front rounded vowel "ɶ" → "a"
-        'ɞ': 'ɜ',   # Close-mid central rounded vowel "ɞ" → Open-mid central unrounded vowel "ɜ"
-        'œ': 'ɛ',   # Open-mid front rounded vowel "œ" → Open-mid front unrounded vowel "ɛ"
-        'θ': 'ɘ',   # Voiceless dental fricative "θ" → Close-mid central unrounded vowel "ɘ"
-        'ʙ':'b',
-    }
+    return ipa_to_cv(item)
 
-    # Apply regex replacement for each diacritic
-    # for pattern in diacritic_patterns:
-    #     broad_ipa = re.sub(pattern, '', narrow_ipa)
-
-    # return narrow_ipa
-    # Remove diacritics
-    broad_ipa = remove_diacritics(narrow_ipa)
-    print("broad_ipa", broad_ipa)
-    # Apply phoneme mapping
-    for narrow, broad in phoneme_mapping.items():
-        broad_ipa = broad_ipa.replace(narrow, broad)
-    print("ipa_text", broad_ipa)
-    return broad_ipa
-
-def process_stage(files, stage_name, df):
-    phonemes = set()
-    results = []
+def load_ground_truth(csv_path):
+    """
+    Load the stages-words CSV once into a word -> (IPA phoneme list, CV structure list) index.
+    The IPA transcription is split on ',' and the syllable structure into characters. A word listed on
+    several rows gets the concatenation of its rows, in file order.
+    """
+    df = pd.read_csv(csv_path)
+    ground_truth = {}
+    for row_number, (word, ipa, structure) in enumerate(zip(df["Word"], df["IPA Transcription"], df["Syllable Structure"]), start=2):
+        if not isinstance(ipa, str) or not isinstance(structure, str):
+            print(f"ATTENTION!!! Row {row_number} of {csv_path} ({word}) has no IPA transcription or syllable structure; it is ignored.")
+            continue
+        gt, gt_cv = ground_truth.setdefault(word, ([], []))
+        gt.extend(ipa.split(","))
+        gt_cv.extend(list(structure))
+    return ground_truth
+
+
+def _process_chunk(chunk, ground_truth):
+    """Worker: the records of a chunk (see _chunk_records) and a snapshot of the chunk's timings and counters."""
+    with collecting() as metrics:
+        records = _chunk_records(chunk, ground_truth)
+    return records, metrics.snapshot()
+
+
+def _chunk_records(chunk, ground_truth):
+    """
+    One (error-rate row, label phonemes, missing-ground-truth entry or None, alignment counts) record per
+    (file, stage_name) pair of the chunk, in chunk order. The counts are the (hits, substitutions, deletions,
+    insertions) of each rate of FILE_RATES, for the bootstrap intervals.
+    """
+    sequences = []
     
-    for file in files:
+    for file, stage_name in chunk:
         prediction, label, prediction_cv, label_cv = get_prediction_label(file)
-        for i in label:
-            phonemes.add(i)
-        
-        error_rate_basic = character_error_rate(prediction, label)
-        error_rate_cv = character_error_rate(prediction_cv, label_cv)
         filename = os.path.basename(file)
         
         text_part = os.path.splitext(filename)[0].split("_", maxsplit=6)[-1]  # Extract the sentence
-        text_part = [text_part]
         
-        gt = df[df["Word"].isin(text_part)]["IPA Transcription"].apply(lambda x: x.split(",")).tolist()
-        gt = [item for sublist in gt for item in sublist]
-        
-        gt_cv = df[df["Word"].isin(text_part)]["Syllable Structure"].apply(lambda x: list(x)).tolist()
-        gt_cv = [item for sublist in gt_cv for item in sublist]
-        
-        error_rate_gt = character_error_rate(prediction, gt)
-        error_rate_gt_cv = character_error_rate(prediction_cv, gt_cv)
-        error_rate_label_gt = character_error_rate(label, gt)
-        error_rate_label_gt_cv = character_error_rate(label_cv, gt_cv)
+        missing = None
+        if text_part in ground_truth:
+            gt, gt_cv = ground_truth[text_part]
+        else:
+            # an empty reference gives NaN rates for the four ground-truth comparisons
+            logger.warning("ATTENTION!!! No ground truth for word '%s' (%s, %s); its ground-truth error rates are left empty.", text_part, filename, stage_name)
+            missing = [filename, stage_name, text_part]
+            gt, gt_cv = [], []
+        sequences.append({"filename": filename, "stage": stage_name, "prediction": prediction, "label": label,
+                          "prediction_cv": prediction_cv, "label_cv": label_cv, "gt": gt, "gt_cv": gt_cv, "missing": missing})
 
-        
-        results.append([filename, stage_name, prediction,label, error_rate_basic, prediction_cv, label_cv, error_rate_cv, prediction, gt, error_rate_gt, prediction_cv, gt_cv, error_rate_gt_cv, label, gt, error_rate_label_gt, label_cv, gt_cv, error_rate_label_gt_cv])
+    # all six rates of every file in one batched edit-distance call
+    with timer("metric"):
+        file_rates = file_error_rates(sequences)
+    count("files", len(sequences))
+    records = []
+    for file, rates in zip(sequences, file_rates):
+        prediction, label, prediction_cv, label_cv, gt, gt_cv = (file[name] for name in ("prediction", "label", "prediction_cv", "label_cv", "gt", "gt_cv"))
+        error_rate_basic, error_rate_cv, error_rate_gt, error_rate_gt_cv, error_rate_label_gt, error_rate_label_gt_cv = (
+            rates[name][0] for name in ("error_rate_basic", "error_rate_cv", "error_rate_gt", "error_rate_gt_cv", "error_rate_label_gt", "error_rate_label_gt_cv"))
+        row = [file["filename"], file["stage"], prediction,label, error_rate_basic, prediction_cv, label_cv, error_rate_cv, prediction, gt, error_rate_gt, prediction_cv, gt_cv, error_rate_gt_cv, label, gt, error_rate_label_gt, label_cv, gt_cv, error_rate_label_gt_cv]
+        records.append([row, label, file["missing"], [rates[name][1] for name in RATE_NAMES]])
     
+    return records
+
+
+def _compute_records(tasks, ground_truth, workers, chunk_size):
+    chunks = [tasks[start:start + chunk_size] for start in range(0, len(tasks), chunk_size)]
+    if workers == 1 or len(chunks) <= 1:
+        outputs = list(map(_process_chunk, chunks, repeat(ground_truth)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # executor.map yields the chunk results in submission order whatever order the workers finish in
+            outputs = list(executor.map(_process_chunk, chunks, repeat(ground_truth, len(chunks))))
+    records = []
+    for chunk_records, snapshot in outputs:
+        records.extend(chunk_records)
+        current_metrics().merge(snapshot)
+    return records
+
+
+def process_files(tasks, ground_truth, missing=None, workers=None, chunk_size=64, store=None, counts=None):
+    """
+    Compute the error rates of (file, stage_name) pairs, spread over a pool of worker processes.
+    The pairs are cut into chunks of chunk_size and the chunks are merged back in input order, so the rows
+    are exactly those of a serial run. workers=1 runs in-process.
+    With a ResultStore, files whose content, metric version and ground truth are unchanged since they were
+    stored are not recomputed; the new and changed ones are, and are stored in turn.
+    When a list is given as counts, the alignment counts of every pair are appended to it, in row order.
+    """
+    records = [None] * len(tasks)
+    if store is not None:
+        version = f"{METRIC_VERSION}:{ground_truth_digest(ground_truth)}"
+        keys = [(file, stage_name, textgrid_digest(file)) for file, stage_name in tasks]
+        records = store.fetch(keys, version)
+    todo = [index for index, record in enumerate(records) if record is None]
+    computed = _compute_records([tasks[index] for index in todo], ground_truth, workers, chunk_size)
+    for index, record in zip(todo, computed):
+        records[index] = record
+    if store is not None:
+        store.save([keys[index] for index in todo], computed, version)
+        print(f"{len(tasks) - len(todo)} file(s) reused from {store.database_path}, {len(todo)} computed.")
+
+    results = []
+    phonemes = set()
+    for row, label, missing_entry, file_alignment_counts in records:
+        results.append(row)
+        phonemes.update(label)
+        if missing is not None and missing_entry is not None:
+            missing.append(tuple(missing_entry))
+        if counts is not None:
+            counts.append(file_alignment_counts)
     return results, phonemes
 
-def main():
+
+def describe_file(file_path):
+    """Participant, band and children type of <children_type>/<band_id>/<participant_id>/<folder>/<file>.TextGrid."""
+    participant_directory = os.path.dirname(os.path.dirname(os.path.abspath(file_path)))
+    band_directory = os.path.dirname(participant_directory)
+    return {"participant": os.path.basename(participant_directory), "band": os.path.basename(band_directory),
+            "children_type": os.path.basename(os.path.dirname(band_directory))}
+
+
+# Unique column names of the columnar results; the phoneme sequences are list<string> columns and the rates float64
+SEQUENCE_COLUMNS = {"prediction": 2, "label": 3, "prediction_cv": 5, "label_cv": 6, "gt": 9, "gt_cv": 12}
+RATE_COLUMNS = {"error_rate_basic": 4, "error_rate_cv": 7, "error_rate_gt": 10, "error_rate_gt_cv": 13,
+                "error_rate_label_gt": 16, "error_rate_label_gt_cv": 19}
+
+
+def write_results_parquet(tasks, results, output_path, counts=None):
+    """
+    Write the rows of process_files as a typed Parquet table, with participant, band and children type columns,
+    and with the counts of process_files, the errors and reference length of every rate (bootstrap.count_columns).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    descriptions = [describe_file(file) for file, _ in tasks]
+    columns = {
+        "path": pa.array([os.path.abspath(file) for file, _ in tasks], pa.string()),
+        "filename": pa.array([row[0] for row in results], pa.string()),
+        "stage": pa.array([row[1] for row in results], pa.string()),
+    }
+    for name in ("participant", "band", "children_type"):
+        columns[name] = pa.array([description[name] for description in descriptions], pa.string())
+    for name, position in SEQUENCE_COLUMNS.items():
+        columns[name] = pa.array([row[position] for row in results], pa.list_(pa.string()))
+    for name, position in RATE_COLUMNS.items():
+        columns[name] = pa.array([row[position] for row in results], pa.float64(), from_pandas=True)
+    if counts is not None:
+        errors, reference_lengths = file_counts(counts)
+        for column, name in enumerate(RATE_NAMES):
+            errors_column, reference_column = count_columns(name)
+            columns[errors_column] = pa.array(errors[:, column], pa.int64())
+            columns[reference_column] = pa.array(reference_lengths[:, column], pa.int64())
+    pq.write_table(pa.table(columns), output_path)
+
+
+def index_results(tasks, results, index):
+    """Add the label phonemes of every evaluated file to a PhonemeIndex."""
+    index.add_files({"path": file, "filename": row[0], "stage": row[1], "phonemes": row[SEQUENCE_COLUMNS["label"]], **describe_file(file)}
+                    for (file, _), row in zip(tasks, results))
+
+
+def process_stage(files, stage_name, ground_truth, missing=None, workers=1):
+    """
+    Compute the error rates of every file of a stage.
+    ground_truth is the index built by load_ground_truth. Files whose word is not in it get NaN ground-truth
+    error rates and are reported, and appended to `missing` as (filename, stage, word) when a list is given.
+    """
+    return process_files([(file, stage_name) for file in files], ground_truth, missing, workers)
+
+def main(inpath="/mnt/data/ying/SMAAT_1st_iterative_learning/SSD/Band_4", workers=None, store_path=None, index_path=None,
+         log_level="WARNING", timings_path=None, profile_path=None, manifest_path=None,
+         ground_truth_path="/home/ying/preprocess_SMAAT/stages_words.csv", ci_path=None, resamples=10000, confusion_path=None):
+    """
+    Error rates of every model output TextGrid of a band, per stage. The optional outputs are only written when
+    their path is given: store_path (result store reused across runs), index_path (phoneme index), timings_path,
+    ci_path (bootstrap intervals) and confusion_path (phoneme confusions); manifest_path keeps the directory
+    listings between runs.
+    """
+    configure_logging(log_level)
     stage = {
         'stage3': ['ba', 'eye', 'map', 'um', 'ham', 'papa', 'bob', 'pam', 'pup','pie'],
         'stage4': ['boy', 'b', 'peep', 'bush', 'moon', 'phone', 'feet', 'fish', 'wash', 'show'],
@@ -166,58 +266,96 @@ def main():
     }
     
     files_by_stage = {key: [] for key in stage}
-    inpath = "/mnt/data/ying/SMAAT_1st_iterative_learning/SSD/Band_4"
     
-    for _f in os.listdir(inpath):
-        parent_f = os.path.join(inpath, _f)
-        # if _f in ["336_Maddie", "343_Alice", "388_Archie", "409_Lotti", "465_Claire"]:
-        #     continue
+    # the participant directories are listed through the corpus manifest, which reuses a listing while the
+    # directory is unchanged (manifest_path=None lists them again on every run)
+    manifest = CorpusManifest(manifest_path if manifest_path else ":memory:")
+    # if _f in ["336_Maddie", "343_Alice", "388_Archie", "409_Lotti", "465_Claire"]:
+    #     continue
+    for file_path, file_name in manifest.agreement_files(inpath, 'ml_tg_no_max_before_using_smaat'):
+        word = file_name.split('_')[-1].split('.')[0]
         
-        input_directory = os.path.join(parent_f, 'ml_tg_no_max_before_using_smaat')
-        for file_name in os.listdir(input_directory):
-            file_path = os.path.join(input_directory, file_name)
-            word = file_name.split('_')[-1].split('.')[0]
-            
-            for stage_name, words in stage.items():
-                if word in words:
-                    files_by_stage[stage_name].append(file_path)
-                    break
+        for stage_name, words in stage.items():
+            if word in words:
+                files_by_stage[stage_name].append(file_path)
+                break
+    manifest.close()
     
-    df = pd.read_csv("/home/ying/preprocess_SMAAT/stages_words.csv")
-    all_results = []
-    all_phonemes = set()
+    ground_truth = load_ground_truth(ground_truth_path)
+    missing = []
+    counts = []
     
-    for stage_name, files in files_by_stage.items():
-        results, phonemes = process_stage(files, stage_name, df)
-        all_results.extend(results)
-        all_phonemes.update(phonemes)
+    # every file of every stage goes to the pool at once; rows come back in stage, then file order
+    tasks = [(file, stage_name) for stage_name, files in files_by_stage.items() for file in files]
+    # unchanged TextGrids are read back from the result store instead of being recomputed (store_path=None disables it)
+    store = ResultStore(store_path) if store_path else None
+    with profiling(profile_path):
+        all_results, all_phonemes = process_files(tasks, ground_truth, missing, workers, store=store, counts=counts)
+    if store is not None:
+        store.close()
+
+    if missing:
+        pd.DataFrame(missing, columns=["Filename", "Stage", "Word"]).to_csv("missing_ground_truth.csv", index=False)
+        print(f"ATTENTION!!! {len(missing)} file(s) have no ground truth; see missing_ground_truth.csv")
     
     results_df = pd.DataFrame(all_results, columns=["Filename", "Stage", "Prediction", "Label", "Error_Rate_Basic", "Prediction_CV", "Label_CV", "Error_Rate_CV", "Prediction", "GT", "Error_Rate_GT", "Prediction_CV", "GT_CV", "Error_Rate_GT_CV", "label", "gt", "error_rate_label_gt", "label_cv", "gt_cv", "error_rate_label_gt_cv"])
     results_df.to_csv("error_rates_by_stage_with_diacritics.csv", index=False)
+    try:
+        write_results_parquet(tasks, all_results, "error_rates_by_stage_with_diacritics.parquet", counts)
+    except ImportError:
+        print("ATTENTION!!! pyarrow is not installed; the Parquet results are not written.")
+    if index_path:
+        index = PhonemeIndex(index_path)
+        index_results(tasks, all_results, index)
+        index.close()
+    if ci_path and tasks:
+        # per-stage and per-band bootstrap intervals, resampling participants
+        files = pd.DataFrame([{"stage": stage_name, **describe_file(file)} for file, stage_name in tasks])
+        errors, reference_lengths = file_counts(counts)
+        with timer("bootstrap"):
+            confidence_table(files, errors, reference_lengths, resamples=resamples, workers=workers).to_csv(ci_path, index=False)
+        print(f"Confidence intervals saved to {ci_path}")
+    if confusion_path and tasks:
+        # phoneme confusions of the prediction against the label and the ground truth, per stage and band
+        with timer("confusion"):
+            confusions = aggregate([{name: row[SEQUENCE_COLUMNS[name]] for name in ("prediction", "label", "gt")} for row in all_results],
+                                   [(stage_name, describe_file(file)["band"]) for file, stage_name in tasks], workers)
+        confusions.to_frame().to_csv(confusion_path, index=False)
+        print(f"Phoneme confusions saved to {confusion_path}")
     phoneme_df = pd.DataFrame(all_phonemes, columns=["phoneme"])
     phoneme_df.to_csv("all_phonemes_filename_with_diacritics.csv", index=False)
     print("Error rates saved to error_rates_by_stage.csv")
     print(all_phonemes, len(all_phonemes))
+    if timings_path:
+        write_summary(timings_path, inpath=inpath, workers=workers)
 
+import ast
 import csv
 from collections import defaultdict
 
 def extract_phonemes(csv_file, output_file):
     phoneme_dict = defaultdict(set)  # Dictionary to store phonemes and their corresponding filenames
-    # print()
-    with open(csv_file, newline='', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        headers = next(reader)  # Read the header row
-        
-        filename_index = 0  # First column (filename)
-        label_index = headers.index("Label")  # Find index of 'Label' column
-        
-        for row in reader:
-            filename = row[filename_index]
-            phonemes = eval(row[label_index])  # Convert string representation of list to actual list
-            
+    if csv_file.endswith(".parquet"):
+        # the Parquet results already hold the label as a list column
+        import pyarrow.parquet as pq
+        table = pq.read_table(csv_file, columns=["filename", "label"])
+        for filename, phonemes in zip(table.column("filename").to_pylist(), table.column("label").to_pylist()):
             for phoneme in phonemes:
                 phoneme_dict[phoneme].add(filename)
+    else:
+        with open(csv_file, newline='', encoding='utf-8') as file:
+            reader = csv.reader(file)
+            headers = next(reader)  # Read the header row
+            
+            filename_index = 0  # First column (filename)
+            label_index = headers.index("Label")  # Find index of 'Label' column
+            
+            for row in reader:
+                filename = row[filename_index]
+                phonemes = ast.literal_eval(row[label_index])  # Convert string representation of list to actual list
+                
+                for phoneme in phonemes:
+                    phoneme_dict[phoneme].add(filename)
     # Save results to a CSV file
     with open(output_file, mode='w', newline='', encoding='utf-8') as file:
         writer = csv.writer(file)
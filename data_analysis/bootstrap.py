@@ -0,0 +1,198 @@
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from data_analysis.edit_distance import FILE_RATES, HITS, SUBSTITUTIONS, DELETIONS, INSERTIONS, file_error_rates
+
+"""
+Bootstrap confidence intervals for the AI/clinician agreement rates, per stage, per band or any other grouping.
+
+Input is the per-file alignment counts AI_clinician_agreement stores with its results: for each of the six rates
+(FILE_RATES) the errors S + D + I and the reference length H + S + D of the file. The rate of a group of files is
+either pooled (total errors over total reference length, the default) or the mean of the per-file rates; files
+without ground truth have an empty reference and drop out of the ground-truth rates, as they do from the rows.
+
+Resampling unit: participants by default (a cluster bootstrap: all files of a drawn participant come along, since
+the files of one child are not independent), or files. The counts are first summed per unit, so a resample is a
+vector of draw counts over the units; a block of resamples is built from one (resamples x units) index matrix
+with a single bincount, and the pooled totals of the whole block are one matrix product. There is no Python loop
+over resamples or files. Resamples are drawn in blocks of BLOCK_SIZE, each block with its own seed spawned from
+--seed, so the intervals are the same whatever the number of worker processes the blocks are spread over.
+
+Intervals are percentile intervals (--confidence, default 0.95).
+
+CLI usage example:
+python bootstrap.py error_rates_by_stage_with_diacritics.parquet --resamples 10000 --workers 4 --output error_rates_ci.csv
+python bootstrap.py error_rates_by_stage_with_diacritics.parquet --by stage --unit file --statistic mean
+"""
+
+DEFAULT_RESAMPLES = 10000
+BLOCK_SIZE = 1000
+# group keys -> column sets of one table; a column that is not grouped on is filled with "all"
+DEFAULT_GROUPINGS = (("stage",), ("band",), ("stage", "band"))
+RATE_NAMES = tuple(name for name, _, _ in FILE_RATES)
+
+
+def count_columns(rate_name):
+    """Names of the (errors, reference length) count columns of a rate, e.g. errors_basic, reference_length_basic."""
+    key = rate_name[len("error_rate_"):]
+    return f"errors_{key}", f"reference_length_{key}"
+
+
+def file_counts(counts):
+    """
+    (errors, reference lengths), both (files x rates) int64, from per-file alignment counts: for each file, one
+    (hits, substitutions, deletions, insertions) per rate of FILE_RATES.
+    """
+    counts = np.asarray(counts, dtype=np.int64).reshape(-1, len(FILE_RATES), 4)
+    errors = counts[:, :, SUBSTITUTIONS] + counts[:, :, DELETIONS] + counts[:, :, INSERTIONS]
+    reference_lengths = counts[:, :, HITS] + counts[:, :, SUBSTITUTIONS] + counts[:, :, DELETIONS]
+    return errors, reference_lengths
+
+
+def load_counts(parquet_path):
+    """
+    Read the Parquet results of AI_clinician_agreement: (DataFrame of the file columns, errors, reference lengths).
+    Results written before the count columns existed get their counts recomputed from the phoneme sequences.
+    """
+    import pyarrow.parquet as pq
+    table = pq.read_table(parquet_path)
+    files = table.select([name for name in ("path", "filename", "stage", "participant", "band", "children_type") if name in table.column_names]).to_pandas()
+    columns = [column for name in RATE_NAMES for column in count_columns(name)]
+    if all(column in table.column_names for column in columns):
+        errors = np.column_stack([table.column(count_columns(name)[0]).to_numpy() for name in RATE_NAMES]).astype(np.int64)
+        reference_lengths = np.column_stack([table.column(count_columns(name)[1]).to_numpy() for name in RATE_NAMES]).astype(np.int64)
+        return files, errors, reference_lengths
+    print(f"ATTENTION!!! {parquet_path} has no count columns; the counts are recomputed from the phoneme sequences.")
+    sequences = table.select(["prediction", "label", "prediction_cv", "label_cv", "gt", "gt_cv"]).to_pylist()
+    rates = file_error_rates(sequences)
+    errors, reference_lengths = file_counts([[file[name][1] for name in RATE_NAMES] for file in rates])
+    return files, errors, reference_lengths
+
+
+def unit_totals(errors, reference_lengths, units=None, statistic="pooled"):
+    """
+    (numerators, denominators), both (units x rates) float64, whose ratio of sums is the statistic of a set of units.
+    pooled: errors over reference lengths. mean: per-file rates over the number of files with a reference.
+    units: one unit label per file (e.g. the participant); None makes every file its own unit.
+    """
+    if statistic == "pooled":
+        numerators, denominators = errors.astype(np.float64), reference_lengths.astype(np.float64)
+    elif statistic == "mean":
+        valid = reference_lengths > 0
+        numerators = np.where(valid, errors / np.maximum(reference_lengths, 1), 0.0)
+        denominators = valid.astype(np.float64)
+    else:
+        raise ValueError(f"Unknown statistic '{statistic}' (expected 'pooled' or 'mean').")
+    if units is None:
+        return numerators, denominators
+    _, inverse = np.unique(np.asarray(units), return_inverse=True)
+    summed_numerators = np.zeros((inverse.max() + 1, numerators.shape[1]))
+    summed_denominators = np.zeros_like(summed_numerators)
+    np.add.at(summed_numerators, inverse, numerators)
+    np.add.at(summed_denominators, inverse, denominators)
+    return summed_numerators, summed_denominators
+
+
+def _ratio(numerators, denominators):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denominators > 0, numerators / np.where(denominators > 0, denominators, 1), np.nan)
+
+
+def resample_block(numerators, denominators, resamples, seed):
+    """The statistic of `resamples` bootstrap resamples of the units: a (resamples x rates) array."""
+    rng = np.random.default_rng(seed)
+    units = len(numerators)
+    # row b of the index matrix holds the units drawn by resample b; the bincount turns it into draw counts
+    draws = rng.integers(0, units, size=(resamples, units))
+    weights = np.bincount((draws + units * np.arange(resamples)[:, None]).ravel(), minlength=resamples * units)
+    weights = weights.reshape(resamples, units).astype(np.float64)
+    return _ratio(weights @ numerators, weights @ denominators)
+
+
+def _resample_block_task(arguments):
+    return resample_block(*arguments)
+
+
+def bootstrap_rates(numerators, denominators, resamples=DEFAULT_RESAMPLES, confidence=0.95, seed=0, executor=None):
+    """
+    Point estimates and percentile intervals of the rates of a set of units (see unit_totals).
+    Returns (estimate, low, high), each with one value per rate (NaN when no unit has a reference).
+    The blocks of resamples run on the executor when one is given.
+    """
+    estimate = _ratio(numerators.sum(axis=0), denominators.sum(axis=0))
+    if len(numerators) == 0:
+        return estimate, estimate.copy(), estimate.copy()
+    sizes = [min(BLOCK_SIZE, resamples - start) for start in range(0, resamples, BLOCK_SIZE)]
+    tasks = [(numerators, denominators, size, block_seed) for size, block_seed in zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes)))]
+    if executor is None or len(tasks) <= 1:
+        blocks = list(map(_resample_block_task, tasks))
+    else:
+        blocks = list(executor.map(_resample_block_task, tasks))
+    statistics = np.concatenate(blocks)
+    alpha = (1 - confidence) / 2
+    low, high = np.full_like(estimate, np.nan), np.full_like(estimate, np.nan)
+    for column in range(statistics.shape[1]):
+        values = statistics[:, column]
+        values = values[~np.isnan(values)]
+        if len(values):
+            low[column], high[column] = np.quantile(values, [alpha, 1 - alpha])
+    return estimate, low, high
+
+
+def confidence_table(files, errors, reference_lengths, groupings=DEFAULT_GROUPINGS, unit="participant", statistic="pooled",
+                     resamples=DEFAULT_RESAMPLES, confidence=0.95, seed=0, workers=1):
+    """
+    One row per group of every grouping: the group keys ("all" for a column the grouping does not use), the
+    number of files and units, and for every rate its estimate and <rate>_ci_low / <rate>_ci_high.
+    files: DataFrame with one row per file holding the grouping columns (and the unit column unless unit == "file").
+    """
+    key_columns = list(dict.fromkeys(column for grouping in groupings for column in grouping))
+    rows = []
+    executor = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    try:
+        for grouping in groupings:
+            for keys, group in files.groupby(list(grouping), sort=True) if grouping else [((), files)]:
+                keys = keys if isinstance(keys, tuple) else (keys,)
+                positions = files.index.get_indexer(group.index)
+                units = None if unit == "file" else group[unit].to_numpy()
+                numerators, denominators = unit_totals(errors[positions], reference_lengths[positions], units, statistic)
+                estimate, low, high = bootstrap_rates(numerators, denominators, resamples, confidence, seed, executor)
+                row = {column: "all" for column in key_columns}
+                row.update(zip(grouping, keys))
+                row.update({"files": len(group), "units": len(numerators)})
+                for column, name in enumerate(RATE_NAMES):
+                    row.update({name: estimate[column], f"{name}_ci_low": low[column], f"{name}_ci_high": high[column]})
+                rows.append(row)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap confidence intervals of the agreement rates per stage and per band.")
+    parser.add_argument('parquet_path', type=str, help="Parquet results written by AI_clinician_agreement.")
+    parser.add_argument('--by', nargs='+', default=None, help="Group on these columns only (default: stage, band, and stage x band).")
+    parser.add_argument('--unit', type=str, default="participant", choices=["participant", "file"], help="Resampling unit.")
+    parser.add_argument('--statistic', type=str, default="pooled", choices=["pooled", "mean"], help="Pooled rate or mean of the per-file rates.")
+    parser.add_argument('--resamples', type=int, default=DEFAULT_RESAMPLES, help="Number of bootstrap resamples.")
+    parser.add_argument('--confidence', type=float, default=0.95, help="Confidence level of the intervals.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes (1 runs in-process).")
+    parser.add_argument('--output', type=str, default="error_rates_ci.csv", help="CSV file for the intervals.")
+    args = parser.parse_args()
+
+    files, errors, reference_lengths = load_counts(args.parquet_path)
+    groupings = [tuple(args.by)] if args.by else DEFAULT_GROUPINGS
+    table = confidence_table(files, errors, reference_lengths, groupings, args.unit, args.statistic, args.resamples, args.confidence,
+                             args.seed, args.workers)
+    table.to_csv(args.output, index=False)
+    print(f"Intervals of {len(table)} group(s) saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from data_analysis.edit_distance import edit_operations, encode
+from data_analysis.ipa_normalization import PhonemeInterner
+
+"""
+Alignment-based phoneme confusion matrices for the AI/clinician agreement.
+
+Every file is aligned as for its error rates (edit_distance.edit_operations, the alignment jiwer reports) and each
+aligned position is counted in a (reference phoneme, hypothesis phoneme) cell: the diagonal holds the hits, the
+other cells the substitutions, and the row and column of EPSILON (index 0, the empty side) the insertions and
+deletions. The comparisons are CONFUSION_PAIRS: the prediction against the clinician label and against the ground
+truth. Files with an empty reference (no ground truth) are left out of that comparison, as they are from the rates.
+
+A ConfusionAccumulator holds one phoneme vocabulary and one dense int64 matrix per (comparison, stage, band).
+Its size depends on the vocabulary (a few dozen phonemes) and the number of stages and bands, not on the number of
+files, so a whole corpus is aggregated in bounded memory. aggregate() gives each worker process a chunk of files;
+each returns its own partial accumulator, and merge() adds one accumulator into another by mapping its vocabulary
+once and adding the matrices.
+
+Exports: a long table (comparison, <grouping columns>, reference, hypothesis, count) summed to any grouping of stage
+and band, and square matrices with the phonemes as row and column labels.
+
+CLI usage example (from the Parquet results of AI_clinician_agreement):
+python confusion.py error_rates_by_stage_with_diacritics.parquet --by stage --output confusion_by_stage.csv
+python confusion.py error_rates_by_stage_with_diacritics.parquet --by band --wide-dir confusion_matrices
+"""
+
+EPSILON = "ε"
+# (comparison, reference sequence, hypothesis sequence)
+CONFUSION_PAIRS = (
+    ("prediction_vs_label", "label", "prediction"),
+    ("prediction_vs_gt", "gt", "prediction"),
+)
+KEY_COLUMNS = ("stage", "band")
+
+
+class ConfusionAccumulator:
+    def __init__(self):
+        self.vocabulary = PhonemeInterner()
+        # index 0 is the empty side of an insertion or deletion; tokens are never empty, so it cannot clash
+        self.vocabulary[EPSILON]
+        # (comparison, stage, band) -> (size x size) counts, reference phoneme in rows
+        self.matrices = {}
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    def _grow(self, size):
+        for key, matrix in self.matrices.items():
+            if len(matrix) < size:
+                grown = np.zeros((size, size), dtype=np.int64)
+                grown[:len(matrix), :len(matrix)] = matrix
+                self.matrices[key] = grown
+
+    def _matrix(self, key):
+        if key not in self.matrices:
+            self.matrices[key] = np.zeros((len(self), len(self)), dtype=np.int64)
+        return self.matrices[key]
+
+    def add_files(self, files, keys, comparisons=CONFUSION_PAIRS):
+        """
+        Align and count a batch of files in one edit-distance call.
+        files: dicts with the sequences of the comparisons; keys: the (stage, band) of each file.
+        """
+        references, hypotheses, targets = [], [], []
+        for file, key in zip(files, keys):
+            for comparison, reference, hypothesis in comparisons:
+                references.append(file[reference])
+                hypotheses.append(file[hypothesis])
+                targets.append((comparison, *key))
+        references = encode(references, self.vocabulary)
+        hypotheses = encode(hypotheses, self.vocabulary)
+        kept = [index for index, reference in enumerate(references) if reference]
+        self._grow(len(self))
+        if not kept:
+            return
+        alignment = []
+        edit_operations([references[index] for index in kept], [hypotheses[index] for index in kept], alignment)
+
+        pairs = np.concatenate([pair for pair, _, _ in alignment])
+        reference_ids = np.concatenate([ids for _, ids, _ in alignment])
+        hypothesis_ids = np.concatenate([ids for _, _, ids in alignment])
+        # -1 (empty side) -> EPSILON
+        reference_ids = np.maximum(reference_ids, 0)
+        hypothesis_ids = np.maximum(hypothesis_ids, 0)
+        key_ids = {}
+        pair_keys = np.array([key_ids.setdefault(targets[index], len(key_ids)) for index in kept], dtype=np.int64)
+        position_keys = pair_keys[pairs] if len(pairs) else pairs
+        size = len(self)
+        # one bincount over (key, reference, hypothesis) cells for the whole batch
+        cells = np.bincount((position_keys * size + reference_ids) * size + hypothesis_ids, minlength=len(key_ids) * size * size)
+        for key, key_id in key_ids.items():
+            self._matrix(key)[:] += cells[key_id * size * size:(key_id + 1) * size * size].reshape(size, size)
+
+    def merge(self, other):
+        """Add the counts of another accumulator (e.g. of a worker) to this one."""
+        mapping = np.array([self.vocabulary[other.vocabulary.phoneme(index)] for index in range(len(other))], dtype=np.int64)
+        self._grow(len(self))
+        for key, matrix in other.matrices.items():
+            size = len(matrix)
+            self._matrix(key)[np.ix_(mapping[:size], mapping[:size])] += matrix
+        return self
+
+    def labels(self):
+        return [self.vocabulary.phoneme(index) for index in range(len(self))]
+
+    def matrix(self, comparison, **selection):
+        """(labels, matrix) of a comparison summed over every key matching the selection (e.g. stage="stage5")."""
+        total = np.zeros((len(self), len(self)), dtype=np.int64)
+        for (key_comparison, *values), matrix in self.matrices.items():
+            if key_comparison == comparison and all(dict(zip(KEY_COLUMNS, values))[column] == value for column, value in selection.items()):
+                total[:len(matrix), :len(matrix)] += matrix
+        return self.labels(), total
+
+    def to_frame(self, by=KEY_COLUMNS):
+        """
+        Long table of the non-zero cells: comparison, the `by` columns, reference, hypothesis, count. Cells are
+        ordered by phoneme (EPSILON first), whatever order the vocabulary was built in.
+        """
+        by = list(by)
+        labels = np.array(self.labels(), dtype=object)
+        order = np.array(sorted(range(len(self)), key=lambda index: (index != 0, labels[index])), dtype=np.int64)
+        totals = {}
+        for (comparison, *values), matrix in self.matrices.items():
+            group = (comparison, *(dict(zip(KEY_COLUMNS, values))[column] for column in by))
+            size = len(matrix)
+            if group not in totals:
+                totals[group] = np.zeros((len(self), len(self)), dtype=np.int64)
+            totals[group][:size, :size] += matrix
+        frames = []
+        for group, matrix in sorted(totals.items()):
+            matrix = matrix[np.ix_(order, order)]
+            rows, columns = np.nonzero(matrix)
+            frame = pd.DataFrame({"reference": labels[order[rows]], "hypothesis": labels[order[columns]], "count": matrix[rows, columns]})
+            for position, column in reversed(list(enumerate(["comparison"] + by))):
+                frame.insert(0, column, group[position])
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame(columns=["comparison"] + by + ["reference", "hypothesis", "count"])
+        return pd.concat(frames, ignore_index=True)
+
+
+def write_matrix_csv(path, labels, matrix):
+    """Square CSV of a matrix: reference phonemes down, hypothesis phonemes across; rows and columns that are all zero are dropped."""
+    used = (matrix.sum(axis=0) > 0) | (matrix.sum(axis=1) > 0)
+    labels = [label for label, keep in zip(labels, used) if keep]
+    pd.DataFrame(matrix[np.ix_(used, used)], index=labels, columns=labels).to_csv(path, index_label="reference")
+
+
+def _accumulate_chunk(files, keys):
+    accumulator = ConfusionAccumulator()
+    accumulator.add_files(files, keys)
+    return accumulator
+
+
+def aggregate(files, keys, workers=1, chunk_size=256):
+    """
+    ConfusionAccumulator of many files, in chunks of chunk_size spread over a pool of worker processes
+    (workers=1 runs in-process). Each chunk comes back as a partial accumulator merged into the result.
+    """
+    result = ConfusionAccumulator()
+    chunks = [(files[start:start + chunk_size], keys[start:start + chunk_size]) for start in range(0, len(files), chunk_size)]
+    if workers == 1 or len(chunks) <= 1:
+        for chunk_files, chunk_keys in chunks:
+            result.add_files(chunk_files, chunk_keys)
+        return result
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for partial in executor.map(_accumulate_chunk, *zip(*chunks)):
+            result.merge(partial)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Phoneme confusion matrices of the agreement results, per stage and per band.")
+    parser.add_argument('parquet_path', type=str, help="Parquet results written by AI_clinician_agreement.")
+    parser.add_argument('--by', nargs='*', default=list(KEY_COLUMNS), choices=list(KEY_COLUMNS), help="Group on these columns (none: the whole corpus).")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes (1 runs in-process).")
+    parser.add_argument('--output', type=str, default="phoneme_confusions.csv", help="CSV file for the long table.")
+    parser.add_argument('--wide-dir', dest='wide_directory', type=str, default=None, help="Also write one square matrix CSV per comparison and group to this directory.")
+    args = parser.parse_args()
+
+    import pyarrow.parquet as pq
+    table = pq.read_table(args.parquet_path, columns=["stage", "band", "prediction", "label", "gt"]).to_pylist()
+    accumulator = aggregate(table, [(row["stage"], row["band"]) for row in table], args.workers)
+    frame = accumulator.to_frame(args.by)
+    frame.to_csv(args.output, index=False)
+    print(f"{len(frame)} confusion cell(s) saved to {args.output}")
+    if args.wide_directory:
+        os.makedirs(args.wide_directory, exist_ok=True)
+        groups = sorted({(comparison, *(dict(zip(KEY_COLUMNS, values))[column] for column in args.by))
+                         for comparison, *values in accumulator.matrices})
+        for comparison, *values in groups:
+            labels, matrix = accumulator.matrix(comparison, **dict(zip(args.by, values)))
+            write_matrix_csv(os.path.join(args.wide_directory, "_".join([comparison, *values]) + ".csv"), labels, matrix)
+        print(f"{len(groups)} matrix file(s) saved to {args.wide_directory}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+'''Batched edit distance between phoneme sequences, used for the AI/clinician agreement error rates.
+
+Each sequence is a list of phoneme strings. As in jiwer, every element is stripped and split on whitespace
+and the pieces are concatenated, so the error rate of a pair equals jiwer.wer(" ".join(reference), " ".join(hypothesis)).
+Phonemes are mapped to integer IDs once (ipa_normalization.PhonemeInterner); the dynamic programme then runs over padded integer matrices with NumPy,
+one cell at a time for the whole batch, so thousands of pairs cost the same number of Python steps as the longest pair.
+
+For every pair the engine returns the hits, substitutions, deletions and insertions of a minimal alignment, with
+the same tie-breaking as jiwer's backtrace (rapidfuzz), and the error rate (S + D + I) / (H + S + D).
+An empty reference has no defined rate: jiwer raises, the engine returns NaN.
+'''
+
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from data_analysis.ipa_normalization import PhonemeInterner
+
+HITS, SUBSTITUTIONS, DELETIONS, INSERTIONS = range(4)
+
+# The six rates of one file, as (name, reference, hypothesis) over the sequences of get_prediction_label and the ground truth.
+FILE_RATES = (
+    ("error_rate_basic", "label", "prediction"),
+    ("error_rate_cv", "label_cv", "prediction_cv"),
+    ("error_rate_gt", "gt", "prediction"),
+    ("error_rate_gt_cv", "gt_cv", "prediction_cv"),
+    ("error_rate_label_gt", "gt", "label"),
+    ("error_rate_label_gt_cv", "gt_cv", "label_cv"),
+)
+
+
+def tokenize(sequence):
+    """Split every element on whitespace and flatten, dropping empty pieces (jiwer's default transform)."""
+    return [piece for element in sequence for piece in element.split()]
+
+
+def encode(sequences, vocabulary=None):
+    """Map token sequences to integer ID lists with a PhonemeInterner (a new one when none is given)."""
+    if vocabulary is None:
+        vocabulary = PhonemeInterner()
+    return [vocabulary.encode(tokenize(sequence)) for sequence in sequences]
+
+
+def _trim_affixes(reference, hypothesis):
+    """
+    Drop the common prefix and suffix (hits in any minimal alignment).
+    Returns (prefix length, suffix length, reference core, hypothesis core).
+    """
+    prefix = 0
+    shortest = min(len(reference), len(hypothesis))
+    while prefix < shortest and reference[prefix] == hypothesis[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < shortest - prefix and reference[-1 - suffix] == hypothesis[-1 - suffix]:
+        suffix += 1
+    return prefix, suffix, reference[prefix:len(reference) - suffix], hypothesis[prefix:len(hypothesis) - suffix]
+
+
+def _pad(encoded):
+    lengths = np.array([len(ids) for ids in encoded], dtype=np.int64)
+    matrix = np.full((len(encoded), max(lengths.max(initial=0), 1)), -1, dtype=np.int64)
+    for row, ids in enumerate(encoded):
+        matrix[row, :len(ids)] = ids
+    return matrix, lengths
+
+
+def edit_operations(references, hypotheses, alignment=None):
+    """
+    Alignment counts for each (reference, hypothesis) pair of integer ID sequences.
+    Returns an int64 array of shape (pairs, 4): hits, substitutions, deletions, insertions.
+
+    Like rapidfuzz (which jiwer uses), the common prefix and suffix are removed first and the alignment is
+    recovered from the end of the distance matrix, preferring a deletion, then an insertion, then the diagonal,
+    so that the split into substitutions, deletions and insertions is the one jiwer reports.
+
+    When a list is given as alignment, the aligned positions are appended to it as (pair index, reference ID,
+    hypothesis ID) int64 arrays, -1 standing for the missing side of a deletion or insertion; they add up to the
+    returned counts.
+    """
+    pairs = len(references)
+    counts = np.zeros((pairs, 4), dtype=np.int64)
+    if pairs == 0:
+        return counts
+    trimmed = [_trim_affixes(reference, hypothesis) for reference, hypothesis in zip(references, hypotheses)]
+    counts[:, HITS] = [prefix + suffix for prefix, suffix, _, _ in trimmed]
+    if alignment is not None:
+        affix_hits = [(index, token) for index, (reference, (prefix, suffix, _, _)) in enumerate(zip(references, trimmed))
+                      for token in list(reference[:prefix]) + list(reference[len(reference) - suffix:])]
+        indices = np.array([index for index, _ in affix_hits], dtype=np.int64)
+        tokens = np.array([token for _, token in affix_hits], dtype=np.int64)
+        alignment.append((indices, tokens, tokens))
+    reference, reference_lengths = _pad([core for _, _, core, _ in trimmed])
+    hypothesis, hypothesis_lengths = _pad([core for _, _, _, core in trimmed])
+    rows, columns = reference.shape[1], hypothesis.shape[1]
+
+    # cost[:, i, j]: distance between the first i reference and the first j hypothesis tokens
+    cost = np.empty((pairs, rows + 1, columns + 1), dtype=np.int64)
+    cost[:, :, 0] = np.arange(rows + 1)
+    cost[:, 0, :] = np.arange(columns + 1)
+    for i in range(1, rows + 1):
+        for j in range(1, columns + 1):
+            mismatch = reference[:, i - 1] != hypothesis[:, j - 1]
+            cost[:, i, j] = np.minimum(np.minimum(cost[:, i - 1, j], cost[:, i, j - 1]) + 1, cost[:, i - 1, j - 1] + mismatch)
+
+    # Backtrace the whole batch at once from (len(reference), len(hypothesis))
+    batch = np.arange(pairs)
+    i, j = reference_lengths.copy(), hypothesis_lengths.copy()
+    while True:
+        active = (i > 0) & (j > 0)
+        if not active.any():
+            break
+        above = np.maximum(i - 1, 0)
+        deletion = active & (cost[batch, i, j] - cost[batch, above, j] == 1)
+        step = active & ~deletion
+        j_next = j - step
+        insertion = step & (j_next > 0) & (cost[batch, i, j_next] - cost[batch, above, j_next] == -1)
+        diagonal = step & ~insertion
+        left = np.maximum(j - 1, 0)
+        same = reference[batch, above] == hypothesis[batch, left]
+
+        counts[:, HITS] += diagonal & same
+        counts[:, SUBSTITUTIONS] += diagonal & ~same
+        counts[:, DELETIONS] += deletion
+        counts[:, INSERTIONS] += insertion
+        if alignment is not None:
+            aligned = np.flatnonzero(active)
+            alignment.append((aligned, np.where(insertion, -1, reference[batch, above])[aligned],
+                              np.where(deletion, -1, hypothesis[batch, left])[aligned]))
+        i -= deletion | diagonal
+        j = j_next
+    counts[:, DELETIONS] += i
+    counts[:, INSERTIONS] += j
+    if alignment is not None:
+        # what is left once one side is used up: the first i reference tokens deleted or the first j hypothesis tokens inserted
+        rows, positions = np.nonzero(np.arange(reference.shape[1]) < i[:, None])
+        alignment.append((rows, reference[rows, positions], np.full(len(rows), -1, dtype=np.int64)))
+        rows, positions = np.nonzero(np.arange(hypothesis.shape[1]) < j[:, None])
+        alignment.append((rows, np.full(len(rows), -1, dtype=np.int64), hypothesis[rows, positions]))
+    return counts
+
+
+def error_rates(counts):
+    """(S + D + I) / (H + S + D) for each row of edit_operations; NaN for an empty reference."""
+    errors = counts[:, SUBSTITUTIONS] + counts[:, DELETIONS] + counts[:, INSERTIONS]
+    reference_lengths = counts[:, HITS] + counts[:, SUBSTITUTIONS] + counts[:, DELETIONS]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(reference_lengths > 0, errors / np.maximum(reference_lengths, 1), np.nan)
+
+
+def pairwise_error_rates(references, hypotheses, vocabulary=None):
+    """Error rates and alignment counts for lists of phoneme-string sequences, in one batched call."""
+    if vocabulary is None:
+        vocabulary = PhonemeInterner()
+    counts = edit_operations(encode(references, vocabulary), encode(hypotheses, vocabulary))
+    return error_rates(counts), counts
+
+
+def file_error_rates(files):
+    """
+    The six agreement rates (FILE_RATES) of many files in one batched call.
+    files: list of dicts with the sequences prediction, label, prediction_cv, label_cv, gt and gt_cv.
+    Returns a list with, for each file, a dict mapping each rate name to (rate, counts) where counts is
+    (hits, substitutions, deletions, insertions).
+    """
+    references = [file[reference] for file in files for _, reference, _ in FILE_RATES]
+    hypotheses = [file[hypothesis] for file in files for _, _, hypothesis in FILE_RATES]
+    rates, counts = pairwise_error_rates(references, hypotheses)
+    rates = rates.reshape(len(files), len(FILE_RATES))
+    counts = counts.reshape(len(files), len(FILE_RATES), 4)
+    return [
+        {name: (float(rates[row, column]), tuple(counts[row, column].tolist())) for column, (name, _, _) in enumerate(FILE_RATES)}
+        for row in range(len(files))
+    ]
+
+
+def compare_with_jiwer(references, hypotheses):
+    """
+    Check the engine against jiwer on the given pairs (jiwer must be installed).
+    Returns the list of (index, engine result, jiwer result) that differ; empty when everything matches.
+    """
+    import jiwer
+
+    rates, counts = pairwise_error_rates(references, hypotheses)
+    differences = []
+    for index, (reference, hypothesis) in enumerate(zip(references, hypotheses)):
+        if not tokenize(reference):
+            continue
+        output = jiwer.process_words(" ".join(reference), " ".join(hypothesis))
+        expected = (output.wer, (output.hits, output.substitutions, output.deletions, output.insertions))
+        actual = (float(rates[index]), tuple(counts[index].tolist()))
+        if actual != expected:
+            differences.append((index, actual, expected))
+    return differences
@@ -0,0 +1,106 @@
+'''IPA normalization tables, built once at import and shared by the agreement scripts.
+
+- remove_diacritics / narrow_to_broad: NFD normalization followed by a single str.translate pass. The translate
+  tables drop diacritics (Unicode categories Mn, Sk, Lm and Po, except ',') and map narrow phonemes to their broad
+  equivalents (BROAD_MAPPING). Every mapping is one character to one character and no target is itself a key,
+  so one pass gives the same result as replacing the mappings one after the other.
+- ipa_to_cv: phoneme -> "V" / "C" / "U" lookup in a precomputed dict.
+- split_label: a phonetic tier label ("k, ʌ, p") -> phoneme tuple and CV tuple, memoized since the same
+  labels come back in every file of a word.
+- PhonemeInterner: phoneme -> integer ID, so that the edit-distance engine works on integers only.
+'''
+
+import unicodedata
+from functools import lru_cache
+
+VOWELS = frozenset({'u', 'j', 'ɯ', 'ʊ', 'a', 'ɘ', 'ɐ', 'i', 'ʌ', 'æ', 'ɒ', 'o', 'e', 'ɛ', 'ɜ', 'ɑ', 'ɨ', 'ɔ', 'ɵ', 'ə', 'ɪ', 'ʉ',
+                    "aɪ", "eɪ", "oʊ", "aʊ", "ɔɪ", "ɪə", "eə", "ai"})
+CONSONANTS = frozenset({'m', 't', 'b', 'f', 'x', 'ɱ', 'ɹ', 'v', 'c', 'w', 'β', 'n', 'h', 'r', 'ʧ', 'd', 's', 'p', 'q', 'ɤ', 'ŋ',
+                        'ʔ', 'ɾ', 'k', 'g', 'l', 'ʤ', 'ɡ', 'ʦ', 'ʃ'})
+CV_CLASSES = {**{phoneme: "C" for phoneme in CONSONANTS}, **{phoneme: "V" for phoneme in VOWELS}}
+
+# Narrow -> broad phoneme mappings for broad IPA transcription
+BROAD_MAPPING = {
+    'ʈ': 't',   # Retroflex "ʈ" → Alveolar "t"
+    'ʋ': 'v',   # Labiodental approximant "ʋ" → "v"
+    'ɦ': 'h',   # Voiced glottal fricative "ɦ" → "h"
+    'ɸ': 'f',   # Bilabial fricative "ɸ" → "f"
+    'ɣ': 'ɡ',   # Voiced velar fricative "ɣ" → "ɡ"
+    'ɭ': 'l',   # Retroflex lateral "ɭ" → "l"
+    'ʂ': 'ʃ',   # Retroflex fricative "ʂ" → "ʃ"
+    'ǃ': 'ʔ',   # Click "ǃ" → Glottal stop "ʔ"
+    'ǂ': 'ʔ',   # Alveolar click "ǂ" → Glottal stop "ʔ"
+    'ʘ': 'p',   # Bilabial click "ʘ" → Bilabial stop "p"
+    'ɶ': 'a',   # Open front rounded vowel "ɶ" → "a"
+    'ɞ': 'ɜ',   # Close-mid central rounded vowel "ɞ" → Open-mid central unrounded vowel "ɜ"
+    'œ': 'ɛ',   # Open-mid front rounded vowel "œ" → Open-mid front unrounded vowel "ɛ"
+    'θ': 'ɘ',   # Voiceless dental fricative "θ" → Close-mid central unrounded vowel "ɘ"
+    'ʙ': 'b',
+}
+
+DIACRITIC_CATEGORIES = frozenset({'Mn', 'Sk', 'Lm', 'Po'})
+
+
+class _TranslationTable(dict):
+    """str.translate table that decides each code point on first sight and remembers the answer."""
+
+    def __init__(self, mapping=None):
+        super().__init__((ord(narrow), broad) for narrow, broad in (mapping or {}).items())
+
+    def __missing__(self, code_point):
+        character = chr(code_point)
+        if unicodedata.category(character) in DIACRITIC_CATEGORIES and character != ',':
+            self[code_point] = None
+        else:
+            # unchanged characters are cached as well, so that translate never calls __missing__ for them again
+            self[code_point] = code_point
+        return self[code_point]
+
+
+_DIACRITICS_TABLE = _TranslationTable()
+_BROAD_TABLE = _TranslationTable(BROAD_MAPPING)
+
+
+def remove_diacritics(ipa_text):
+    """Removes all diacritics from narrow IPA transcription while preserving base phonemes."""
+    return unicodedata.normalize('NFD', ipa_text).translate(_DIACRITICS_TABLE)
+
+
+@lru_cache(maxsize=None)
+def narrow_to_broad(narrow_ipa):
+    """Broad IPA transcription of a narrow one: diacritics removed, then BROAD_MAPPING applied."""
+    return unicodedata.normalize('NFD', narrow_ipa).translate(_BROAD_TABLE)
+
+
+def ipa_to_cv(phoneme):
+    """"V" for a vowel, "C" for a consonant, "U" for anything else."""
+    return CV_CLASSES.get(phoneme, "U")
+
+
+@lru_cache(maxsize=None)
+def split_label(text):
+    """Phonemes of a phonetic tier label ("k, ʌ, p") and their CV classes, as two tuples."""
+    phonemes = tuple(phoneme.strip() for phoneme in text.split(','))
+    return phonemes, tuple(ipa_to_cv(phoneme) for phoneme in phonemes)
+
+
+class PhonemeInterner(dict):
+    """
+    phoneme -> integer ID, assigning the next ID to an unseen phoneme on lookup.
+    The IDs are stable for the lifetime of the interner; phoneme(ID) gives the string back.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._phonemes = []
+
+    def __missing__(self, phoneme):
+        self[phoneme] = len(self._phonemes)
+        self._phonemes.append(phoneme)
+        return self[phoneme]
+
+    def encode(self, phonemes):
+        return [self[phoneme] for phoneme in phonemes]
+
+    def phoneme(self, phoneme_id):
+        return self._phonemes[phoneme_id]
@@ -0,0 +1,86 @@
+import os
+import sqlite3
+import argparse
+
+"""
+Persistent inverted index from label phoneme to agreement files.
+
+AI_clinician_agreement adds every evaluated TextGrid with its stage, participant, band and children type, and
+the phonemes of its clinician label (the Label column of the results). Re-indexing a path replaces its postings,
+so one index file can collect the runs of every band and model iteration.
+
+CLI usage example (files whose label contains ɹ in stage 5 of Band_4):
+python phoneme_index.py phoneme_index.sqlite ɹ --stage stage5 --band Band_4
+"""
+
+
+class PhonemeIndex:
+    def __init__(self, database_path):
+        self.database_path = database_path
+        self.connection = sqlite3.connect(database_path, timeout=60)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, filename TEXT NOT NULL, "
+                                    "stage TEXT, participant TEXT, band TEXT, children_type TEXT)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS postings (phoneme TEXT NOT NULL, file_id INTEGER NOT NULL, "
+                                    "PRIMARY KEY (phoneme, file_id)) WITHOUT ROWID")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS postings_by_file ON postings (file_id)")
+
+    def close(self):
+        self.connection.close()
+
+    def add_files(self, files):
+        """
+        files: iterable of dicts with path, filename, stage, participant, band, children_type and phonemes
+        (the label phoneme list). Existing entries of the same paths are replaced.
+        """
+        with self.connection:
+            for file in files:
+                path = os.path.abspath(file["path"])
+                row = self.connection.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+                if row is not None:
+                    self.connection.execute("DELETE FROM postings WHERE file_id = ?", (row[0],))
+                    self.connection.execute("DELETE FROM files WHERE id = ?", (row[0],))
+                file_id = self.connection.execute(
+                    "INSERT INTO files (path, filename, stage, participant, band, children_type) VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, file["filename"], file["stage"], file["participant"], file["band"], file["children_type"])).lastrowid
+                self.connection.executemany("INSERT OR IGNORE INTO postings VALUES (?, ?)",
+                                            [(phoneme, file_id) for phoneme in set(file["phonemes"])])
+
+    def files_with(self, phoneme, stage=None, participant=None, band=None, children_type=None):
+        """(path, filename, stage, participant, band, children_type) of the files whose label contains the phoneme."""
+        query = ("SELECT files.path, files.filename, files.stage, files.participant, files.band, files.children_type "
+                 "FROM postings JOIN files ON files.id = postings.file_id WHERE postings.phoneme = ?")
+        parameters = [phoneme]
+        for column, value in (("stage", stage), ("participant", participant), ("band", band), ("children_type", children_type)):
+            if value is not None:
+                query += f" AND files.{column} = ?"
+                parameters.append(value)
+        return self.connection.execute(query + " ORDER BY files.path", parameters).fetchall()
+
+    def phonemes(self):
+        """Every indexed phoneme with the number of files containing it."""
+        return self.connection.execute("SELECT phoneme, COUNT(*) FROM postings GROUP BY phoneme ORDER BY phoneme").fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the agreement files whose label contains a phoneme.")
+    parser.add_argument('database_path', type=str, help="SQLite index written by AI_clinician_agreement.")
+    parser.add_argument('phoneme', type=str, nargs='?', help="Phoneme to look up; without it every phoneme is listed with its file count.")
+    parser.add_argument('--stage', type=str, help="Only files of this stage (e.g., stage5).")
+    parser.add_argument('--participant', type=str, help="Only files of this participant.")
+    parser.add_argument('--band', type=str, help="Only files of this band (e.g., Band_4).")
+    parser.add_argument('--children-type', dest='children_type', type=str, help="Only files of this children type (e.g., SSD).")
+    args = parser.parse_args()
+
+    index = PhonemeIndex(args.database_path)
+    if args.phoneme is None:
+        for phoneme, count in index.phonemes():
+            print(f"{phoneme}\t{count}")
+    else:
+        for path, *_ in index.files_with(args.phoneme, args.stage, args.participant, args.band, args.children_type):
+            print(path)
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import os
+import json
+import sqlite3
+import hashlib
+import argparse
+
+"""
+Persistent per-file store for the AI/clinician agreement results.
+
+One record per (TextGrid path, stage) holds the error-rate row, the label phonemes and the missing-ground-truth
+entry (or None) computed for that file. A record is reused only while both the SHA-256 of the TextGrid content and
+the version string match; the version combines the metric version of AI_clinician_agreement with a digest of the
+ground truth, so a changed metric or ground-truth CSV recomputes everything and an edited TextGrid recomputes itself.
+Records are JSON encoded; NaN rates survive the round trip.
+
+CLI usage example (print the size of a store):
+python result_store.py agreement_results.sqlite
+"""
+
+
+def textgrid_digest(file_path):
+    """SHA-256 of a TextGrid's content."""
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def ground_truth_digest(ground_truth):
+    """SHA-256 of a ground-truth index (word -> (IPA list, CV list)), independent of dict order."""
+    return hashlib.sha256(json.dumps(ground_truth, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+class ResultStore:
+    def __init__(self, database_path):
+        self.database_path = database_path
+        self.connection = sqlite3.connect(database_path, timeout=60)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS results (path TEXT NOT NULL, stage TEXT NOT NULL, digest TEXT NOT NULL, "
+                                    "version TEXT NOT NULL, record TEXT NOT NULL, PRIMARY KEY (path, stage))")
+
+    def close(self):
+        self.connection.close()
+
+    def fetch(self, keys, version):
+        """
+        keys: list of (path, stage, digest). Returns a list of the same length with the stored record of each
+        key, or None where nothing valid is stored (new file, changed content or other version).
+        """
+        records = []
+        for path, stage, digest in keys:
+            row = self.connection.execute("SELECT digest, version, record FROM results WHERE path = ? AND stage = ?",
+                                          (os.path.abspath(path), stage)).fetchone()
+            if row is None or row[0] != digest or row[1] != version:
+                records.append(None)
+            else:
+                records.append(json.loads(row[2]))
+        return records
+
+    def save(self, keys, records, version):
+        """Store one record per (path, stage, digest) key, replacing what was stored for that path and stage."""
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                                        [(os.path.abspath(path), stage, digest, version, json.dumps(record, ensure_ascii=False))
+                                         for (path, stage, digest), record in zip(keys, records)])
+
+    def stats(self):
+        """Number of stored records, in total and per version."""
+        versions = dict(self.connection.execute("SELECT version, COUNT(*) FROM results GROUP BY version").fetchall())
+        return {"records": sum(versions.values()), "versions": versions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the content of an agreement result store.")
+    parser.add_argument('database_path', type=str, help="SQLite file written by AI_clinician_agreement.")
+    args = parser.parse_args()
+
+    store = ResultStore(args.database_path)
+    stats = store.stats()
+    print(f"records: {stats['records']}")
+    for version, count in stats["versions"].items():
+        print(f"  {version}: {count}")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -7,22 +7,37 @@
 @University: Curtin University
 '''
 
-'''This file aims to generating the boundaries in textgrid format according to the provided csv timstamps.'''
+'''This file aims to generating the boundaries in textgrid format according to the provided csv timstamps.
+
+A whole annotation drop is converted with one command: every <name>.csv of the CSV directory is paired with
+<name>.wav and written to <output directory>/<name>.TextGrid by a pool of worker processes. Timecodes are converted
+for a whole file at once, and WAV durations are read from the file header without decoding the audio.
+
+CLI usage example:
+python csv_to_textgrid.py /path/to/csv_directory --wav-dir /path/to/wav_directory --output-dir /path/to/textgrid_directory --workers 8
+python csv_to_textgrid.py /path/to/C002.csv --wav-dir /path/to/wav_directory --output-dir /path/to/textgrid_directory
+'''
 import csv
-from praatio import textgrid
-import librosa
 import os
+import sys
+import argparse
+import traceback
+import numpy as np
+import soundfile as sf
+from concurrent.futures import ProcessPoolExecutor, as_completed
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.textgrid_io import TextGrid, IntervalTier, write_textgrid
+
+FRAME_RATE = 60
 
 
 def read_csv(path):
     try:
         words = []
-        intervals = []
-        intervals_no_labels = []
+        rows = []
         with open(path, encoding='utf-16', newline='') as f:
             reader = csv.reader(f)
             next(reader, None)  # skip the headers
-            initial_timestamp = 0
             for row in reader:
                 items = row[0].split('\t')
                 # Check if the row has at least 4 elements
@@ -30,21 +45,50 @@ def read_csv(path):
                     raise ValueError(f"ATTENTION!!! Invalid row encountered: {row}. Please open the CSV file in a text editor and "
                                      f"ensure each row contains at least 4 elements and does not include extra newlines.")
                 words.append(items[0])
-                onset_time = convert_time_format(items[2])
-                intervals.append((initial_timestamp, onset_time, ''))
-                intervals_no_labels.append((initial_timestamp, onset_time, ''))
-                offset_time = convert_time_format(items[3])
+                rows.append(items)
+
+        # all onsets and offsets of the file in one conversion
+        onset_times = convert_time_formats([items[2] for items in rows])
+        offset_times = convert_time_formats([items[3] for items in rows])
+        intervals = []
+        intervals_no_labels = []
+        initial_timestamp = 0
+        for items, onset_time, offset_time in zip(rows, onset_times, offset_times):
+            intervals.append((initial_timestamp, onset_time, ''))
+            intervals_no_labels.append((initial_timestamp, onset_time, ''))
 
-                intervals.append((onset_time, offset_time, items[0]))
-                intervals_no_labels.append((onset_time, offset_time, ''))
-                initial_timestamp = offset_time
+            intervals.append((onset_time, offset_time, items[0]))
+            intervals_no_labels.append((onset_time, offset_time, ''))
+            initial_timestamp = offset_time
 
-            return intervals, intervals_no_labels
+        return intervals, intervals_no_labels
     except Exception as e:
         print(f"ATTENTION!!! Error reading CSV file at {path}: {e}")
         raise  # Re-throw the exception after logging it
 
 
+def convert_time_formats(times):
+    """
+    Convert a list of HH:MM:SS:FF timecodes into seconds (a list of floats), with the same values as convert_time_format.
+    When every timecode has the fixed 11-character layout, the digits are decoded as a uint8 matrix in one go;
+    otherwise (other widths, invalid timecodes) each one goes through convert_time_format.
+    """
+    if not times:
+        return []
+    if all(len(time) == 11 for time in times):
+        try:
+            characters = np.frombuffer("".join(times).encode('ascii'), dtype=np.uint8).reshape(len(times), 11)
+        except UnicodeEncodeError:
+            characters = None
+        if characters is not None:
+            digits = characters[:, [0, 1, 3, 4, 6, 7, 9, 10]].astype(np.int64) - ord('0')
+            if (characters[:, [2, 5, 8]] == ord(':')).all() and ((digits >= 0) & (digits <= 9)).all():
+                hours, minutes, seconds, frames = (digits[:, 2 * i] * 10 + digits[:, 2 * i + 1] for i in range(4))
+                total_frames = hours * 60 * 60 * 60 + minutes * 60 * 60 + seconds * 60 + frames
+                return (total_frames / FRAME_RATE).tolist()
+    return [convert_time_format(time) for time in times]
+
+
 def convert_time_format(time):
     #     convert time into seconds
     try:
@@ -56,46 +100,124 @@ def convert_time_format(time):
         seconds = int(times[2])
         frames = int(times[3])
         total_frames = hours * 60 * 60 * 60 + minutes * 60 * 60 + seconds * 60 + frames
-        frame_rate = 60
+        frame_rate = FRAME_RATE
         final_seconds = total_frames/frame_rate
         return final_seconds
     except Exception as e:
         print(f"ATTENTION!!! Error converting time format: {time}. Error: {e}")
         return 0
+
+
+def wav_duration(wav_file_path):
+    """Duration in seconds from the WAV header (frames / sampling rate), without decoding the audio."""
+    info = sf.info(wav_file_path)
+    return info.frames / info.samplerate
+
+
+def build_textgrid(intervals, intervals_no_labels, duration):
+    """The four-tier (word, syllable, phonetic, error) TextGrid of a recording; the last silence is appended to the lists."""
+    intervals.append((intervals[-1][1], duration, ''))
+    intervals_no_labels.append((intervals_no_labels[-1][1], duration, ''))
+    tg = TextGrid(0, duration)
+    word_tier = IntervalTier.from_entries('word', intervals, 0, duration)
+    syllable_tier = IntervalTier.from_entries('syllable', intervals_no_labels, 0, duration)
+    phonetic_tier = IntervalTier.from_entries('phonetic', intervals_no_labels, 0, duration)
+    error_tier = IntervalTier.from_entries('error', intervals_no_labels, 0, duration)
+    tg.add_tier(word_tier)
+    tg.add_tier(syllable_tier)
+    tg.add_tier(phonetic_tier)
+    tg.add_tier(error_tier)
+    # Reject empty or overlapping intervals (e.g. overlapping timestamps in the CSV)
+    tg.validate()
+    return tg
+
+
 def generate_textgrid(wav_file_path, intervals, intervals_no_labels, output_path):
     try:
         # generate TextGrid files
-        duration = librosa.get_duration(path=wav_file_path)
-        intervals.append((intervals[-1][1], duration, ''))
-        intervals_no_labels.append((intervals_no_labels[-1][1], duration, ''))
-        tg = textgrid.Textgrid()
-        word_tier = textgrid.IntervalTier('word', intervals, 0, duration)
-        syllable_tier = textgrid.IntervalTier('syllable', intervals_no_labels, 0, duration)
-        phonetic_tier = textgrid.IntervalTier('phonetic', intervals_no_labels, 0, duration)
-        error_tier = textgrid.IntervalTier('error', intervals_no_labels, 0, duration)
-        tg.addTier(word_tier)
-        tg.addTier(syllable_tier)
-        tg.addTier(phonetic_tier)
-        tg.addTier(error_tier)
+        tg = build_textgrid(intervals, intervals_no_labels, wav_duration(wav_file_path))
         # Ensure output directory exists
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        tg.save(output_path, format="long_textgrid", includeBlankSpaces=False, minTimestamp=0, maxTimestamp=duration)
+        write_textgrid(tg, output_path)
         print(f"TextGrid file saved at {output_path}")
 
     except Exception as e:
         print(f"ATTENTION!!! Error generating TextGrid for {wav_file_path}: {e}")
 
-if __name__ == '__main__':
-    try:
-        # Please update the following three paths manually for each raw audio file
-        wav_file_path = "/wav/path/to/your/local/path/of/the/audio/file/C002.wav"
-        csv_file_path = "/csv/path/to/your/local/path/of/the/csv/file/C002.csv"
-        output_textgrid_path = "/output/path/to/your/local/path/of/the/textgrid/file/C002.TextGrid"
 
+def convert_recording(csv_file_path, wav_file_path, output_path):
+    """Convert one CSV/WAV pair. Returns None on success, or the formatted traceback."""
+    try:
         intervals, intervals_no_labels = read_csv(csv_file_path)
         if not intervals:
-            print("ATTENTION!!! No valid intervals generated. Exiting.")
-        else:
-            generate_textgrid(wav_file_path, intervals, intervals_no_labels, output_textgrid_path)
-    except Exception as e:
-        print(f"ATTENTION!!! Script stopped due to an error: {e}")
+            raise ValueError("ATTENTION!!! No valid intervals generated.")
+        tg = build_textgrid(intervals, intervals_no_labels, wav_duration(wav_file_path))
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        write_textgrid(tg, output_path)
+        return None
+    except Exception:
+        return traceback.format_exc()
+
+
+def find_recordings(csv_path, wav_directory=None, output_directory=None):
+    """
+    (csv, wav, TextGrid) paths for a CSV file or for every .csv of a directory. The WAV with the same name is
+    looked up in wav_directory (default: next to the CSV) and the TextGrid goes to output_directory (default: next to the WAV).
+    """
+    if os.path.isdir(csv_path):
+        csv_files = [os.path.join(csv_path, name) for name in sorted(os.listdir(csv_path)) if name.lower().endswith('.csv')]
+    else:
+        csv_files = [csv_path]
+    recordings = []
+    for csv_file_path in csv_files:
+        name = os.path.splitext(os.path.basename(csv_file_path))[0]
+        wav_file_path = os.path.join(wav_directory or os.path.dirname(csv_file_path), f"{name}.wav")
+        recordings.append((csv_file_path, wav_file_path, os.path.join(output_directory or os.path.dirname(wav_file_path), f"{name}.TextGrid")))
+    return recordings
+
+
+def convert_all(recordings, workers=None):
+    """Convert (csv, wav, TextGrid) triples with a pool of worker processes. Returns [(triple, traceback)] of the failures."""
+    failures = []
+    total = len(recordings)
+
+    def report(done, index, error):
+        status = "ok" if error is None else "FAILED"
+        print(f"[{done}/{total}] {recordings[index][2]} {status}")
+        if error is not None:
+            failures.append((index, recordings[index], error))
+
+    if workers == 1 or total <= 1:
+        for index, recording in enumerate(recordings):
+            report(index + 1, index, convert_recording(*recording))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(convert_recording, *recording): index for index, recording in enumerate(recordings)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                report(done, futures[future], future.result())
+    failures.sort(key=lambda failure: failure[0])
+    return [(recording, error) for _, recording, error in failures]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate four-tier TextGrids from the annotation CSV timestamps of one recording or a whole directory.")
+    parser.add_argument('csv_path', type=str, help="Annotation CSV file (UTF-16, tab separated), or a directory of them.")
+    parser.add_argument('--wav-dir', dest='wav_directory', type=str, default=None, help="Directory of the <name>.wav files (default: next to the CSVs).")
+    parser.add_argument('--output-dir', dest='output_directory', type=str, default=None, help="Directory for the <name>.TextGrid files (default: next to the WAVs).")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes (1 runs in-process).")
+    args = parser.parse_args()
+
+    recordings = find_recordings(args.csv_path, args.wav_directory, args.output_directory)
+    if not recordings:
+        sys.exit(f"ATTENTION!!! No CSV file found in {args.csv_path}.")
+    failures = convert_all(recordings, args.workers)
+    if failures:
+        print(f"\n{len(failures)} recording(s) failed:")
+        for (csv_file_path, _, _), error in failures:
+            print(f"--- {csv_file_path}\n{error}")
+        sys.exit(1)
+    print(f"All {len(recordings)} TextGrid(s) generated.")
+
+
+if __name__ == '__main__':
+    main()
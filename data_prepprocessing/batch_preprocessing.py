@@ -0,0 +1,213 @@
+import os
+import sys
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from data_prepprocessing import crop_textgrid, preprocessing_audio, participant_pipeline, resampling
+from data_prepprocessing.export_queue import ExportQueue, DEFAULT_WRITERS
+from common.instrumentation import configure_logging, collecting, current_metrics, count, profiling, write_summary
+from common.corpus_manifest import CorpusManifest, BLOCKING_ISSUES, describe_issues
+
+"""
+Run crop_textgrid and preprocessing_audio over a whole corpus in one process launch.
+
+Expected corpus layout (the one process_audio and process_textgrid read from):
+    <corpus_root>/<children_type>/<band_id>/new_TG/<participant_id>/<audio_id>.TextGrid
+    <corpus_root>/<children_type>/<band_id>/new_TG/<participant_id>/<audio_id>.wav
+
+Every TextGrid/WAV pair is processed in a worker process. When both steps run, the pair goes through
+participant_pipeline.process_recording, which parses its TextGrid once for the crops and the clips, and its files
+are written by --writers background threads per worker (export_queue.py; 0 writes inline, best on a fast local disk).
+A failing pair is reported with its traceback and the batch carries on; the summary at the end lists all failures.
+The pairs are found by walking the corpus directories. With --manifest they come from the corpus manifest instead
+(common/corpus_manifest.py), which is brought up to date first by re-reading only new or changed files. Recordings
+the manifest flags as unprocessable (a missing WAV, a missing tier, word and phonetic tiers of different lengths,
+an unreadable file) are then reported as failures up front instead of failing in a worker. A WAV without a
+TextGrid is skipped, as the directory walk skips it.
+Each worker returns the stage timings and counters of its pair (common/instrumentation.py); they are merged in
+the parent, and --timings writes the totals for the whole batch as JSON.
+
+CLI usage example:
+python batch_preprocessing.py /mnt/data/ying/SMAAT_1st_iterative_learning --children-type TD --band Band_3 --workers 8
+python batch_preprocessing.py /mnt/data/ying/SMAAT_1st_iterative_learning --workers 8 --timings batch_timings.json
+python batch_preprocessing.py /mnt/data/ying/SMAAT_1st_iterative_learning --workers 8 --manifest corpus_manifest.sqlite
+"""
+
+STEPS = ("crop", "audio")
+
+
+def discover_pairs(corpus_root, children_types=None, bands=None):
+    """
+    Find every <audio_id>.TextGrid / <audio_id>.wav pair under the corpus root.
+    A TextGrid without its WAV is still returned (audio_path None) so that it is reported, not skipped.
+    """
+    items = []
+    for children_type in sorted(os.listdir(corpus_root)):
+        if children_types and children_type not in children_types:
+            continue
+        type_directory = os.path.join(corpus_root, children_type)
+        if not os.path.isdir(type_directory):
+            continue
+        for band_id in sorted(os.listdir(type_directory)):
+            if bands and band_id not in bands:
+                continue
+            band_directory = os.path.join(type_directory, band_id, "new_TG")
+            if not os.path.isdir(band_directory):
+                continue
+            for participant_id in sorted(os.listdir(band_directory)):
+                participant_directory = os.path.join(band_directory, participant_id)
+                if not os.path.isdir(participant_directory):
+                    continue
+                for file_name in sorted(os.listdir(participant_directory)):
+                    if not file_name.endswith('.TextGrid'):
+                        continue
+                    audio_id = file_name[:-len('.TextGrid')]
+                    audio_path = os.path.join(participant_directory, f"{audio_id}.wav")
+                    items.append({
+                        "textgrid_path": os.path.join(participant_directory, file_name),
+                        "audio_path": audio_path if os.path.exists(audio_path) else None,
+                        "children_type": children_type,
+                        "band_id": band_id,
+                        "participant_id": participant_id,
+                        "audio_id": audio_id,
+                    })
+    return items
+
+
+def process_pair(item, corpus_root, steps=STEPS, streaming=False, keep_resampled=True, cache_directory=None, syllables=False, res_type="soxr_hq",
+                 writers=DEFAULT_WRITERS):
+    """
+    Run the requested steps for one pair.
+    Returns (None on success or the formatted traceback, snapshot of the pair's timings and counters).
+    """
+    with collecting() as metrics:
+        try:
+            if item["audio_path"] is None:
+                raise FileNotFoundError(f"No WAV file next to {item['textgrid_path']}.")
+            if "crop" in steps and "audio" in steps:
+                with ExportQueue(workers=writers) as export_queue:
+                    participant_pipeline.process_recording(item["textgrid_path"], item["children_type"], item["band_id"],
+                                                           item["participant_id"], item["audio_id"], corpus_root=corpus_root,
+                                                           syllables=syllables, streaming=streaming, keep_resampled=keep_resampled,
+                                                           cache_directory=cache_directory, res_type=res_type, export_queue=export_queue)
+            elif "crop" in steps:
+                crop_textgrid.process_textgrid(item["textgrid_path"], item["children_type"], item["band_id"],
+                                               item["participant_id"], item["audio_id"], corpus_root=corpus_root)
+            elif "audio" in steps:
+                preprocessing_audio.process_audio(item["textgrid_path"], item["children_type"], item["band_id"],
+                                                  item["participant_id"], item["audio_id"], streaming=streaming,
+                                                  keep_resampled=keep_resampled, corpus_root=corpus_root,
+                                                  cache_directory=cache_directory, res_type=res_type)
+            error = None
+        except Exception:
+            error = traceback.format_exc()
+    return error, metrics.snapshot()
+
+
+def manifest_pairs(manifest_path, corpus_root, children_types=None, bands=None, workers=None):
+    """
+    Scan the corpus into the manifest and return (items to process, [(item, reason)] of the flagged recordings).
+    Items have the keys discover_pairs returns. A WAV without its TextGrid is skipped, as discover_pairs skips it.
+    """
+    manifest = CorpusManifest(manifest_path)
+    summary = manifest.scan(corpus_root, workers, children_types, bands)
+    print(f"Manifest {manifest_path}: {summary['recordings']} recording(s), {summary['read']} header(s) (re)read.")
+    items, flagged = [], []
+    for recording in manifest.recordings(corpus_root, children_types, bands):
+        if recording["textgrid_path"] is None:
+            continue
+        item = {key: recording[key] for key in ("textgrid_path", "audio_path", "children_type", "band_id", "participant_id", "audio_id")}
+        if any(issue in BLOCKING_ISSUES for issue in recording["issues"]):
+            flagged.append((item, f"Flagged by the corpus manifest: {describe_issues(recording)}\n"))
+        else:
+            items.append(item)
+    manifest.close()
+    return items, flagged
+
+
+def run_batch(corpus_root, steps=STEPS, workers=None, children_types=None, bands=None, streaming=False, keep_resampled=True, cache_directory=None,
+              syllables=False, res_type="soxr_hq", writers=DEFAULT_WRITERS, manifest_path=None):
+    """
+    Process every pair of the corpus with a pool of worker processes.
+    With a manifest_path, the pairs are taken from the corpus manifest and the recordings it flags are returned as
+    failures without being processed.
+    Returns a list of (item, traceback) for the pairs that failed (the flagged recordings first). The timings of all
+    pairs are merged into the current Metrics registry.
+    """
+    if manifest_path:
+        items, flagged = manifest_pairs(manifest_path, corpus_root, children_types, bands, workers)
+    else:
+        items, flagged = discover_pairs(corpus_root, children_types, bands), []
+    total = len(items)
+    print(f"Found {total} TextGrid/WAV pair(s) under {corpus_root}.")
+    for item, reason in flagged:
+        count("pairs_flagged")
+        print(f"ATTENTION!!! {item['children_type']}/{item['band_id']}/{item['participant_id']}/{item['audio_id']}: {reason.strip()}")
+    failures = []
+
+    def report(done, index, result):
+        error, snapshot = result
+        current_metrics().merge(snapshot)
+        count("pairs_failed" if error is not None else "pairs_ok")
+        item = items[index]
+        status = "ok" if error is None else "FAILED"
+        print(f"[{done}/{total}] {item['children_type']}/{item['band_id']}/{item['participant_id']}/{item['audio_id']} {status}")
+        if error is not None:
+            failures.append((index, item, error))
+
+    if workers == 1:
+        for index, item in enumerate(items):
+            report(index + 1, index, process_pair(item, corpus_root, steps, streaming, keep_resampled, cache_directory, syllables, res_type, writers))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(process_pair, item, corpus_root, steps, streaming, keep_resampled, cache_directory, syllables,
+                                       res_type, writers): index
+                       for index, item in enumerate(items)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                report(done, futures[future], future.result())
+
+    # keep the failure list in corpus order whatever order the workers finished in
+    failures.sort(key=lambda failure: failure[0])
+    return flagged + [(item, error) for _, item, error in failures]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crop TextGrids and segment audio for every participant of a corpus.")
+    parser.add_argument('corpus_root', type=str, help="Corpus root containing <children_type>/<band_id>/new_TG/<participant_id>/.")
+    parser.add_argument('--children-type', dest='children_types', nargs='+', help="Only process these children types (e.g., TD SSD).")
+    parser.add_argument('--band', dest='bands', nargs='+', help="Only process these bands (e.g., Band_3).")
+    parser.add_argument('--steps', nargs='+', choices=STEPS, default=list(STEPS), help="Steps to run for each pair.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes (1 runs in-process).")
+    parser.add_argument('--streaming', action='store_true', help="Resample and segment in a single streaming pass.")
+    parser.add_argument('--no-resampled-copy', dest='keep_resampled', action='store_false', help="In streaming mode, do not write the full-length resampled WAV.")
+    parser.add_argument('--cache-dir', dest='cache_directory', type=str, default=None, help="Reuse resampled audio from this content-addressed cache directory.")
+    parser.add_argument('--resampler', type=str, default=resampling.DEFAULT_METHOD, choices=list(resampling.METHODS), help="Resampling backend and quality tier (streaming mode takes the soxr ones).")
+    parser.add_argument('--writers', type=int, default=DEFAULT_WRITERS, help="Background threads writing the output files of each worker (0 writes inline).")
+    parser.add_argument('--syllables', action='store_true', help="Also write one clip per syllable to individual_syllable_wavs (needs both steps).")
+    parser.add_argument('--manifest', type=str, default=None, help="Take the pairs from this corpus manifest (SQLite), updated first, instead of walking the directories.")
+    parser.add_argument('--log-level', type=str, default="WARNING", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="Logging level of the processing steps.")
+    parser.add_argument('--timings', type=str, default=None, help="Write the per-stage timing summary of the batch to this JSON file.")
+    parser.add_argument('--profile', type=str, default=None, help="Run the parent process under cProfile (use with --workers 1 to profile the steps) and write the statistics to this file.")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    with profiling(args.profile):
+        failures = run_batch(args.corpus_root, steps=args.steps, workers=args.workers, children_types=args.children_types,
+                             bands=args.bands, streaming=args.streaming, keep_resampled=args.keep_resampled,
+                             cache_directory=args.cache_directory, syllables=args.syllables,
+                             res_type=args.resampler, writers=args.writers, manifest_path=args.manifest)
+    if args.timings:
+        write_summary(args.timings, corpus_root=args.corpus_root, workers=args.workers, steps=args.steps)
+
+    if failures:
+        print(f"\n{len(failures)} pair(s) failed:")
+        for item, error in failures:
+            print(f"--- {item['textgrid_path']}\n{error}")
+        sys.exit(1)
+    print("All pairs processed.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+import io
+import os
+import sys
+import json
+import struct
+import argparse
+import numpy as np
+import soundfile as sf
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.textgrid_io import format_textgrid, parse_textgrid
+
+"""
+Packed output: one shard file per participant instead of thousands of per-word WAV and TextGrid files.
+
+A shard holds, for every recording of a participant, the clips and annotations segment_audio and crop_textgrid
+would write to individual_wavs/, individual_syllable_wavs/, rebase_to_zero_TG/ and individual_TG/. Each record is
+addressed by (section, audio_id, word), section being the name of the directory it replaces.
+
+Layout of <participant_id>.shard:
+    header   32 bytes: magic b"SMAATSH1", uint32 version, uint32 reserved, uint64 index offset, uint64 index size
+    payload  the records back to back, each starting on a 16-byte boundary:
+             clips as raw little-endian samples (frames x channels, the encoding of the WAV they would have been),
+             TextGrids as UTF-8 text in the long format write_textgrid produces
+    index    UTF-8 JSON: participant_id and one entry per record (section, audio_id, word, offset, size, and for
+             clips sample_rate, subtype, dtype, frames, channels)
+The index is written last and the header is filled in on close, so a shard that was not closed is rejected.
+A record added twice under the same key replaces the earlier one, as rewriting a file of the same name would.
+
+ShardReader memory-maps the shard: a clip is a NumPy view of the mapping and only its own pages are read.
+
+CLI usage example (list a shard, or extract one clip to a WAV):
+python clip_shards.py /mnt/data/ying/SMAAT_1st_iterative_learning/TD/Band_3/new_TG/302_Bonnie/302_Bonnie.shard
+python clip_shards.py 302_Bonnie.shard --audio-id A006_03201225_C028 --word cupcake --output cupcake.wav
+"""
+
+MAGIC = b"SMAATSH1"
+VERSION = 1
+HEADER = struct.Struct('<8sIIQQ')
+ALIGNMENT = 16
+
+CLIP_SECTIONS = ("individual_wavs", "individual_syllable_wavs")
+TEXTGRID_SECTIONS = ("rebase_to_zero_TG", "individual_TG")
+
+# soundfile subtype -> sample dtype stored in the shard
+SUBTYPE_DTYPES = {'PCM_U8': 'u1', 'PCM_16': '<i2', 'PCM_32': '<i4', 'FLOAT': '<f4', 'DOUBLE': '<f8'}
+
+
+class ShardFormatError(ValueError):
+    """Raised when a file is not a complete shard."""
+
+
+def shard_path(participant_directory, participant_id):
+    return os.path.join(participant_directory, f"{participant_id}.shard")
+
+
+class ShardWriter:
+    """
+    Append clips and TextGrids of one participant to a shard. The shard is written to <path>.tmp and moved into
+    place by close(), so readers never see a partial file.
+    """
+    def __init__(self, path, participant_id):
+        self.path = path
+        self.participant_id = participant_id
+        self.entries = {}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(f"{path}.tmp", 'wb')
+        self._file.write(b"\0" * HEADER.size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _append(self, payload):
+        offset = self._file.tell()
+        padding = -offset % ALIGNMENT
+        if padding:
+            self._file.write(b"\0" * padding)
+            offset += padding
+        self._file.write(payload)
+        return offset
+
+    def add_clip(self, audio_id, word, samples, sample_rate, subtype='PCM_16', section="individual_wavs"):
+        """
+        Store a clip as sf.write(samples, sample_rate, subtype=subtype) would encode it. Samples already in the
+        stored dtype (e.g. a view of a mapped PCM_16 WAV) are copied as they are.
+        """
+        dtype = np.dtype(SUBTYPE_DTYPES[subtype])
+        samples = np.asarray(samples)
+        channels = 1 if samples.ndim == 1 else samples.shape[1]
+        if samples.dtype == dtype:
+            payload = np.ascontiguousarray(samples).tobytes()
+        else:
+            buffer = io.BytesIO()
+            sf.write(buffer, samples, sample_rate, subtype=subtype, format='RAW', endian='LITTLE')
+            payload = buffer.getvalue()
+        self.entries[(section, audio_id, word)] = {
+            "section": section, "audio_id": audio_id, "word": word, "offset": self._append(payload), "size": len(payload),
+            "sample_rate": sample_rate, "subtype": subtype, "dtype": dtype.str, "frames": len(payload) // (dtype.itemsize * channels),
+            "channels": channels,
+        }
+
+    def add_textgrid(self, audio_id, word, tg, section="rebase_to_zero_TG"):
+        payload = format_textgrid(tg).encode("utf-8")
+        self.entries[(section, audio_id, word)] = {
+            "section": section, "audio_id": audio_id, "word": word, "offset": self._append(payload), "size": len(payload),
+        }
+
+    def close(self):
+        """Write the index and the header and move the shard into place."""
+        if self._file is None:
+            return
+        index = json.dumps({"participant_id": self.participant_id, "entries": list(self.entries.values())}, ensure_ascii=False).encode("utf-8")
+        index_offset = self._append(index)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, index_offset, len(index)))
+        self._file.close()
+        self._file = None
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def abort(self):
+        """Discard the partial shard."""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.remove(f"{self.path}.tmp")
+
+
+class ShardReader:
+    """Memory-mapped, read-only access to the records of a shard."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ShardFormatError(f"{path} is too short to be a shard.")
+            magic, version, _, index_offset, index_size = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ShardFormatError(f"{path} is not a shard (bad magic).")
+            if version != VERSION:
+                raise ShardFormatError(f"{path} has shard version {version}, expected {VERSION}.")
+            if index_offset == 0 or index_offset + index_size > os.path.getsize(path):
+                raise ShardFormatError(f"{path} is incomplete: its index is missing or truncated.")
+            f.seek(index_offset)
+            index = json.loads(f.read(index_size).decode("utf-8"))
+        self.participant_id = index["participant_id"]
+        self.entries = {(entry["section"], entry["audio_id"], entry["word"]): entry for entry in index["entries"]}
+        self._data = np.memmap(path, dtype=np.uint8, mode='r') if index_offset > HEADER.size else np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def keys(self, section=None):
+        """(section, audio_id, word) of every record, or of one section, in the order they were added."""
+        return [key for key in self.entries if section is None or key[0] == section]
+
+    def _entry(self, section, audio_id, word):
+        try:
+            return self.entries[(section, audio_id, word)]
+        except KeyError:
+            raise KeyError(f"No {section} record for {self.participant_id}_{audio_id}_{word} in {self.path}.") from None
+
+    def clip(self, audio_id, word, section="individual_wavs"):
+        """(samples, sample_rate) of a clip; samples is a (frames, channels) view of the mapping, no copy."""
+        entry = self._entry(section, audio_id, word)
+        raw = self._data[entry["offset"]:entry["offset"] + entry["size"]]
+        return raw.view(np.dtype(entry["dtype"])).reshape(entry["frames"], entry["channels"]), entry["sample_rate"]
+
+    def textgrid_text(self, audio_id, word, section="rebase_to_zero_TG"):
+        entry = self._entry(section, audio_id, word)
+        return self._data[entry["offset"]:entry["offset"] + entry["size"]].tobytes().decode("utf-8")
+
+    def textgrid(self, audio_id, word, section="rebase_to_zero_TG"):
+        """The TextGrid of a record, parsed with empty intervals kept (as load_textgrid_file reads the files)."""
+        return parse_textgrid(self.textgrid_text(audio_id, word, section))
+
+    def write_clip(self, export_path, audio_id, word, section="individual_wavs"):
+        """Write a clip back out as the WAV file segment_audio would have written."""
+        entry = self._entry(section, audio_id, word)
+        samples, sample_rate = self.clip(audio_id, word, section)
+        if samples.dtype == np.uint8:
+            # soundfile cannot take unsigned 8-bit input; widen to int16, which maps back to PCM_U8 exactly
+            samples = (samples.astype(np.int16) - 128) << 8
+        sf.write(export_path, samples, sample_rate, subtype=entry["subtype"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the records of a clip shard or extract one of them.")
+    parser.add_argument('shard_path', type=str, help="Path to a <participant_id>.shard file.")
+    parser.add_argument('--section', type=str, default=None, help="Section to list or extract from (default: all / individual_wavs or rebase_to_zero_TG).")
+    parser.add_argument('--audio-id', type=str, default=None, help="Audio ID of the record to extract.")
+    parser.add_argument('--word', type=str, default=None, help="Word of the record to extract.")
+    parser.add_argument('--output', type=str, default=None, help="Write the record to this .wav or .TextGrid file.")
+    args = parser.parse_args()
+
+    reader = ShardReader(args.shard_path)
+    if args.audio_id is None or args.word is None or args.output is None:
+        for section, audio_id, word in reader.keys(args.section):
+            entry = reader.entries[(section, audio_id, word)]
+            detail = f"{entry['frames']} frames @ {entry['sample_rate']} Hz" if section in CLIP_SECTIONS else f"{entry['size']} bytes"
+            print(f"{section}\t{audio_id}\t{word}\t{detail}")
+        return
+    if args.output.endswith('.wav'):
+        reader.write_clip(args.output, args.audio_id, args.word, args.section or "individual_wavs")
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(reader.textgrid_text(args.audio_id, args.word, args.section or "rebase_to_zero_TG"))
+    print(f"Wrote {args.output}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -8,122 +8,129 @@
 '''
 
 import os
-from praatio import textgrid
 import argparse
 import sys
+from contextlib import nullcontext
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.textgrid_io import read_textgrid, write_textgrid
+from common.instrumentation import get_logger, configure_logging, timed, count, profiling, write_summary
+from data_prepprocessing.export_queue import ExportQueue
 
 """
 This script processes TextGrid files by cropping them based on a specified phonetic tier and adjusting timestamps to start from zero.
-Note: In load_textgrid_file function, the 'includeEmptyIntervals' parameter is set to True to include empty intervals in the TextGrid.
+Each phonetic interval is cropped once, in turn (see crop_windows), and the crop is shifted to start at zero. Tiers are
+stored as sorted time arrays (common/textgrid_io.py), so each crop locates its entries with a binary search instead of
+walking the whole TextGrid.
+Note: load_textgrid_file keeps the empty intervals of the TextGrid.
 This is important for ensuring that all intervals are processed correctly, even if they are empty. Therefore, in the crop_textgrid function,
 it generate short textgrids according to the phonetic tier. If word tier is correct (word tier always have content) but phonetic tier is empty 
 (e.g. /a/ /i/ /u/ ...), they can also generate short textgrids. 
 
 When we calcualte the error rate across all participants, we are using the PROMPT Word list, 40 words across four stages. Therefore, 
 if we generated any textgrids with empty phonetic intervals, we will not use these textgrids for error rate calculation.
+
+Parse and crop times are recorded by common/instrumentation.py (--timings writes them as JSON).
+The cropped TextGrids are written by a background ExportQueue (export_queue.py) while the next crops are computed;
+crop_textgrid returns once every file is on disk.
 """
 
+logger = get_logger("crop_textgrid")
+
+
+class TierMismatchError(ValueError):
+    """Raised when the word and phonetic tiers of a TextGrid do not have the same number of intervals."""
+
+
 def ensure_directory_exists(directory_path):
     """Ensure the given directory exists. Create it if not."""
     if not os.path.exists(directory_path):
         os.makedirs(directory_path)
 
+@timed("parse")
 def load_textgrid_file(file_path):
     """Load a TextGrid file."""
-    return textgrid.openTextgrid(file_path, includeEmptyIntervals=True)
+    return read_textgrid(file_path, include_empty_intervals=True)
 
 def get_labels_from_word_tier(tg):
     """Extract labels from the 'word' tier in the TextGrid."""
-    word_tier = tg.getTier("word")
+    word_tier = tg.get_tier("word")
     labels = []
     for start, end, label in word_tier.entries:
         label = label.split("/")[1] if '/' in label else label
         labels.append(label)
     return labels
 
-def crop_textgrid(tg, split_tier_name, output_directory, participant_id, audio_id):
-    """Crop the TextGrid based on the split tier and save cropped TextGrids."""
-    # Ensure output directory exists
-    ensure_directory_exists(output_directory)
+def crop_windows(tg, windows):
+    """
+    Crop every tier of the TextGrid to each (start, end) window, like tg.crop(start, end, mode="truncated"), and yield
+    (crop with its original timestamps, crop rebased to zero). Intervals overlapping a window are truncated to it and
+    points inside it are kept. Each window is cropped once, with a binary search in the sorted tier arrays (O(log n)
+    per tier plus the size of the output); the rebased copy only shifts the arrays of that crop.
+    """
+    for crop_start, crop_end in windows:
+        cropped_tg = tg.crop(crop_start, crop_end)
+        yield cropped_tg, cropped_tg.rebase(crop_start)
+
+
+@timed("crop")
+def crop_textgrid(tg, split_tier_name, output_directory, participant_id, audio_id, cropped_output_directory=None, shard=None, export_queue=None):
+    """
+    Crop the TextGrid based on the split tier and save the cropped TextGrids rebased to zero.
+    When cropped_output_directory is given, the crops are also saved there with their original timestamps.
+    With a clip_shards.ShardWriter the crops are appended to the participant's shard instead, in the sections named
+    after the two directories.
+    Files are written through export_queue when one is given (the caller closes it), otherwise through a queue of
+    this call that is closed before returning.
+    """
+    # Ensure output directories exist
+    if shard is None:
+        ensure_directory_exists(output_directory)
+        if cropped_output_directory is not None:
+            ensure_directory_exists(cropped_output_directory)
 
     # Get the split tier: phonetic tier
-    split_tier = tg.getTier(split_tier_name)
+    split_tier = tg.get_tier(split_tier_name)
 
     # Get labels from 'word' tier
     labels = get_labels_from_word_tier(tg)
-    # print("labels",labels)
-
-    # Prepare lists for crop start and end times: empty intervals will be ignored
-    crop_start = [start for start, _, _ in split_tier.entries]
-    crop_end = [end for _, end, _ in split_tier.entries] 
-    # # Round crop_start and crop_end to 2 decimals
-    # crop_start = [round(start, 2) for start in crop_start]
-    # crop_end = [round(end, 2) for end in crop_end]
-        # print("start",start)
-        # print("end",end)
-        # print("label",label)
-        # print("crop_start",crop_start)
-        # print("crop_end",crop_end)
-
-    # Crop and save TextGrid files: the reason for using i is that we need to use labels[i] to put the word in the filename path.
-    if len(labels) == len(crop_start):
-        for i in range(len(crop_start)):
-            cropped_tg = tg.crop(crop_start[i], crop_end[i], mode="truncated", rebaseToZero=False)
-            # print("len(crop_start) after", len(crop_start))
-            # print("cropped_tg",cropped_tg)
-            new_tg_filename = os.path.join(output_directory, f"{participant_id}_{audio_id}_{labels[i]}.TextGrid")
-            # print("new_tg_filename", new_tg_filename)
-            cropped_tg.save(new_tg_filename, format="long_textgrid", includeBlankSpaces=False)
-        return output_directory
-    else:
-        sys.exit(f"Stopping script. Word labels are {len(labels)} while phonetic labels are {len(crop_start)}. Empty phonetic interval(s) were founded!")
-
-
-def adjust_timestamps_in_textgrid(textgrid_lines):
-    """Adjust timestamps in TextGrid content based on global xmin."""
-    global_xmin = float([line.split('=')[1].strip() for line in textgrid_lines if 'xmin' in line][0])
-    # print(global_xmin)
-    for i, line in enumerate(textgrid_lines):
-        if 'xmin' in line or 'xmax' in line:
-            current_value = float(line.split('=')[1].strip())
-            current_value_str = line.split('=')[1].strip() # used for replacement for integer, e.g., 52, float(52) = 52.0, if doesnot match, can not do repalcement
-            adjusted_value = max(0, current_value - global_xmin)
-            # print("adjusted_value",adjusted_value)
-            textgrid_lines[i] = line.replace(current_value_str, str(adjusted_value))
-
-    return textgrid_lines
-
-def process_textgrid_files(input_directory, output_directory):
-    """Process all TextGrid files in the given directory."""
-    ensure_directory_exists(output_directory)
-
-    for file_name in os.listdir(input_directory):
-        if file_name.endswith('.TextGrid'):
-            file_path = os.path.join(input_directory, file_name)
-
-            with open(file_path, 'r') as file:
-                textgrid_content = file.readlines()
-
-            adjusted_content = adjust_timestamps_in_textgrid(textgrid_content)
-
-            adjusted_file_path = os.path.join(output_directory, file_name)
-            with open(adjusted_file_path, 'w') as file:
-                file.writelines(adjusted_content)
-
-def process_textgrid(textgrid_path, children_type, band_id, participant_id, audio_id, split_tier_name="phonetic"):
-    # Step 1: Crop the original TextGrid based on the phonetic tier
+
+    # Crop windows: one per phonetic interval, empty ones included
+    windows = list(zip(split_tier.starts.tolist(), split_tier.ends.tolist()))
+
+    if len(labels) != len(windows):
+        raise TierMismatchError(f"Word labels are {len(labels)} while phonetic labels are {len(windows)}. Empty phonetic interval(s) were founded!")
+
+    # The i-th window belongs to the i-th word: labels[i] goes into the filename
+    with ExportQueue() if shard is None and export_queue is None else nullcontext(export_queue) as queue:
+        for i, (cropped_tg, rebased_tg) in enumerate(crop_windows(tg, windows)):
+            if shard is not None:
+                if cropped_output_directory is not None:
+                    shard.add_textgrid(audio_id, labels[i], cropped_tg,
+                                       section=os.path.basename(os.path.normpath(cropped_output_directory)))
+                shard.add_textgrid(audio_id, labels[i], rebased_tg, section=os.path.basename(os.path.normpath(output_directory)))
+                continue
+            filename = f"{participant_id}_{audio_id}_{labels[i]}.TextGrid"
+            if cropped_output_directory is not None:
+                cropped_path = os.path.join(cropped_output_directory, filename)
+                queue.submit(cropped_path, write_textgrid, cropped_tg, cropped_path)
+            rebased_path = os.path.join(output_directory, filename)
+            queue.submit(rebased_path, write_textgrid, rebased_tg, rebased_path)
+    count("crops", len(windows))
+    return output_directory
+
+
+def process_textgrid(textgrid_path, children_type, band_id, participant_id, audio_id, split_tier_name="phonetic", corpus_root="/mnt/data/ying/SMAAT_1st_iterative_learning/", keep_cropped=False):
+    # Crop the original TextGrid based on the phonetic tier; the crops are rebased to zero as they are produced
     original_tg_path = textgrid_path
-    output_directory = f'/mnt/data/ying/SMAAT_1st_iterative_learning/{children_type}/{band_id}/new_TG/{participant_id}/individual_TG/'
+    participant_directory = os.path.join(corpus_root, children_type, band_id, "new_TG", participant_id)
+    rebase_output_directory = os.path.join(participant_directory, "rebase_to_zero_TG")
+    # Crops with their original timestamps are only written on request
+    cropped_output_directory = os.path.join(participant_directory, "individual_TG") if keep_cropped else None
     tg = load_textgrid_file(original_tg_path)
 
-    # Crop the TextGrid and save to the output directory
-    cropped_textgrid_dir = crop_textgrid(tg, split_tier_name, output_directory, participant_id, audio_id)
-
-    # Step 2: Adjust timestamps in the cropped TextGrid files
-    rebase_output_directory = f'/mnt/data/ying/SMAAT_1st_iterative_learning/{children_type}/{band_id}/new_TG/{participant_id}/rebase_to_zero_TG'
-    process_textgrid_files(cropped_textgrid_dir, rebase_output_directory)
+    crop_textgrid(tg, split_tier_name, rebase_output_directory, participant_id, audio_id, cropped_output_directory)
 
-    print("Processing completed.")
+    logger.info("Processing completed for %s.", textgrid_path)
 
 
 def main():
@@ -134,18 +141,30 @@ def main():
     parser.add_argument('band_id', type=str, default="Band_3", help="Band ID ('Band_1', 'Band_2', 'Band_3', or 'Band_4').")
     parser.add_argument('participant_id', type=str, help="Participant ID (e.g., '302_Bonnie').")
     parser.add_argument('audio_id', type=str, help="Audio ID (e.g., 'A006_03201225_C028').")
+    parser.add_argument('--keep-cropped', action='store_true', help="Also save the cropped TextGrids with their original timestamps to individual_TG.")
+    parser.add_argument('--log-level', type=str, default="WARNING", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="Logging level.")
+    parser.add_argument('--timings', type=str, default=None, help="Write the per-stage timing summary to this JSON file.")
+    parser.add_argument('--profile', type=str, default=None, help="Run under cProfile and write the statistics to this file.")
 
     # Parse the arguments
     args = parser.parse_args()
+    configure_logging(args.log_level)
 
     # Process the participant folder based on the parsed arguments
-    process_textgrid(
-        textgrid_path=args.textgrid_path,
-        children_type=args.children_type,
-        band_id=args.band_id,
-        participant_id=args.participant_id,
-        audio_id=args.audio_id
-    ) 
+    try:
+        with profiling(args.profile):
+            process_textgrid(
+                textgrid_path=args.textgrid_path,
+                children_type=args.children_type,
+                band_id=args.band_id,
+                participant_id=args.participant_id,
+                audio_id=args.audio_id,
+                keep_cropped=args.keep_cropped
+            )
+    except TierMismatchError as e:
+        sys.exit(f"Stopping script. {e}")
+    if args.timings:
+        write_summary(args.timings, textgrid_path=args.textgrid_path)
     
 if __name__ == '__main__':
     main()
@@ -0,0 +1,130 @@
+import os
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.instrumentation import timer
+
+"""
+Bounded background writer for the clip and TextGrid files of segment_audio and crop_textgrid.
+
+The producing loop computes an output and hands the write to the queue, which runs it on a small thread pool
+(libsndfile and file writes release the GIL), so the next clip or crop is computed while the previous ones are
+written. The queue is bounded: submit blocks once max_pending writes are in flight, which caps the memory held
+by outputs waiting for the disk. The gain is largest on network storage, where each file costs round trips; on a
+fast local disk the hand-off can cost more than it saves, and workers=0 writes inline with the same error
+handling (--writers 0 on the command line).
+
+Guarantees:
+- Writes to the same path run in submission order, so a word recorded twice still ends up with the last clip,
+  as with sequential writes.
+- close() (or flush()) returns only once every submitted write has finished. If any write failed, it raises
+  the error of the earliest submitted failing write, whatever order the threads finished in; the paths of later
+  failures are listed in its message. A failure also makes the next submit raise, so a broken disk stops the
+  loop early.
+- Time spent waiting for writes at close goes to the "export_wait" timer.
+
+Usage:
+    with ExportQueue(workers=4) as queue:
+        for ...:
+            queue.submit(path, write_function, *args)
+"""
+
+DEFAULT_WRITERS = 4
+DEFAULT_MAX_PENDING = 64
+
+
+class ExportError(RuntimeError):
+    """Raised by ExportQueue when a background write failed; the original exception is the __cause__."""
+
+
+class ExportQueue:
+    def __init__(self, workers=DEFAULT_WRITERS, max_pending=DEFAULT_MAX_PENDING):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export") if workers > 0 else None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        # path -> future of the last write submitted for it
+        self._last_write = {}
+        self._futures = []
+        self._failed = False
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # the block already failed: finish the writes in flight without masking its exception
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+            self._closed = True
+
+    def submit(self, path, function, *args):
+        """Run function(*args), which writes path, on a writer thread. Blocks while max_pending writes are in flight."""
+        if self._closed:
+            raise ExportError("The export queue is closed.")
+        if self._failed:
+            self.flush()
+        if self.executor is None:
+            return self._write_inline(path, function, args)
+        self._slots.acquire()
+        with self._lock:
+            previous = self._last_write.get(path)
+            future = self.executor.submit(self._write, previous, path, function, args)
+            self._last_write[path] = future
+            self._futures.append((path, future))
+        future.add_done_callback(self._done)
+        return future
+
+    def _write_inline(self, path, function, args):
+        future = Future()
+        try:
+            function(*args)
+            future.set_result(None)
+        except Exception as error:
+            future.set_exception(error)
+            self._failed = True
+        with self._lock:
+            self._futures.append((path, future))
+        return future
+
+    @staticmethod
+    def _write(previous, path, function, args):
+        if previous is not None:
+            # the executor runs tasks in submission order, so the earlier write is already running or done
+            previous.exception()
+        function(*args)
+
+    def _done(self, future):
+        if future.exception() is not None:
+            self._failed = True
+        self._slots.release()
+
+    def flush(self):
+        """Wait for every submitted write; raise ExportError for the earliest failed one."""
+        with self._lock:
+            futures, self._futures = self._futures, []
+            self._last_write = {}
+        with timer("export_wait"):
+            errors = [(path, future.exception()) for path, future in futures]
+        errors = [(path, error) for path, error in errors if error is not None]
+        self._failed = False
+        if errors:
+            path, error = errors[0]
+            message = f"Writing {path} failed: {error!r}"
+            if len(errors) > 1:
+                message += f" ({len(errors) - 1} later write(s) also failed: {', '.join(failed for failed, _ in errors[1:])})"
+            raise ExportError(message) from error
+
+    def close(self):
+        """flush() and stop the writer threads."""
+        if self._closed:
+            return
+        try:
+            self.flush()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+            self._closed = True
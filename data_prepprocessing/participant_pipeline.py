@@ -0,0 +1,203 @@
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from data_prepprocessing import crop_textgrid, preprocessing_audio, resampling
+from data_prepprocessing.resample_cache import ResampleCache
+from data_prepprocessing.clip_shards import ShardWriter, shard_path
+from data_prepprocessing.export_queue import ExportQueue, DEFAULT_WRITERS
+from common.textgrid_io import read_textgrid_text, parse_textgrid
+from common.instrumentation import get_logger, configure_logging, timer, profiling, write_summary
+from common.corpus_manifest import CorpusManifest, BLOCKING_ISSUES, describe_issues
+
+"""
+Fused preprocessing of a recording: crop_textgrid.process_textgrid and preprocessing_audio.process_audio in one pass.
+
+The source TextGrid is read once and parsed the way each step reads it: as crop_textgrid.load_textgrid_file for the
+crops and as preprocessing_audio.read_boundary_textgrid (times rounded as the textgrid package did) for the clips:
+- rebase_to_zero_TG/ (and individual_TG/ with keep_cropped): one TextGrid per phonetic interval (crop_textgrid)
+- individual_wavs/: one clip per word with a phonetic label (words_from_textgrid)
+- individual_syllable_wavs/ (with syllables): one clip per syllable (syllables_from_textgrid)
+The audio is resampled once (through the resample cache when given) or, in streaming mode, decoded once with the
+word and syllable clips routed from the same pass. Outputs are the same files the two separate scripts write.
+
+In participant mode the files of all recordings go through one background ExportQueue (--writers threads), so
+writing overlaps with the parsing, cropping and resampling of the next recording; it is drained before the
+participant is reported done.
+With --manifest (participant mode) the recordings come from the corpus manifest (common/corpus_manifest.py) and a
+tier mismatch or a missing file stops the run before the first recording is processed.
+With --shards (participant mode) the crops and clips of all recordings of the participant are packed into
+<participant_id>/<participant_id>.shard instead (see clip_shards.py); the resampled copy is still written.
+
+CLI usage example:
+python participant_pipeline.py /mnt/data/ying/SMAAT_1st_iterative_learning TD Band_3 302_Bonnie A006_03201225_C028 --syllables
+python participant_pipeline.py /mnt/data/ying/SMAAT_1st_iterative_learning TD Band_3 302_Bonnie --streaming --cache-dir /mnt/data/ying/resample_cache
+python participant_pipeline.py /mnt/data/ying/SMAAT_1st_iterative_learning TD Band_3 302_Bonnie --syllables --shards
+"""
+
+logger = get_logger("participant_pipeline")
+
+
+def process_recording(textgrid_path, children_type, band_id, participant_id, audio_id, corpus_root="/mnt/data/ying/SMAAT_1st_iterative_learning/",
+                      split_tier_name="phonetic", keep_cropped=False, syllables=False, streaming=False, keep_resampled=True,
+                      cache_directory=None, VOT=0, shard=None, res_type="soxr_hq", export_queue=None):
+    """
+    Crop the TextGrid and segment the audio of one recording from a single read of its TextGrid.
+    With a clip_shards.ShardWriter the crops and clips are appended to it instead of being written as files.
+    Files are written through export_queue when given (the caller closes it); otherwise each step waits for its own writes.
+    Raises crop_textgrid.TierMismatchError, before anything is written, when the word and phonetic tiers do not match.
+    """
+    participant_directory = os.path.join(corpus_root, children_type, band_id, "new_TG", participant_id)
+    audio_file_path = os.path.join(participant_directory, f"{audio_id}.wav")
+
+    with timer("parse"):
+        text = read_textgrid_text(textgrid_path)
+        # as crop_textgrid.load_textgrid_file reads it
+        tg = parse_textgrid(text, include_empty_intervals=True)
+        boundary_tg = preprocessing_audio.parse_boundary_textgrid(text)
+
+    # TextGrid outputs
+    cropped_output_directory = os.path.join(participant_directory, "individual_TG") if keep_cropped else None
+    crop_textgrid.crop_textgrid(tg, split_tier_name, os.path.join(participant_directory, "rebase_to_zero_TG"), participant_id, audio_id, cropped_output_directory,
+                                shard=shard, export_queue=export_queue)
+
+    # Clip boundaries from the same intervals
+    words = preprocessing_audio.words_from_textgrid(boundary_tg, VOT)
+    syllable_boundaries = preprocessing_audio.syllables_from_textgrid(boundary_tg, VOT) if syllables else None
+
+    # Audio outputs
+    cache = ResampleCache(cache_directory) if cache_directory else None
+    try:
+        resampled_audio_path = f"{audio_file_path[:-4]}_16000Hz.wav"
+        if streaming:
+            cache_key = cache.key(audio_file_path, 16000, res_type) if cache is not None else None
+            if cache is None or not cache.fetch(cache_key, resampled_audio_path):
+                logger.info("Resampling and segmenting %s in one pass...", audio_file_path)
+                preprocessing_audio.stream_resample_and_segment(audio_file_path, words, children_type, band_id, participant_id, audio_id,
+                                                                keep_resampled=keep_resampled or cache is not None,
+                                                                output_directory_base=corpus_root, syllable_boundaries=syllable_boundaries, shard=shard,
+                                                                res_type=res_type, export_queue=export_queue)
+                if cache is not None:
+                    cache.store(cache_key, resampled_audio_path)
+                    if not keep_resampled:
+                        # the copy was only written to fill the cache
+                        os.remove(resampled_audio_path)
+                return
+        else:
+            resampled_audio_path = preprocessing_audio.resample_audio(audio_file_path, res_type=res_type, cache=cache)
+
+        logger.info("Segmenting %s...", resampled_audio_path)
+        preprocessing_audio.segment_audio(resampled_audio_path, words, children_type, band_id, participant_id, audio_id, output_directory_base=corpus_root,
+                                          shard=shard, export_queue=export_queue)
+        if syllable_boundaries is not None:
+            preprocessing_audio.segment_audio(resampled_audio_path, syllable_boundaries, children_type, band_id, participant_id, audio_id,
+                                              output_directory_base=corpus_root, clip_directory_name="individual_syllable_wavs",
+                                              shard=shard, export_queue=export_queue)
+        if streaming and not keep_resampled:
+            # restored from the cache only to be segmented: the clips are read from it until their writes finish
+            if export_queue is not None:
+                export_queue.flush()
+            os.remove(resampled_audio_path)
+    finally:
+        if cache is not None:
+            cache.close()
+        logger.info("Finished %s_%s.", participant_id, audio_id)
+
+
+def participant_recordings(manifest, children_type, band_id, participant_id, corpus_root):
+    """
+    Audio IDs of a participant from the corpus manifest, after bringing it up to date. Raises before anything is
+    processed when a recording cannot be: TierMismatchError for word and phonetic tiers of different lengths,
+    FileNotFoundError for a missing WAV or TextGrid, ValueError for the other issues.
+    """
+    manifest.scan(corpus_root, workers=1, children_types=[children_type], bands=[band_id], participants=[participant_id])
+    recordings = manifest.recordings(corpus_root, [children_type], [band_id], participant_id)
+    for recording in recordings:
+        issues = [issue for issue in recording["issues"] if issue in BLOCKING_ISSUES]
+        if not issues:
+            continue
+        message = f"{recording['key']}: {describe_issues(recording)}"
+        if "tier_mismatch" in issues:
+            raise crop_textgrid.TierMismatchError(message)
+        if "missing_audio" in issues or "missing_textgrid" in issues:
+            raise FileNotFoundError(message)
+        raise ValueError(message)
+    return [recording["audio_id"] for recording in recordings]
+
+
+def process_participant(children_type, band_id, participant_id, corpus_root="/mnt/data/ying/SMAAT_1st_iterative_learning/", shards=False,
+                        writers=DEFAULT_WRITERS, manifest=None, **options):
+    """
+    process_recording for every <audio_id>.TextGrid of a participant directory. Returns the audio IDs processed,
+    once every output is written.
+    With a corpus_manifest.CorpusManifest, the recordings are taken from it and checked before the first one is
+    processed (participant_recordings); otherwise the directory is listed.
+    With shards, everything goes to <participant_id>.shard, which is only replaced once all recordings succeeded.
+    Otherwise the files are written by one ExportQueue of `writers` threads shared by all recordings.
+    """
+    participant_directory = os.path.join(corpus_root, children_type, band_id, "new_TG", participant_id)
+    if manifest is not None:
+        audio_ids = participant_recordings(manifest, children_type, band_id, participant_id, corpus_root)
+    else:
+        audio_ids = [name[:-len('.TextGrid')] for name in sorted(os.listdir(participant_directory)) if name.endswith('.TextGrid')]
+    if not shards:
+        with ExportQueue(workers=writers) as export_queue:
+            for audio_id in audio_ids:
+                process_recording(os.path.join(participant_directory, f"{audio_id}.TextGrid"), children_type, band_id, participant_id, audio_id,
+                                  corpus_root=corpus_root, export_queue=export_queue, **options)
+        return audio_ids
+
+    with ShardWriter(shard_path(participant_directory, participant_id), participant_id) as shard:
+        for audio_id in audio_ids:
+            process_recording(os.path.join(participant_directory, f"{audio_id}.TextGrid"), children_type, band_id, participant_id, audio_id,
+                              corpus_root=corpus_root, shard=shard, **options)
+    return audio_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crop the TextGrid and segment the audio of a recording (or of all recordings of a participant) from one parse.")
+    parser.add_argument('corpus_root', type=str, help="Corpus root containing <children_type>/<band_id>/new_TG/<participant_id>/.")
+    parser.add_argument('children_type', type=str, help="Type of children ('TD' or 'SSD').")
+    parser.add_argument('band_id', type=str, help="Band ID ('Band_1', 'Band_2', 'Band_3', or 'Band_4').")
+    parser.add_argument('participant_id', type=str, help="Participant ID (e.g., '302_Bonnie').")
+    parser.add_argument('audio_id', type=str, nargs='?', default=None, help="Audio ID (e.g., 'A006_03201225_C028'); all recordings of the participant when omitted.")
+    parser.add_argument('--keep-cropped', action='store_true', help="Also save the cropped TextGrids with their original timestamps to individual_TG.")
+    parser.add_argument('--syllables', action='store_true', help="Also write one clip per syllable to individual_syllable_wavs.")
+    parser.add_argument('--streaming', action='store_true', help="Resample and segment in a single streaming pass over the source audio.")
+    parser.add_argument('--no-resampled-copy', dest='keep_resampled', action='store_false', help="In streaming mode, do not write the full-length resampled WAV.")
+    parser.add_argument('--shards', action='store_true', help="Pack the crops and clips of the participant into <participant_id>.shard (participant mode only).")
+    parser.add_argument('--writers', type=int, default=DEFAULT_WRITERS, help="Background threads writing the output files (participant mode).")
+    parser.add_argument('--cache-dir', dest='cache_directory', type=str, default=None, help="Reuse resampled audio from this content-addressed cache directory.")
+    parser.add_argument('--manifest', type=str, default=None, help="Corpus manifest (SQLite) to take and check the recordings of the participant from (participant mode).")
+    parser.add_argument('--resampler', type=str, default=resampling.DEFAULT_METHOD, choices=list(resampling.METHODS), help="Resampling backend and quality tier (streaming mode takes the soxr ones).")
+    parser.add_argument('--log-level', type=str, default="WARNING", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="Logging level.")
+    parser.add_argument('--timings', type=str, default=None, help="Write the per-stage timing summary to this JSON file.")
+    parser.add_argument('--profile', type=str, default=None, help="Run under cProfile and write the statistics to this file.")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+    if args.shards and args.audio_id is not None:
+        parser.error("--shards packs a whole participant; leave out audio_id.")
+
+    options = dict(keep_cropped=args.keep_cropped, syllables=args.syllables, streaming=args.streaming,
+                   keep_resampled=args.keep_resampled, cache_directory=args.cache_directory, res_type=args.resampler)
+    try:
+        with profiling(args.profile):
+            if args.audio_id is None:
+                manifest = CorpusManifest(args.manifest) if args.manifest else None
+                process_participant(args.children_type, args.band_id, args.participant_id, corpus_root=args.corpus_root, shards=args.shards,
+                                    writers=args.writers, manifest=manifest, **options)
+                if manifest is not None:
+                    manifest.close()
+            else:
+                textgrid_path = os.path.join(args.corpus_root, args.children_type, args.band_id, "new_TG", args.participant_id, f"{args.audio_id}.TextGrid")
+                process_recording(textgrid_path, args.children_type, args.band_id, args.participant_id, args.audio_id,
+                                  corpus_root=args.corpus_root, **options)
+    except crop_textgrid.TierMismatchError as e:
+        sys.exit(f"Stopping script. {e}")
+    if args.timings:
+        write_summary(args.timings, corpus_root=args.corpus_root, participant_id=args.participant_id)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,21 +7,44 @@
 @University: Curtin University
 '''
 
-import textgrid
-from pydub import AudioSegment
 import soundfile as sf
-import librosa
+import numpy as np
+import soxr
 import os
+import sys
 import argparse
+from contextlib import nullcontext
+from bisect import bisect_left, bisect_right
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.textgrid_io import read_textgrid, parse_textgrid
+from common.instrumentation import get_logger, configure_logging, timer, timed, count, profiling, write_summary
+from data_prepprocessing.wav_memmap import open_wav_memmap, to_float32
+from data_prepprocessing.resample_cache import ResampleCache
+from data_prepprocessing.export_queue import ExportQueue
+from data_prepprocessing import resampling
 
 """
 Overview:
 This module provides utilities to preprocess speech audio and corresponding TextGrid annotations.
 Main capabilities:
-- Resample a WAV audio file to a target sampling rate (default 16000 Hz).
+- Resample a WAV audio file to a target sampling rate (default 16000 Hz) with a selectable backend and quality
+    tier (see resampling.py; soxr_hq by default, the output of librosa.load). With a ResampleCache
+    (see resample_cache.py) a recording that was already resampled with the same settings is copied
+    from the cache instead of being decoded again.
 - Parse Praat TextGrid files to extract syllable- and word-level boundaries (supports optional VOT trimming).
+    TextGrids are read as textgrid.TextGrid.fromFile read them (read_boundary_textgrid): times rounded to
+    TEXTGRID_PRECISION decimals and labels not stripped, so the clips and their file names do not change.
 - Segment a (resampled) audio file into individual WAV clips using extracted boundaries and save them
-    into a participant-specific output folder structure.
+    into a participant-specific output folder structure. Clips are written straight from a memory-mapped
+    view of the WAV (see wav_memmap.py), so memory use stays flat however long the recording is. The writes run
+    on a bounded background ExportQueue (see export_queue.py) and segment_audio returns once every clip is on disk.
+- Lazy clips (clip_views): the same boundaries as ClipView objects over the mapped recording, for consumers
+    such as model inference that only need the samples. Nothing is read until a view's samples are used and
+    nothing is written unless ClipView.write is called.
+- Streaming mode (stream_resample_and_segment): decode the source once in blocks, resample each block and
+    route the samples directly into the word/syllable clips. The full-length resampled copy is optional.
+- Packed output: given a clip_shards.ShardWriter, segment_audio and stream_resample_and_segment append the clips
+    to the participant's shard instead of writing one WAV per word (see clip_shards.py and participant_pipeline.py).
 
 Assumptions and conventions:
 - Expected TextGrid tier ordering:
@@ -31,142 +54,448 @@ Assumptions and conventions:
 - The script treats empty interval marks as silent/ignored.
 - Default output base directory is set in segment_audio; adjust output_directory_base as needed.
 - Default resampling rate is 16000 Hz.
+- Progress goes to the "smaat" logger (silent unless --log-level is given); parse/resample/segment times and
+    clip counts go to common/instrumentation.py, and --timings writes them as JSON.
 
 CLI usage example:
 python refactored_preprocessing_audio.py /path/to/file.TextGrid TD Band_3 302_Bonnie A006_03201225_C028
+python refactored_preprocessing_audio.py /path/to/file.TextGrid TD Band_3 302_Bonnie A006_03201225_C028 --streaming --no-resampled-copy
+python refactored_preprocessing_audio.py /path/to/file.TextGrid TD Band_3 302_Bonnie A006_03201225_C028 --log-level INFO --timings timings.json
 
 """
-def resample_audio(audio_file_path, target_sr=16000):
+
+logger = get_logger("preprocessing_audio")
+
+# Decimals the textgrid package rounded every time to; word and syllable edges are matched on the rounded times.
+TEXTGRID_PRECISION = 5
+
+
+def resample_audio(audio_file_path, target_sr=16000, res_type="soxr_hq", cache=None):
     """
-    Resample the audio file to the target sample rate.
+    Resample the audio file to the target sample rate with one of the resampling.METHODS.
     """
-    audio, sr = librosa.load(audio_file_path, sr=target_sr)
     output_file_path = f"{audio_file_path[:-4]}_{target_sr}Hz.wav"
-    sf.write(output_file_path, audio, target_sr)
-    print(f"Resampled audio saved to {output_file_path}")
+    if cache is not None:
+        cache_key = cache.key(audio_file_path, target_sr, res_type)
+        if cache.fetch(cache_key, output_file_path):
+            logger.info("Resampled audio restored from cache to %s", output_file_path)
+            return output_file_path
+
+    with timer("resample"):
+        resampling.resample_file(audio_file_path, output_file_path, target_sr, res_type)
+    if cache is not None:
+        cache.store(cache_key, output_file_path)
+    logger.info("Resampled audio saved to %s", output_file_path)
     return output_file_path
 
 
-def extract_syllables(textgrid_file_path, VOT=0):
+class TierIndex:
     """
-    Extract syllables from the TextGrid file.
+    Start/end/mark columns of one interval tier, searchable by time with bisect.
+    Praat keeps intervals sorted and non-overlapping, so the start column is already sorted.
     """
-    tg = textgrid.TextGrid.fromFile(textgrid_file_path)
-    syllable_results = []
+    def __init__(self, name, starts, ends, marks):
+        self.name = name
+        self.starts = starts
+        self.ends = ends
+        self.marks = marks
+
+    @classmethod
+    def from_tier(cls, tier):
+        # plain lists: bisect and per-item indexing are faster on them than on NumPy arrays
+        return cls(tier.name, tier.starts.tolist(), tier.ends.tolist(), tier.labels.tolist())
+
+    def __len__(self):
+        return len(self.starts)
+
+    def window(self, start, stop):
+        """Return the positions of the intervals whose start time lies in [start, stop]."""
+        return range(bisect_left(self.starts, start), bisect_right(self.starts, stop))
 
-    word_intervals = int(str(tg[0]).split(" ")[2].strip())
-    syllable_intervals = int(str(tg[1]).split(" ")[2].strip())
 
-    for word_interval in range(word_intervals):
-        if tg[0][word_interval].mark == "":
+def parse_boundary_textgrid(text):
+    """Parse TextGrid text the way textgrid.TextGrid.fromFile does (see common/textgrid_io.parse_textgrid)."""
+    return parse_textgrid(text, round_digits=TEXTGRID_PRECISION, strip_labels=False)
+
+
+def read_boundary_textgrid(textgrid_file_path):
+    """Read a TextGrid file the way textgrid.TextGrid.fromFile does, for the word and syllable boundaries."""
+    return read_textgrid(textgrid_file_path, round_digits=TEXTGRID_PRECISION, strip_labels=False)
+
+
+def index_tiers(tg):
+    """Build a TierIndex for every tier of a parsed TextGrid, in tier order."""
+    return [TierIndex.from_tier(tier) for tier in tg]
+
+
+def assign_syllables(word_index, syllable_index, VOT=0):
+    """
+    Pair every non-empty word interval with the syllables it contains.
+    The first syllable of a word is padded by VOT at its start and the last syllable at its end.
+    A word without a syllable starting at its onset is kept whole, padded by VOT on both sides.
+    """
+    syllable_results = []
+    starts, ends, marks = syllable_index.starts, syllable_index.ends, syllable_index.marks
+
+    for word_interval in range(len(word_index)):
+        if word_index.marks[word_interval] == "":
             continue
-        
-        word_interval_start = tg[0][word_interval].minTime
-        word_interval_end = tg[0][word_interval].maxTime
+
+        word_interval_start = word_index.starts[word_interval]
+        word_interval_end = word_index.ends[word_interval]
         flag = 0
-        
-        for syllable_interval in range(syllable_intervals):
-            syllable = tg[1][syllable_interval]
-            if syllable.minTime == word_interval_start and syllable.maxTime < word_interval_end:
+
+        # every syllable matched below starts inside [word start, word end]
+        for syllable_interval in syllable_index.window(word_interval_start, word_interval_end):
+            syllable_start = starts[syllable_interval]
+            syllable_end = ends[syllable_interval]
+            if syllable_start == word_interval_start and syllable_end < word_interval_end:
                 flag = 1
                 syllable_results.append({
-                    "start": syllable.minTime - VOT,
-                    "stop": syllable.maxTime,
-                    "utterance": syllable.mark
+                    "start": syllable_start - VOT,
+                    "stop": syllable_end,
+                    "utterance": marks[syllable_interval]
                 })
-            elif syllable.maxTime == word_interval_end and syllable.minTime > word_interval_start:
+            elif syllable_end == word_interval_end and syllable_start > word_interval_start:
                 syllable_results.append({
-                    "start": syllable.minTime,
-                    "stop": syllable.maxTime + VOT,
-                    "utterance": syllable.mark
+                    "start": syllable_start,
+                    "stop": syllable_end + VOT,
+                    "utterance": marks[syllable_interval]
                 })
-            elif syllable.minTime > word_interval_start and syllable.minTime < word_interval_end:
+            elif syllable_start > word_interval_start and syllable_start < word_interval_end:
                 syllable_results.append({
-                    "start": syllable.minTime,
-                    "stop": syllable.maxTime,
-                    "utterance": syllable.mark
+                    "start": syllable_start,
+                    "stop": syllable_end,
+                    "utterance": marks[syllable_interval]
                 })
-        
+
         if flag == 0:
             syllable_results.append({
-                "start": tg[0][word_interval].minTime - VOT,
-                "stop": tg[0][word_interval].maxTime + VOT,
-                "utterance": tg[0][word_interval].mark
+                "start": word_interval_start - VOT,
+                "stop": word_interval_end + VOT,
+                "utterance": word_index.marks[word_interval]
             })
-    
-    print(syllable_results)
+
     return syllable_results
 
 
+def extract_syllables(textgrid_file_path, VOT=0):
+    """
+    Extract syllables from the TextGrid file.
+    """
+    with timer("parse"):
+        tg = read_boundary_textgrid(textgrid_file_path)
+    syllable_results = syllables_from_textgrid(tg, VOT)
+
+    logger.debug("Syllables of %s: %s", textgrid_file_path, syllable_results)
+    return syllable_results
+
+
+def syllables_from_textgrid(tg, VOT=0):
+    """extract_syllables on a TextGrid parsed with read_boundary_textgrid or parse_boundary_textgrid."""
+    tiers = index_tiers(tg)
+    return assign_syllables(tiers[0], tiers[1], VOT)
+
+
 def extract_words(textgrid_file_path, VOT=0):
     """
     Extract words from the TextGrid file based on the phonetic tier.
     This function assumes that the phonetic tier is the third tier in the TextGrid.
     """
-    tg = textgrid.TextGrid.fromFile(textgrid_file_path)
+    with timer("parse"):
+        tg = read_boundary_textgrid(textgrid_file_path)
+    word_results = words_from_textgrid(tg, VOT)
+
+    logger.debug("Words of %s: %s", textgrid_file_path, word_results)
+    return word_results
+
+
+def words_from_textgrid(tg, VOT=0):
+    """extract_words on a TextGrid parsed with read_boundary_textgrid or parse_boundary_textgrid."""
     word_results = []
     # extract word boundaries from phonetic tire
-    word_intervals = int(str(tg[2]).split(" ")[2].strip())
+    word_marks = tg[0].labels.tolist()
+    phonetic_starts, phonetic_ends, phonetic_marks = tg[2].starts.tolist(), tg[2].ends.tolist(), tg[2].labels.tolist()
     
-    for word_interval in range(word_intervals):
+    for word_interval in range(len(phonetic_marks)):
         # empty phonetic intervals has been ignored !!!
-        if tg[2][word_interval].mark == "":
+        if phonetic_marks[word_interval] == "":
             continue
         
-        word = tg[0][word_interval]
-        if '/' in word.mark:
-            word.mark = word.mark.split('/')[1]
+        word = word_marks[word_interval]
+        if '/' in word:
+            word = word.split('/')[1]
 
         word_results.append({
-            'start': tg[2][word_interval].minTime - VOT,
-            'stop': tg[2][word_interval].maxTime + VOT,
-            'utterance': word.mark
+            'start': phonetic_starts[word_interval] - VOT,
+            'stop': phonetic_ends[word_interval] + VOT,
+            'utterance': word
         })
     
-    print(word_results)
     return word_results
 
 
-def segment_audio(audio_file_path, boundaries, children_type, band_id, participant_id, audio_id, output_directory_base="/mnt/data/ying/SMAAT_1st_iterative_learning/"):
+def boundary_frames(boundary, sample_rate, frames):
     """
-    Segment the audio file based on provided start/stop boundaries and save individual clips to a participant-specific folder.
+    Convert a start/stop boundary in seconds to a [begin, end) frame range.
+    Frames are truncated the same way pydub slices milliseconds, and clamped to the recording.
     """
-    participant_directory = os.path.join(output_directory_base, children_type, band_id, "new_TG", participant_id, "individual_wavs")
-    if not os.path.exists(participant_directory):
-        os.makedirs(participant_directory)
+    begin = int(boundary['start'] * 1000 * (sample_rate / 1000.0))
+    end = int(boundary['stop'] * 1000 * (sample_rate / 1000.0))
+    begin = min(max(begin, 0), frames)
+    end = min(max(end, begin), frames)
+    return begin, end
+
+
+class ClipView:
+    """
+    One word or syllable clip of a memory-mapped recording: frames [begin, end) of wav.
+    The samples are a view of the mapping, so a view costs nothing until its pages are touched.
+    """
+    __slots__ = ("wav", "begin", "end", "utterance", "start", "stop")
+
+    def __init__(self, wav, begin, end, utterance, start, stop):
+        self.wav = wav
+        self.begin = begin
+        self.end = end
+        self.utterance = utterance
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.end - self.begin
+
+    def __repr__(self):
+        return f"ClipView({self.utterance!r}, {self.start:.3f}-{self.stop:.3f}s, {len(self)} frames)"
+
+    @property
+    def sample_rate(self):
+        return self.wav.sample_rate
+
+    @property
+    def subtype(self):
+        return self.wav.subtype
 
-    sound = AudioSegment.from_wav(audio_file_path)
+    @property
+    def samples(self):
+        """(frames, channels) samples in the encoding of the recording, no copy."""
+        return self.wav.clip(self.begin, self.end)
 
+    def to_float32(self, mono=True):
+        """The samples as librosa.load would return them from the clip file: float32, down-mixed unless mono is False."""
+        samples = to_float32(self.samples)
+        return np.mean(samples, axis=1, dtype=np.float32) if mono else samples
+
+    def write(self, export_path):
+        """Write the clip as the WAV file segment_audio produces."""
+        self.wav.write_clip(export_path, self.begin, self.end)
+
+
+def clip_views(audio_file_path, boundaries):
+    """
+    Lazy clips of a (resampled) recording for start/stop boundaries from extract_words or extract_syllables.
+    Frames are computed as in segment_audio; the recording is mapped, not read.
+    """
+    wav = open_wav_memmap(audio_file_path)
+    views = []
     for boundary in boundaries:
-        begin = boundary['start'] * 1000  # Convert to ms
-        end = boundary['stop'] * 1000  # Convert to ms
-        audio_clip = sound[begin:end]
+        begin, end = boundary_frames(boundary, wav.sample_rate, wav.frames)
+        views.append(ClipView(wav, begin, end, boundary['utterance'], boundary['start'], boundary['stop']))
+    return views
+
+
+def segment_audio(audio_file_path, boundaries, children_type, band_id, participant_id, audio_id, output_directory_base="/mnt/data/ying/SMAAT_1st_iterative_learning/", clip_directory_name="individual_wavs", shard=None, export_queue=None):
+    """
+    Segment the audio file based on provided start/stop boundaries and save individual clips to a participant-specific folder.
+    With a clip_shards.ShardWriter the clips are appended to the participant's shard instead (section clip_directory_name).
+    Files are written through export_queue when one is given (the caller closes it), otherwise through a queue of
+    this call that is closed before returning.
+    """
+    participant_directory = os.path.join(output_directory_base, children_type, band_id, "new_TG", participant_id, clip_directory_name)
+    if shard is None and not os.path.exists(participant_directory):
+        os.makedirs(participant_directory)
 
-        export_path = os.path.join(participant_directory, f"{participant_id}_{audio_id}_{boundary['utterance']}.wav")
-        audio_clip.export(export_path, format='wav')
+    with timer("segment"), ExportQueue() if shard is None and export_queue is None else nullcontext(export_queue) as queue:
+        for view in clip_views(audio_file_path, boundaries):
+            if shard is not None:
+                shard.add_clip(audio_id, view.utterance, view.samples, view.sample_rate, view.subtype, section=clip_directory_name)
+                continue
+            # the clip is a view of the mapped file: only its own pages are read, on the writer thread
+            export_path = os.path.join(participant_directory, f"{participant_id}_{audio_id}_{view.utterance}.wav")
+            queue.submit(export_path, view.write, export_path)
+    count("clips", len(boundaries))
     
-    print(f"Audio segmentation complete for participant {participant_id}_{audio_id}.")
+    logger.info("Audio segmentation complete for participant %s_%s.", participant_id, audio_id)
 
 
-def process_audio(textgrid_path, children_type, band_id, participant_id, audio_id):
-    print('Start')
+class ClipRouter:
+    """
+    Collect streamed samples into clips and write each clip as soon as its last frame has arrived.
+    Clips are (begin, end, target) frame ranges; they may overlap (e.g. VOT padding). The target is the export path,
+    or whatever the write callable takes when one is given: write(target, samples, sample_rate, subtype).
+    Only the clips that overlap the current block are held in memory.
+    """
+    def __init__(self, clips, sample_rate, subtype='PCM_16', write=None):
+        self.pending = sorted(clips, key=lambda clip: clip[0])
+        self.sample_rate = sample_rate
+        self.subtype = subtype
+        self.write = write
+        self.active = []
+        self.position = 0
+        self.next_clip = 0
+
+    def feed(self, block):
+        """Route the next block of samples (frames following the previous block)."""
+        block_start = self.position
+        block_end = block_start + len(block)
+        while self.next_clip < len(self.pending) and self.pending[self.next_clip][0] < block_end:
+            self.active.append((self.pending[self.next_clip], []))
+            self.next_clip += 1
+
+        still_active = []
+        for clip, parts in self.active:
+            begin, end, export_path = clip
+            lo = max(begin, block_start) - block_start
+            hi = min(end, block_end) - block_start
+            if hi > lo:
+                parts.append(block[lo:hi].copy())
+            if end <= block_end:
+                self._write(export_path, parts)
+            else:
+                still_active.append((clip, parts))
+        self.active = still_active
+        self.position = block_end
+
+    def close(self):
+        """Write the clips that run past the end of the recording, truncated like segment_audio does."""
+        for clip, parts in self.active:
+            self._write(clip[2], parts)
+        for clip in self.pending[self.next_clip:]:
+            self._write(clip[2], [])
+        self.active = []
+        self.next_clip = len(self.pending)
+
+    def _write(self, target, parts):
+        samples = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+        if self.write is not None:
+            self.write(target, samples, self.sample_rate, self.subtype)
+        else:
+            sf.write(target, samples, self.sample_rate, subtype=self.subtype)
+
+
+@timed("resample_segment")
+def stream_resample_and_segment(audio_file_path, boundaries, children_type, band_id, participant_id, audio_id, target_sr=16000, keep_resampled=False, block_size=262144, output_directory_base="/mnt/data/ying/SMAAT_1st_iterative_learning/", syllable_boundaries=None, shard=None, res_type="soxr_hq", export_queue=None):
+    """
+    Resample the audio file block by block and write the clips given by the boundaries without an intermediate decode.
+    Down-mixing and the soxr resampler (quality from res_type, HQ by default) are the ones librosa.load uses.
+    When keep_resampled is True the full resampled recording is also written to <name>_<target_sr>Hz.wav, as
+    resample_audio does. Syllable boundaries, when given, are cut in the same pass into individual_syllable_wavs.
+    With a clip_shards.ShardWriter the clips go to the participant's shard instead of individual files; otherwise
+    they are written through export_queue, or a queue of this call closed before returning.
+    Returns the path of the resampled copy, or None when it was not kept.
+    """
+    quality = resampling.stream_quality(res_type)
+    clips = []
+    for clip_boundaries, clip_directory_name in ((boundaries, "individual_wavs"), (syllable_boundaries, "individual_syllable_wavs")):
+        if clip_boundaries is None:
+            continue
+        participant_directory = os.path.join(output_directory_base, children_type, band_id, "new_TG", participant_id, clip_directory_name)
+        if shard is None and not os.path.exists(participant_directory):
+            os.makedirs(participant_directory)
+        for boundary in clip_boundaries:
+            # clamped to the end of the recording by ClipRouter.close
+            begin, end = boundary_frames(boundary, target_sr, float('inf'))
+            if shard is not None:
+                clips.append((begin, end, (clip_directory_name, boundary['utterance'])))
+            else:
+                clips.append((begin, end, os.path.join(participant_directory, f"{participant_id}_{audio_id}_{boundary['utterance']}.wav")))
+    owned_queue = ExportQueue() if shard is None and export_queue is None else None
+    if shard is not None:
+        def write(target, samples, sample_rate, subtype):
+            section, word = target
+            shard.add_clip(audio_id, word, samples, sample_rate, subtype, section=section)
+    else:
+        queue = owned_queue or export_queue
+        def write(export_path, samples, sample_rate, subtype):
+            queue.submit(export_path, sf.write, export_path, samples, sample_rate, subtype)
+    router = ClipRouter(clips, target_sr, write=write)
+
+    output_file_path = f"{audio_file_path[:-4]}_{target_sr}Hz.wav" if keep_resampled else None
+    resampled_file = sf.SoundFile(output_file_path, 'w', samplerate=target_sr, channels=1, subtype='PCM_16') if keep_resampled else None
+
+    try:
+        with sf.SoundFile(audio_file_path) as source, owned_queue or nullcontext():
+            resampler = None
+            if source.samplerate != target_sr:
+                resampler = soxr.ResampleStream(source.samplerate, target_sr, 1, dtype='float32', quality=quality)
+
+            def emit(samples):
+                router.feed(samples)
+                if resampled_file is not None:
+                    resampled_file.write(samples)
+
+            for block in source.blocks(blocksize=block_size, dtype='float32', always_2d=True):
+                mono = np.mean(block, axis=1, dtype=np.float32)
+                emit(resampler.resample_chunk(mono) if resampler is not None else mono)
+            if resampler is not None:
+                emit(resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True))
+            router.close()
+        count("clips", len(clips))
+    finally:
+        if resampled_file is not None:
+            resampled_file.close()
+
+    logger.info("Streaming segmentation complete for participant %s_%s.", participant_id, audio_id)
+    return output_file_path
+
+
+def process_audio(textgrid_path, children_type, band_id, participant_id, audio_id, streaming=False, keep_resampled=True, corpus_root="/mnt/data/ying/SMAAT_1st_iterative_learning/", cache_directory=None, res_type="soxr_hq"):
+    logger.info("Start %s_%s", participant_id, audio_id)
 
     textgrid_file_path = textgrid_path
-    audio_file_path = f'/mnt/data/ying/SMAAT_1st_iterative_learning/{children_type}/{band_id}/new_TG/{participant_id}/{audio_id}.wav'
+    audio_file_path = os.path.join(corpus_root, children_type, band_id, "new_TG", participant_id, f"{audio_id}.wav")
+    cache = ResampleCache(cache_directory) if cache_directory else None
     
     # Step 1: Extract words from TextGrid
-    print('Extracting words...')
+    logger.info('Extracting words...')
     words = extract_words(textgrid_file_path)
 
+    if streaming and cache is not None:
+        # a cached copy is cheaper to segment than a fresh decode; on a miss the streamed copy fills the cache
+        cache_key = cache.key(audio_file_path, 16000, res_type)
+        resampled_audio_path = f"{audio_file_path[:-4]}_16000Hz.wav"
+        if cache.fetch(cache_key, resampled_audio_path):
+            logger.info('Segmenting cached resampled audio...')
+            segment_audio(resampled_audio_path, words, children_type, band_id, participant_id, audio_id, output_directory_base=corpus_root)
+        else:
+            logger.info('Resampling and segmenting audio...')
+            stream_resample_and_segment(audio_file_path, words, children_type, band_id, participant_id, audio_id, keep_resampled=True, output_directory_base=corpus_root, res_type=res_type)
+            cache.store(cache_key, resampled_audio_path)
+        cache.close()
+        if not keep_resampled:
+            # the copy was only written to fill or read the cache
+            os.remove(resampled_audio_path)
+        logger.info("Finished.")
+        return
+
+    if streaming:
+        # Steps 2 and 3 in one pass over the source audio
+        logger.info('Resampling and segmenting audio...')
+        stream_resample_and_segment(audio_file_path, words, children_type, band_id, participant_id, audio_id, keep_resampled=keep_resampled, output_directory_base=corpus_root, res_type=res_type)
+        logger.info("Finished.")
+        return
+
     # Step 2: Resample the audio
-    print('Resampling audio...')
-    resampled_audio_path = resample_audio(audio_file_path)
+    logger.info('Resampling audio...')
+    resampled_audio_path = resample_audio(audio_file_path, res_type=res_type, cache=cache)
 
     # Step 3: Segment the audio based on word boundaries
-    print('Segmenting audio...')
-    segment_audio(resampled_audio_path, words, children_type, band_id, participant_id, audio_id)
+    logger.info('Segmenting audio...')
+    segment_audio(resampled_audio_path, words, children_type, band_id, participant_id, audio_id, output_directory_base=corpus_root)
 
-    print("Finished.")
+    if cache is not None:
+        cache.close()
+    logger.info("Finished.")
 
 def main():
 
@@ -177,18 +506,33 @@ def main():
     parser.add_argument('band_id', type=str, default="Band_3", help="Band ID ('Band_1', 'Band_2', 'Band_3', or 'Band_4').")
     parser.add_argument('participant_id', type=str, help="Participant ID (e.g., '302_Bonnie').")
     parser.add_argument('audio_id', type=str, help="Audio ID (e.g., 'A006_03201225_C028').")
+    parser.add_argument('--streaming', action='store_true', help="Resample and segment in a single streaming pass over the source audio.")
+    parser.add_argument('--no-resampled-copy', dest='keep_resampled', action='store_false', help="In streaming mode, do not write the full-length resampled WAV.")
+    parser.add_argument('--cache-dir', dest='cache_directory', type=str, default=None, help="Reuse resampled audio from this content-addressed cache directory.")
+    parser.add_argument('--resampler', type=str, default=resampling.DEFAULT_METHOD, choices=list(resampling.METHODS), help="Resampling backend and quality tier (streaming mode takes the soxr ones).")
+    parser.add_argument('--log-level', type=str, default="WARNING", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="Logging level (DEBUG also logs the extracted boundaries).")
+    parser.add_argument('--timings', type=str, default=None, help="Write the per-stage timing summary to this JSON file.")
+    parser.add_argument('--profile', type=str, default=None, help="Run under cProfile and write the statistics to this file.")
 
     # Parse the arguments
     args = parser.parse_args()
+    configure_logging(args.log_level)
 
     # Process the participant folder based on the parsed arguments
-    process_audio(
-        textgrid_path=args.textgrid_path,
-        children_type=args.children_type,
-        band_id=args.band_id,
-        participant_id=args.participant_id,
-        audio_id=args.audio_id
-    )
+    with profiling(args.profile):
+        process_audio(
+            textgrid_path=args.textgrid_path,
+            children_type=args.children_type,
+            band_id=args.band_id,
+            participant_id=args.participant_id,
+            audio_id=args.audio_id,
+            streaming=args.streaming,
+            keep_resampled=args.keep_resampled,
+            cache_directory=args.cache_directory,
+            res_type=args.resampler
+        )
+    if args.timings:
+        write_summary(args.timings, textgrid_path=args.textgrid_path)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import hashlib
+import argparse
+
+"""
+Content-addressed cache for resampled audio.
+
+An entry is keyed by the SHA-256 of the source file content, the target sampling rate and the resampler
+settings, so a renamed or copied recording still hits and an edited one misses. Entries are stored as
+<cache_directory>/<key[:2]>/<key>.wav and indexed in <cache_directory>/index.sqlite together with their
+size and last use. When the cache grows past max_bytes the least recently used entries are evicted.
+SQLite serialises concurrent writers, so batch workers can share one cache directory.
+
+CLI usage example (print the statistics of a cache):
+python resample_cache.py /mnt/data/ying/resample_cache
+"""
+
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3
+
+
+def file_digest(file_path, chunk_size=1 << 20):
+    """SHA-256 of a file's content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResampleCache:
+    def __init__(self, cache_directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_directory = cache_directory
+        self.max_bytes = max_bytes
+        os.makedirs(cache_directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(cache_directory, "index.sqlite"), timeout=60)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self.connection.executemany("INSERT OR IGNORE INTO stats VALUES (?, 0)", [("hits",), ("misses",), ("bytes_saved",)])
+
+    def close(self):
+        self.connection.close()
+
+    def key(self, source_path, target_sr, settings):
+        """Cache key of a source file resampled to target_sr with the given resampler settings (a string)."""
+        return hashlib.sha256(f"{file_digest(source_path)}:{target_sr}:{settings}".encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_directory, key[:2], f"{key}.wav")
+
+    def fetch(self, key, output_path):
+        """Copy the cached entry to output_path. Returns False (and counts a miss) when the key is not cached."""
+        entry_path = self.entry_path(key)
+        with self.connection:
+            row = self.connection.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or not os.path.exists(entry_path):
+                self._count("misses", 1)
+                return False
+            self.connection.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._count("hits", 1)
+            self._count("bytes_saved", row[0])
+        shutil.copyfile(entry_path, output_path)
+        return True
+
+    def store(self, key, produced_path):
+        """Add a freshly resampled file to the cache, then evict least recently used entries over the size cap."""
+        entry_path = self.entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        temporary_path = f"{entry_path}.{os.getpid()}.tmp"
+        shutil.copyfile(produced_path, temporary_path)
+        os.replace(temporary_path, entry_path)
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, os.path.getsize(entry_path), time.time()))
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        with self.connection:
+            total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for key, size in self.connection.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall():
+                if total <= self.max_bytes:
+                    break
+                self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                if os.path.exists(self.entry_path(key)):
+                    os.remove(self.entry_path(key))
+                total -= size
+
+    def stats(self):
+        """Hits, misses and bytes of resampled audio served from the cache, plus the current cache size."""
+        stats = dict(self.connection.execute("SELECT name, value FROM stats").fetchall())
+        entries, size = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        stats.update(entries=entries, size_bytes=size)
+        return stats
+
+    def _count(self, name, amount):
+        self.connection.execute("UPDATE stats SET value = value + ? WHERE name = ?", (amount, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the statistics of a resample cache.")
+    parser.add_argument('cache_directory', type=str, help="Cache directory.")
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.cache_directory, "index.sqlite")):
+        sys.exit(f"No resample cache found in {args.cache_directory}.")
+    cache = ResampleCache(args.cache_directory)
+    for name, value in cache.stats().items():
+        print(f"{name}: {value}")
+    cache.close()
+
+
+if __name__ == '__main__':
+    main()
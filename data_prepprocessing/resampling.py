@@ -0,0 +1,132 @@
+import os
+import sys
+import argparse
+import traceback
+from math import gcd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import soundfile as sf
+import soxr
+
+"""
+Resampling backends with quality tiers, without importing librosa.
+
+Methods (the names librosa.load takes as res_type, so soxr_hq output is identical to librosa.load's default):
+    soxr_vhq, soxr_hq, soxr_mq, soxr_lq, soxr_qq   libsoxr at very high / high / medium / low / quick quality
+    polyphase                                      scipy.signal.resample_poly with the reduced rational ratio
+                                                   (e.g. 44100 -> 16000 is up 160 / down 441)
+Files are read with soundfile as float32 and down-mixed by averaging the channels, as librosa.load does, and
+written as PCM_16. resample_files converts many files in one call with a pool of worker processes.
+benchmarks/bench_resampling.py times every method and reports its SNR against an exact reference.
+
+The method is part of the ResampleCache key, so cached outputs of different methods never mix.
+
+CLI usage example:
+python resampling.py /path/to/A006_03201225_C028.wav --method soxr_qq
+python resampling.py /mnt/data/ying/SMAAT_1st_iterative_learning/TD/Band_3/new_TG/302_Bonnie/*.wav --method polyphase --workers 8
+"""
+
+DEFAULT_METHOD = "soxr_hq"
+
+# method -> (backend, setting)
+METHODS = {
+    "soxr_vhq": ("soxr", "VHQ"),
+    "soxr_hq": ("soxr", "HQ"),
+    "soxr_mq": ("soxr", "MQ"),
+    "soxr_lq": ("soxr", "LQ"),
+    "soxr_qq": ("soxr", "QQ"),
+    "polyphase": ("polyphase", None),
+}
+
+
+def check_method(method):
+    if method not in METHODS:
+        raise ValueError(f"Unknown resampling method '{method}' (expected one of {', '.join(METHODS)}).")
+    return METHODS[method]
+
+
+def stream_quality(method):
+    """soxr quality of a method for soxr.ResampleStream; polyphase has no streaming form."""
+    backend, setting = check_method(method)
+    if backend != "soxr":
+        raise ValueError(f"Resampling method '{method}' cannot be used in streaming mode; use one of the soxr methods.")
+    return setting
+
+
+def resample(y, orig_sr, target_sr, method=DEFAULT_METHOD):
+    """Resample float32 samples (frames, or frames x channels) from orig_sr to target_sr."""
+    backend, setting = check_method(method)
+    if orig_sr == target_sr:
+        return y
+    if backend == "soxr":
+        return soxr.resample(y, orig_sr, target_sr, quality=setting)
+    # imported here: scipy is only needed by this backend
+    from scipy.signal import resample_poly
+    divisor = gcd(int(orig_sr), int(target_sr))
+    return resample_poly(y, int(target_sr) // divisor, int(orig_sr) // divisor, axis=0).astype(np.float32, copy=False)
+
+
+def load_resampled(audio_file_path, target_sr=16000, method=DEFAULT_METHOD):
+    """(mono float32 samples at target_sr, target_sr), like librosa.load(path, sr=target_sr, res_type=method)."""
+    audio, sr = sf.read(audio_file_path, dtype='float32', always_2d=True)
+    mono = np.mean(audio, axis=1, dtype=np.float32) if audio.shape[1] > 1 else audio[:, 0]
+    return resample(mono, sr, target_sr, method), target_sr
+
+
+def resample_file(audio_file_path, output_file_path, target_sr=16000, method=DEFAULT_METHOD):
+    audio, _ = load_resampled(audio_file_path, target_sr, method)
+    sf.write(output_file_path, audio, target_sr, subtype='PCM_16')
+    return output_file_path
+
+
+def _resample_task(audio_file_path, output_file_path, target_sr, method):
+    """resample_file for a worker process. Returns None on success, or the formatted traceback."""
+    try:
+        resample_file(audio_file_path, output_file_path, target_sr, method)
+        return None
+    except Exception:
+        return traceback.format_exc()
+
+
+def resample_files(pairs, target_sr=16000, method=DEFAULT_METHOD, workers=None):
+    """
+    Resample (input, output) path pairs with a pool of worker processes (workers == 1 runs in-process).
+    Returns [(pair, traceback)] of the failures, in input order.
+    """
+    check_method(method)
+    failures = []
+    if workers == 1 or len(pairs) <= 1:
+        for index, pair in enumerate(pairs):
+            error = _resample_task(*pair, target_sr, method)
+            if error is not None:
+                failures.append((index, pair, error))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_resample_task, *pair, target_sr, method): index for index, pair in enumerate(pairs)}
+            for future in as_completed(futures):
+                error = future.result()
+                if error is not None:
+                    failures.append((futures[future], pairs[futures[future]], error))
+    failures.sort(key=lambda failure: failure[0])
+    return [(pair, error) for _, pair, error in failures]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resample WAV files to <name>_<sr>Hz.wav with a selectable backend.")
+    parser.add_argument('audio_paths', nargs='+', type=str, help="WAV files to resample.")
+    parser.add_argument('--method', type=str, default=DEFAULT_METHOD, choices=list(METHODS), help="Resampling backend and quality tier.")
+    parser.add_argument('--target-sr', type=int, default=16000, help="Target sampling rate.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes (1 runs in-process).")
+    args = parser.parse_args()
+
+    pairs = [(path, f"{path[:-4]}_{args.target_sr}Hz.wav") for path in args.audio_paths]
+    failures = resample_files(pairs, args.target_sr, args.method, args.workers)
+    for (path, _), error in failures:
+        print(f"--- {path}\n{error}")
+    print(f"Resampled {len(pairs) - len(failures)}/{len(pairs)} file(s) with {args.method}.")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import os
+import struct
+import numpy as np
+import soundfile as sf
+
+"""
+Memory-mapped access to the sample data of a WAV file.
+Only the RIFF chunk headers are read from disk; the samples stay in the page cache and clips are
+sliced as views of the mapping, so memory use does not grow with the length of the recording.
+
+Supported encodings: 8/16/32-bit PCM and 32/64-bit float (plain or WAVE_FORMAT_EXTENSIBLE).
+24-bit PCM has no matching NumPy dtype and is rejected.
+to_float32 converts mapped samples to the float32 values soundfile (and so librosa.load) returns for them.
+"""
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# (format tag, bits per sample) -> (numpy dtype, soundfile subtype)
+_ENCODINGS = {
+    (WAVE_FORMAT_PCM, 8): ('u1', 'PCM_U8'),
+    (WAVE_FORMAT_PCM, 16): ('<i2', 'PCM_16'),
+    (WAVE_FORMAT_PCM, 32): ('<i4', 'PCM_32'),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): ('<f4', 'FLOAT'),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): ('<f8', 'DOUBLE'),
+}
+
+
+class WavMemmap:
+    """Sample data of a WAV file mapped as a (frames, channels) array."""
+    def __init__(self, path, samples, sample_rate, subtype):
+        self.path = path
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.subtype = subtype
+
+    @property
+    def frames(self):
+        return self.samples.shape[0]
+
+    @property
+    def channels(self):
+        return self.samples.shape[1]
+
+    def clip(self, begin, end):
+        """Return frames [begin, end) as a view of the mapping (no copy)."""
+        return self.samples[begin:end]
+
+    def write_clip(self, export_path, begin, end):
+        """Write frames [begin, end) to a WAV file with the same encoding as the source."""
+        clip = self.clip(begin, end)
+        if clip.dtype == np.uint8:
+            # soundfile cannot take unsigned 8-bit input; widen to int16, which maps back to PCM_U8 exactly
+            clip = (clip.astype(np.int16) - 128) << 8
+        sf.write(export_path, clip, self.sample_rate, subtype=self.subtype)
+
+
+def to_float32(samples):
+    """Scale PCM samples to [-1, 1) float32 the way libsndfile reads them; float samples are only cast."""
+    if samples.dtype == np.uint8:
+        return (samples.astype(np.float32) - 128) / 128
+    if samples.dtype.kind == 'i':
+        return samples.astype(np.float32) / np.float32(2 ** (8 * samples.dtype.itemsize - 1))
+    return samples.astype(np.float32)
+
+
+def _read_chunks(f, file_size):
+    """Yield (chunk id, payload offset, payload size) for every chunk after the RIFF/WAVE header."""
+    offset = 12
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        chunk_id, chunk_size = struct.unpack('<4sI', f.read(8))
+        yield chunk_id, offset + 8, chunk_size
+        # chunks are word aligned
+        offset += 8 + chunk_size + (chunk_size & 1)
+
+
+def open_wav_memmap(wav_file_path):
+    """Parse the WAV header and memory-map its data chunk read-only."""
+    file_size = os.path.getsize(wav_file_path)
+    fmt = None
+    data_offset = data_size = None
+
+    with open(wav_file_path, 'rb') as f:
+        riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave != b'WAVE':
+            raise ValueError(f"{wav_file_path} is not a RIFF/WAVE file.")
+
+        for chunk_id, payload_offset, chunk_size in _read_chunks(f, file_size):
+            if chunk_id == b'fmt ':
+                f.seek(payload_offset)
+                fmt_bytes = f.read(chunk_size)
+                format_tag, channels, sample_rate, _, block_align, bits = struct.unpack('<HHIIHH', fmt_bytes[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE:
+                    # the sub-format GUID starts with the plain format tag
+                    format_tag = struct.unpack('<H', fmt_bytes[24:26])[0]
+                fmt = (format_tag, channels, sample_rate, block_align, bits)
+            elif chunk_id == b'data':
+                data_offset = payload_offset
+                # streamed recordings may leave the size unset; never map past the end of the file
+                data_size = min(chunk_size, file_size - payload_offset)
+                break
+
+    if fmt is None or data_offset is None:
+        raise ValueError(f"{wav_file_path} has no fmt or data chunk.")
+
+    format_tag, channels, sample_rate, block_align, bits = fmt
+    if (format_tag, bits) not in _ENCODINGS:
+        raise ValueError(f"Unsupported WAV encoding in {wav_file_path}: format {format_tag:#06x}, {bits} bits.")
+    dtype, subtype = _ENCODINGS[(format_tag, bits)]
+
+    frames = data_size // block_align
+    if frames == 0:
+        samples = np.zeros((0, channels), dtype=dtype)
+    else:
+        samples = np.memmap(wav_file_path, dtype=dtype, mode='r', offset=data_offset, shape=(frames, channels))
+    return WavMemmap(wav_file_path, samples, sample_rate, subtype)
@@ -0,0 +1,326 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from data_annotation import csv_to_textgrid
+from data_prepprocessing import crop_textgrid, preprocessing_audio, resampling
+from common.corpus_manifest import CorpusManifest, file_signature
+from common.instrumentation import configure_logging, collecting, current_metrics, count, write_summary
+
+"""
+Make-style runner for the whole pipeline: CSV -> TextGrid, crop, resample/segment and agreement.
+
+Every recording of the corpus is a small dependency graph of steps:
+    textgrid  csv_to_textgrid.convert_recording   <audio_id>.csv + <audio_id>.wav -> <audio_id>.TextGrid
+    crop      crop_textgrid.process_textgrid       <audio_id>.TextGrid -> rebase_to_zero_TG/ (and individual_TG/)
+    audio     preprocessing_audio.process_audio    <audio_id>.TextGrid + <audio_id>.wav -> <audio_id>_16000Hz.wav, individual_wavs/
+crop and audio depend on textgrid, which is only part of the graph when a CSV lies next to the WAV. With --agreement,
+AI_clinician_agreement.main runs last over a band directory, as one more step whose inputs are the model output
+TextGrids of the band (listed through the corpus manifest) and the ground-truth CSV. Its optional outputs are
+written only when asked for: --agreement-store, --agreement-index, --agreement-ci and --agreement-confusions.
+
+The state file (--state, SQLite) holds one record per finished step: the fingerprint of its inputs (path, size and
+mtime of every input file, plus the options that change its output) and the size and mtime of every file it wrote.
+A step is skipped while its input fingerprint is unchanged and its outputs are still the files it wrote; an edited
+TextGrid therefore re-runs crop and audio of that recording only, and a deleted clip re-runs the step that wrote it.
+The record of a step is removed before the step starts and written once it has finished, so after a crash or
+Ctrl-C a run resumes exactly where it stopped: finished steps are skipped, the interrupted one runs again.
+A failed step is reported with its traceback and the steps that depend on it are not run ("blocked").
+--dry-run prints what would run; --force re-runs everything.
+
+An existing TextGrid is never regenerated from its CSV (the textgrid step only creates missing TextGrids), as it
+may hold the clinicians' transcription.
+
+CLI usage example:
+python run_pipeline.py /mnt/data/ying/SMAAT_1st_iterative_learning --children-type TD --band Band_3 --workers 8
+python run_pipeline.py /mnt/data/ying/SMAAT_1st_iterative_learning --agreement /mnt/data/ying/SMAAT_1st_iterative_learning/SSD/Band_4 --dry-run
+python run_pipeline.py /mnt/data/ying/SMAAT_1st_iterative_learning --agreement /mnt/data/ying/SMAAT_1st_iterative_learning/SSD/Band_4 --agreement-ci error_rates_ci.csv
+"""
+
+STEPS = ("textgrid", "crop", "audio", "agreement")
+AGREEMENT_OUTPUTS = ("error_rates_by_stage_with_diacritics.csv", "error_rates_by_stage_with_diacritics.parquet",
+                     "all_phonemes_filename_with_diacritics.csv")
+
+
+class Step:
+    """
+    One node of a recording's graph. run() produces the outputs; outputs() lists the files it wrote (called after
+    run(), or before it for a create_only step, which is up to date as soon as its outputs exist).
+    """
+    def __init__(self, name, inputs, run, outputs, params=None, depends=(), create_only=False):
+        self.name = name
+        self.inputs = inputs
+        self.run = run
+        self.outputs = outputs
+        self.params = params or {}
+        self.depends = depends
+        self.create_only = create_only
+
+    def fingerprint(self):
+        inputs = [(os.path.abspath(path), file_signature(path)) for path in self.inputs]
+        payload = json.dumps({"step": self.name, "inputs": inputs, "params": self.params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def signatures(paths):
+    return [(os.path.abspath(path), file_signature(path)) for path in paths]
+
+
+class PipelineState:
+    def __init__(self, database_path):
+        self.database_path = database_path
+        self.connection = sqlite3.connect(database_path, timeout=60)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS steps (item TEXT NOT NULL, step TEXT NOT NULL, fingerprint TEXT NOT NULL, "
+                                    "outputs TEXT NOT NULL, finished_at REAL NOT NULL, PRIMARY KEY (item, step))")
+
+    def close(self):
+        self.connection.close()
+
+    def up_to_date(self, item, step, fingerprint):
+        """True when the step finished with these inputs and every file it wrote is still as it left it."""
+        row = self.connection.execute("SELECT fingerprint, outputs FROM steps WHERE item = ? AND step = ?", (item, step)).fetchone()
+        if row is None or row[0] != fingerprint:
+            return False
+        return all(file_signature(path) == (tuple(signature) if signature else None) for path, signature in json.loads(row[1]))
+
+    def forget(self, item, step):
+        with self.connection:
+            self.connection.execute("DELETE FROM steps WHERE item = ? AND step = ?", (item, step))
+
+    def record(self, item, step, fingerprint, outputs):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?, ?)",
+                                    (item, step, fingerprint, json.dumps(signatures(outputs), ensure_ascii=False), time.time()))
+
+
+def crop_outputs(textgrid_path, participant_directory, participant_id, audio_id, keep_cropped=False):
+    """The TextGrids process_textgrid writes for a recording."""
+    labels = crop_textgrid.get_labels_from_word_tier(crop_textgrid.load_textgrid_file(textgrid_path))
+    directories = ["rebase_to_zero_TG"] + (["individual_TG"] if keep_cropped else [])
+    return [os.path.join(participant_directory, directory, f"{participant_id}_{audio_id}_{label}.TextGrid")
+            for directory in directories for label in labels]
+
+
+def audio_outputs(textgrid_path, audio_path, participant_directory, participant_id, audio_id, keep_resampled=True):
+    """The WAVs process_audio writes for a recording."""
+    words = preprocessing_audio.extract_words(textgrid_path)
+    outputs = [f"{audio_path[:-4]}_16000Hz.wav"] if keep_resampled else []
+    return outputs + [os.path.join(participant_directory, "individual_wavs", f"{participant_id}_{audio_id}_{word['utterance']}.wav") for word in words]
+
+
+def recording_steps(item, corpus_root, steps=STEPS, keep_cropped=False, streaming=False, keep_resampled=True, cache_directory=None,
+                    res_type=resampling.DEFAULT_METHOD):
+    """The graph of one recording, in dependency order."""
+    children_type, band_id, participant_id, audio_id = item["children_type"], item["band_id"], item["participant_id"], item["audio_id"]
+    participant_directory = os.path.join(corpus_root, children_type, band_id, "new_TG", participant_id)
+    textgrid_path = os.path.join(participant_directory, f"{audio_id}.TextGrid")
+    audio_path = os.path.join(participant_directory, f"{audio_id}.wav")
+    csv_path = os.path.join(participant_directory, f"{audio_id}.csv")
+    graph = []
+    depends = ()
+    if "textgrid" in steps and os.path.exists(csv_path):
+        def convert():
+            error = csv_to_textgrid.convert_recording(csv_path, audio_path, textgrid_path)
+            if error is not None:
+                raise RuntimeError(f"Converting {csv_path} failed:\n{error}")
+        graph.append(Step("textgrid", [csv_path, audio_path], convert, lambda: [textgrid_path], create_only=True))
+        depends = ("textgrid",)
+    if "crop" in steps:
+        graph.append(Step(
+            "crop", [textgrid_path],
+            lambda: crop_textgrid.process_textgrid(textgrid_path, children_type, band_id, participant_id, audio_id, corpus_root=corpus_root,
+                                                   keep_cropped=keep_cropped),
+            lambda: crop_outputs(textgrid_path, participant_directory, participant_id, audio_id, keep_cropped),
+            params={"keep_cropped": keep_cropped}, depends=depends))
+    if "audio" in steps:
+        keeps_copy = not streaming or keep_resampled
+        graph.append(Step(
+            "audio", [textgrid_path, audio_path],
+            lambda: preprocessing_audio.process_audio(textgrid_path, children_type, band_id, participant_id, audio_id, streaming=streaming,
+                                                      keep_resampled=keep_resampled, corpus_root=corpus_root,
+                                                      cache_directory=cache_directory, res_type=res_type),
+            lambda: audio_outputs(textgrid_path, audio_path, participant_directory, participant_id, audio_id, keeps_copy),
+            params={"streaming": streaming, "keep_resampled": keeps_copy, "res_type": res_type}, depends=depends))
+    return graph
+
+
+def run_steps(item_key, graph, state, force=False, dry_run=False):
+    """
+    Bring the steps of one item up to date in order.
+    Returns [(step name, status, traceback or None)], status being "ok", "skipped", "failed", "blocked" or (dry run) "pending".
+    """
+    results = []
+    not_done = set()
+    for step in graph:
+        if any(name in not_done for name in step.depends):
+            not_done.add(step.name)
+            results.append((step.name, "pending" if dry_run else "blocked", None))
+            continue
+        if step.create_only and not force:
+            up_to_date = all(os.path.exists(path) for path in step.outputs())
+        else:
+            fingerprint = step.fingerprint()
+            up_to_date = not force and state.up_to_date(item_key, step.name, fingerprint)
+        if up_to_date:
+            results.append((step.name, "skipped", None))
+            continue
+        if dry_run:
+            not_done.add(step.name)
+            results.append((step.name, "pending", None))
+            continue
+        state.forget(item_key, step.name)
+        try:
+            step.run()
+            if not step.create_only:
+                state.record(item_key, step.name, fingerprint, step.outputs())
+            results.append((step.name, "ok", None))
+        except Exception:
+            not_done.add(step.name)
+            results.append((step.name, "failed", traceback.format_exc()))
+    return results
+
+
+def run_item(item, corpus_root, state_path, options, force=False, dry_run=False):
+    """run_steps for one recording in a worker. Returns (results, snapshot of the item's timings and counters)."""
+    with collecting() as metrics:
+        state = PipelineState(state_path)
+        try:
+            results = run_steps(item["key"], recording_steps(item, corpus_root, **options), state, force, dry_run)
+        finally:
+            state.close()
+    return results, metrics.snapshot()
+
+
+def agreement_step(band_directory, manifest, workers=None, ground_truth_path="/home/ying/preprocess_SMAAT/stages_words.csv", store_path=None,
+                   index_path=None, ci_path=None, confusion_path=None):
+    """
+    AI_clinician_agreement.main over a band as a step; its outputs are written to the working directory.
+    The optional outputs (result store, phoneme index, confidence intervals, confusions) are written when their path is given.
+    """
+    def run():
+        # imported here: pandas and the agreement modules are only needed by this step
+        from data_analysis import AI_clinician_agreement
+        AI_clinician_agreement.main(inpath=band_directory, workers=workers, store_path=store_path, index_path=index_path,
+                                    manifest_path=manifest.database_path, ground_truth_path=ground_truth_path, ci_path=ci_path,
+                                    confusion_path=confusion_path)
+    files = [path for path, _ in manifest.agreement_files(band_directory)]
+    outputs = list(AGREEMENT_OUTPUTS) + [path for path in (ci_path, confusion_path) if path]
+    return Step("agreement", files + [ground_truth_path], run, lambda: [path for path in outputs if os.path.exists(path)],
+                params={"ci_path": ci_path, "confusion_path": confusion_path})
+
+
+def run_pipeline(corpus_root, state_path="pipeline_state.sqlite", manifest_path="corpus_manifest.sqlite", steps=STEPS, workers=None,
+                 children_types=None, bands=None, agreement_directory=None, ground_truth_path="/home/ying/preprocess_SMAAT/stages_words.csv",
+                 force=False, dry_run=False, agreement_options=None, **options):
+    """
+    Bring every recording of the corpus (and the agreement of agreement_directory) up to date.
+    agreement_options: the optional outputs of the agreement step (store_path, index_path, ci_path, confusion_path).
+    Returns [(item key, step name, status, traceback or None)] of every step, in corpus order.
+    """
+    corpus_root = os.path.abspath(corpus_root)
+    manifest = CorpusManifest(manifest_path)
+    manifest.scan(corpus_root, workers, children_types, bands)
+    # a recording needs its WAV, and its TextGrid or a CSV to generate it from
+    items = []
+    for recording in manifest.recordings(corpus_root, children_types, bands):
+        if recording["audio_path"] is None:
+            print(f"ATTENTION!!! No WAV file next to {recording['textgrid_path']}; the recording is skipped.")
+            continue
+        if recording["textgrid_path"] is None and not os.path.exists(f"{recording['audio_path'][:-4]}.csv"):
+            print(f"ATTENTION!!! No TextGrid or CSV file next to {recording['audio_path']}; the recording is skipped.")
+            continue
+        items.append({key: recording[key] for key in ("key", "children_type", "band_id", "participant_id", "audio_id")})
+    print(f"Found {len(items)} recording(s) under {corpus_root}.")
+    options = dict(options, steps=steps)
+    # create the state file before the workers open it
+    PipelineState(state_path).close()
+    results = [None] * len(items)
+
+    def report(done, index, result):
+        item_results, snapshot = result
+        current_metrics().merge(snapshot)
+        results[index] = item_results
+        for _, status, _ in item_results:
+            count(f"steps_{status}")
+        summary = " ".join(f"{name}:{status}" for name, status, _ in item_results)
+        item = items[index]
+        print(f"[{done}/{len(items)}] {item['children_type']}/{item['band_id']}/{item['participant_id']}/{item['audio_id']} {summary}")
+
+    if workers == 1:
+        for index, item in enumerate(items):
+            report(index + 1, index, run_item(item, corpus_root, state_path, options, force, dry_run))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(run_item, item, corpus_root, state_path, options, force, dry_run): index for index, item in enumerate(items)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                report(done, futures[future], future.result())
+
+    outcome = [(item["key"], name, status, error) for item, item_results in zip(items, results) for name, status, error in item_results]
+    if agreement_directory and "agreement" in steps:
+        state = PipelineState(state_path)
+        item_key = f"agreement:{os.path.abspath(agreement_directory)}"
+        with collecting() as metrics:
+            agreement_results = run_steps(item_key, [agreement_step(agreement_directory, manifest, workers, ground_truth_path, **(agreement_options or {}))], state, force, dry_run)
+        current_metrics().merge(metrics.snapshot())
+        state.close()
+        outcome += [(item_key, name, status, error) for name, status, error in agreement_results]
+        print(f"{item_key} " + " ".join(f"{name}:{status}" for name, status, _ in agreement_results))
+    manifest.close()
+    return outcome
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pipeline steps that are out of date for every recording of a corpus, resuming after interruptions.")
+    parser.add_argument('corpus_root', type=str, help="Corpus root containing <children_type>/<band_id>/new_TG/<participant_id>/.")
+    parser.add_argument('--children-type', dest='children_types', nargs='+', help="Only process these children types (e.g., TD SSD).")
+    parser.add_argument('--band', dest='bands', nargs='+', help="Only process these bands (e.g., Band_3).")
+    parser.add_argument('--steps', nargs='+', choices=STEPS, default=list(STEPS), help="Steps to bring up to date.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes (1 runs in-process).")
+    parser.add_argument('--state', dest='state_path', type=str, default="pipeline_state.sqlite", help="State file recording the finished steps.")
+    parser.add_argument('--manifest', dest='manifest_path', type=str, default="corpus_manifest.sqlite", help="Corpus manifest (SQLite) listing the recordings.")
+    parser.add_argument('--keep-cropped', action='store_true', help="Also save the cropped TextGrids with their original timestamps to individual_TG.")
+    parser.add_argument('--streaming', action='store_true', help="Resample and segment in a single streaming pass.")
+    parser.add_argument('--no-resampled-copy', dest='keep_resampled', action='store_false', help="In streaming mode, do not write the full-length resampled WAV.")
+    parser.add_argument('--cache-dir', dest='cache_directory', type=str, default=None, help="Reuse resampled audio from this content-addressed cache directory.")
+    parser.add_argument('--resampler', type=str, default=resampling.DEFAULT_METHOD, choices=list(resampling.METHODS), help="Resampling backend and quality tier (streaming mode takes the soxr ones).")
+    parser.add_argument('--agreement', dest='agreement_directory', type=str, default=None, help="Band directory to compute the AI/clinician agreement of (results go to the working directory).")
+    parser.add_argument('--ground-truth', dest='ground_truth_path', type=str, default="/home/ying/preprocess_SMAAT/stages_words.csv", help="Ground-truth CSV of the agreement step.")
+    parser.add_argument('--agreement-store', dest='store_path', type=str, default=None, help="Reuse the agreement rows of unchanged TextGrids from this result store (SQLite).")
+    parser.add_argument('--agreement-index', dest='index_path', type=str, default=None, help="Write the phoneme index of the agreement results to this SQLite file.")
+    parser.add_argument('--agreement-ci', dest='ci_path', type=str, default=None, help="Write bootstrap confidence intervals of the error rates to this CSV file.")
+    parser.add_argument('--agreement-confusions', dest='confusion_path', type=str, default=None, help="Write the phoneme confusions to this CSV file.")
+    parser.add_argument('--force', action='store_true', help="Re-run every step, even when it is up to date.")
+    parser.add_argument('--dry-run', action='store_true', help="Only print the steps that would run.")
+    parser.add_argument('--log-level', type=str, default="WARNING", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="Logging level of the processing steps.")
+    parser.add_argument('--timings', type=str, default=None, help="Write the per-stage timing summary of the run to this JSON file.")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    outcome = run_pipeline(args.corpus_root, state_path=args.state_path, manifest_path=args.manifest_path, steps=args.steps, workers=args.workers,
+                           children_types=args.children_types, bands=args.bands, agreement_directory=args.agreement_directory,
+                           ground_truth_path=args.ground_truth_path, force=args.force, dry_run=args.dry_run, keep_cropped=args.keep_cropped,
+                           streaming=args.streaming, keep_resampled=args.keep_resampled, cache_directory=args.cache_directory,
+                           res_type=args.resampler,
+                           agreement_options={"store_path": args.store_path, "index_path": args.index_path, "ci_path": args.ci_path,
+                                              "confusion_path": args.confusion_path})
+    if args.timings:
+        write_summary(args.timings, corpus_root=args.corpus_root, workers=args.workers, steps=args.steps)
+
+    statuses = [status for _, _, status, _ in outcome]
+    print(f"\n{statuses.count('ok')} step(s) run, {statuses.count('skipped')} up to date, {statuses.count('pending')} pending, "
+          f"{statuses.count('failed')} failed, {statuses.count('blocked')} blocked.")
+    failures = [(key, name, error) for key, name, status, error in outcome if status == "failed"]
+    if failures:
+        for key, name, error in failures:
+            print(f"--- {key} [{name}]\n{error}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+assign_syllables (bisect over a TierIndex) against the nested loop extract_syllables used before, which compared
+every word with every syllable.
+"""
+
+import random
+
+import pytest
+
+from common.textgrid_io import IntervalTier, TextGrid, write_textgrid, read_textgrid
+from data_prepprocessing import preprocessing_audio
+from data_prepprocessing.preprocessing_audio import TierIndex, assign_syllables, index_tiers
+from benchmarks.synthetic_corpus import generate_corpus
+
+
+def nested_loop_syllables(word_index, syllable_index, VOT=0):
+    """The original pairing: every syllable is tested against every non-empty word."""
+    syllable_results = []
+    for word_interval in range(len(word_index)):
+        if word_index.marks[word_interval] == "":
+            continue
+        word_interval_start = word_index.starts[word_interval]
+        word_interval_end = word_index.ends[word_interval]
+        flag = 0
+        for syllable_interval in range(len(syllable_index)):
+            syllable_start = syllable_index.starts[syllable_interval]
+            syllable_end = syllable_index.ends[syllable_interval]
+            mark = syllable_index.marks[syllable_interval]
+            if syllable_start == word_interval_start and syllable_end < word_interval_end:
+                flag = 1
+                syllable_results.append({"start": syllable_start - VOT, "stop": syllable_end, "utterance": mark})
+            elif syllable_end == word_interval_end and syllable_start > word_interval_start:
+                syllable_results.append({"start": syllable_start, "stop": syllable_end + VOT, "utterance": mark})
+            elif syllable_start > word_interval_start and syllable_start < word_interval_end:
+                syllable_results.append({"start": syllable_start, "stop": syllable_end, "utterance": mark})
+        if flag == 0:
+            syllable_results.append({"start": word_interval_start - VOT, "stop": word_interval_end + VOT,
+                                     "utterance": word_index.marks[word_interval]})
+    return syllable_results
+
+
+def tier_index(name, entries):
+    return TierIndex(name, [entry[0] for entry in entries], [entry[1] for entry in entries], [entry[2] for entry in entries])
+
+
+EDGE_CASES = {
+    # syllables sharing both edges of their word, a one-syllable word, and a syllable starting exactly at a word end
+    "exact_boundaries": (
+        [(0, 0.5, ""), (0.5, 1.0, "cat"), (1.0, 1.5, "a"), (1.5, 2.0, "")],
+        [(0, 0.5, ""), (0.5, 0.7, "ca"), (0.7, 1.0, "at"), (1.0, 1.5, "a"), (1.5, 2.0, "")],
+    ),
+    # edges a few microseconds apart, unrounded: the word is kept whole and its syllables fall inside it
+    "sub_1e-5_offsets": (
+        [(0, 1.0000012, ""), (1.0000012, 1.6, "cat"), (1.6, 1.9999991, "dog"), (1.9999991, 3, "")],
+        [(0, 1.0000031, ""), (1.0000031, 1.3, "ca"), (1.3, 1.6000004, "at"), (1.6000004, 1.9999991, "dog"), (1.9999991, 3, "")],
+    ),
+    # a syllable starting before its word, one crossing the word end, and a word without syllables
+    "misaligned": (
+        [(0, 1.0, "one"), (1.0, 2.0, "two"), (2.0, 3.0, "three")],
+        [(0, 0.4, "o"), (0.4, 1.2, "ne"), (1.2, 1.6, "t"), (1.6, 3.0, "wo")],
+    ),
+    "no_syllables": ([(0, 1.0, "word")], []),
+    "empty_words": ([(0, 1.0, ""), (1.0, 2.0, "")], [(0, 0.5, "a"), (0.5, 2.0, "b")]),
+}
+
+
+@pytest.mark.parametrize("VOT", [0, 0.02])
+@pytest.mark.parametrize("case", sorted(EDGE_CASES))
+def test_edge_cases(case, VOT):
+    words, syllables = (tier_index(name, entries) for name, entries in zip(("word", "syllable"), EDGE_CASES[case]))
+    assert assign_syllables(words, syllables, VOT) == nested_loop_syllables(words, syllables, VOT)
+
+
+def random_tier(rng, edges, labels):
+    """A tier over consecutive edges, some of its intervals left empty."""
+    return [(start, end, rng.choice(labels) if rng.random() < 0.7 else "") for start, end in zip(edges, edges[1:])]
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_random_tiers(seed):
+    rng = random.Random(seed)
+    grid = sorted({round(rng.uniform(0, 10), 2) for _ in range(30)} | {0.0, 10.0})
+    words = random_tier(rng, grid[::3] + ([grid[-1]] if (len(grid) - 1) % 3 else []), ["cat", "dog", "sun"])
+    # syllable edges: the word edges (some shifted by less than 1e-5) plus edges inside the words
+    syllable_edges = set(grid)
+    for edge in grid[::3]:
+        if rng.random() < 0.2:
+            syllable_edges.discard(edge)
+            syllable_edges.add(edge + rng.choice([-1, 1]) * rng.uniform(1e-7, 1e-5))
+    syllables = random_tier(rng, sorted(syllable_edges), ["ca", "at", "do", "og"])
+    words, syllables = tier_index("word", words), tier_index("syllable", syllables)
+    for VOT in (0, 0.02):
+        assert assign_syllables(words, syllables, VOT) == nested_loop_syllables(words, syllables, VOT)
+
+
+def test_synthetic_corpus(tmp_path):
+    for item in generate_corpus(str(tmp_path), 2, 2, 20, 10):
+        for tg in (read_textgrid(item["textgrid_path"]), preprocessing_audio.read_boundary_textgrid(item["textgrid_path"])):
+            tiers = index_tiers(tg)
+            assert assign_syllables(tiers[0], tiers[1], 0.02) == nested_loop_syllables(tiers[0], tiers[1], 0.02)
+
+
+@pytest.mark.parametrize("format", ["long", "short"])
+def test_parsed_edge_cases(tmp_path, format):
+    path = str(tmp_path / "recording.TextGrid")
+    for words, syllables in EDGE_CASES.values():
+        write_textgrid(TextGrid(tiers=[IntervalTier.from_entries("word", words), IntervalTier.from_entries("syllable", syllables)]), path, format)
+        for tg in (read_textgrid(path), preprocessing_audio.read_boundary_textgrid(path)):
+            tiers = index_tiers(tg)
+            assert assign_syllables(tiers[0], tiers[1]) == nested_loop_syllables(tiers[0], tiers[1])
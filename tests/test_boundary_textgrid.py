@@ -0,0 +1,104 @@
+"""
+The word and syllable boundaries of preprocessing_audio against the textgrid package reader it replaced
+(textgrid.TextGrid.fromFile, which rounds times to 5 decimals and keeps labels as written).
+"""
+
+import pytest
+
+from common.textgrid_io import IntervalTier, TextGrid, write_textgrid
+from data_prepprocessing import preprocessing_audio
+from benchmarks.synthetic_corpus import generate_corpus
+
+textgrid = pytest.importorskip("textgrid")
+
+
+def textgrid_package_syllables(textgrid_file_path, VOT=0):
+    """extract_syllables as it was written against the textgrid package."""
+    tg = textgrid.TextGrid.fromFile(textgrid_file_path)
+    syllable_results = []
+    for word_interval in range(len(tg[0])):
+        if tg[0][word_interval].mark == "":
+            continue
+        word_interval_start = tg[0][word_interval].minTime
+        word_interval_end = tg[0][word_interval].maxTime
+        flag = 0
+        for syllable_interval in range(len(tg[1])):
+            syllable = tg[1][syllable_interval]
+            if syllable.minTime == word_interval_start and syllable.maxTime < word_interval_end:
+                flag = 1
+                syllable_results.append({"start": syllable.minTime - VOT, "stop": syllable.maxTime, "utterance": syllable.mark})
+            elif syllable.maxTime == word_interval_end and syllable.minTime > word_interval_start:
+                syllable_results.append({"start": syllable.minTime, "stop": syllable.maxTime + VOT, "utterance": syllable.mark})
+            elif syllable.minTime > word_interval_start and syllable.minTime < word_interval_end:
+                syllable_results.append({"start": syllable.minTime, "stop": syllable.maxTime, "utterance": syllable.mark})
+        if flag == 0:
+            syllable_results.append({"start": word_interval_start - VOT, "stop": word_interval_end + VOT, "utterance": tg[0][word_interval].mark})
+    return syllable_results
+
+
+def textgrid_package_words(textgrid_file_path, VOT=0):
+    """extract_words as it was written against the textgrid package."""
+    tg = textgrid.TextGrid.fromFile(textgrid_file_path)
+    word_results = []
+    for word_interval in range(len(tg[2])):
+        if tg[2][word_interval].mark == "":
+            continue
+        word = tg[0][word_interval]
+        if '/' in word.mark:
+            word.mark = word.mark.split('/')[1]
+        word_results.append({"start": tg[2][word_interval].minTime - VOT, "stop": tg[2][word_interval].maxTime + VOT, "utterance": word.mark})
+    return word_results
+
+
+def write_tiers(path, tiers, format="long"):
+    write_textgrid(TextGrid(tiers=[IntervalTier.from_entries(name, entries) for name, entries in tiers]), str(path), format)
+    return str(path)
+
+
+# A word starting 1.2 microseconds after a round time and its first syllable 3.1 microseconds after it: the
+# textgrid package rounds both to 1.0, so the syllable opens the word and gets the VOT padding.
+OFFSET_TIERS = [
+    ("word", [(0, 1.0000012, ""), (1.0000012, 1.6, "cat/ kat"), (1.6, 2.4, " dog "), (2.4, 3, "")]),
+    ("syllable", [(0, 1.0000031, ""), (1.0000031, 1.3, "ca"), (1.3, 1.6, " at"), (1.6, 2.0, "do"), (2.0, 2.4, "og"), (2.4, 3, "")]),
+    ("phonetic", [(0, 1.0000012, ""), (1.0000012, 1.6, "kæt"), (1.6, 2.4, "dɒɡ"), (2.4, 3, "")]),
+]
+
+# Exact boundaries, a syllable ending a word 4 microseconds early and an interval rounded away to nothing
+EDGE_TIERS = [
+    ("word", [(0, 0.5, ""), (0.5, 1.25, "sun"), (1.25, 1.25004, ""), (1.25004, 2.0, "moon"), (2.0, 2.5, "")]),
+    ("syllable", [(0, 0.5, ""), (0.5, 1.25, "sun"), (1.25, 1.250002, ""), (1.250002, 1.6, "mo"), (1.6, 1.999996, "on"),
+                  (1.999996, 2.5, "")]),
+    ("phonetic", [(0, 0.5, ""), (0.5, 1.25, "sʌn"), (1.25, 1.25004, ""), (1.25004, 2.0, "mun"), (2.0, 2.5, "")]),
+]
+
+
+@pytest.mark.parametrize("format", ["long", "short"])
+@pytest.mark.parametrize("tiers", [OFFSET_TIERS, EDGE_TIERS], ids=["offsets", "edges"])
+@pytest.mark.parametrize("VOT", [0, 0.02])
+def test_boundaries_match_textgrid_package(tmp_path, tiers, format, VOT):
+    path = write_tiers(tmp_path / "recording.TextGrid", tiers, format)
+    assert preprocessing_audio.extract_syllables(path, VOT) == textgrid_package_syllables(path, VOT)
+    assert preprocessing_audio.extract_words(path, VOT) == textgrid_package_words(path, VOT)
+
+
+def test_offset_syllable_opens_its_word(tmp_path):
+    path = write_tiers(tmp_path / "recording.TextGrid", OFFSET_TIERS)
+    syllables = preprocessing_audio.extract_syllables(path, VOT=0.02)
+    assert [syllable["utterance"] for syllable in syllables] == ["ca", " at", "do", "og"]
+    assert syllables[0]["start"] == pytest.approx(0.98)
+    assert [word["utterance"] for word in preprocessing_audio.extract_words(path)] == [" kat", " dog "]
+
+
+def test_parse_boundary_textgrid_matches_read(tmp_path):
+    path = write_tiers(tmp_path / "recording.TextGrid", OFFSET_TIERS)
+    with open(path, encoding="utf-8") as f:
+        parsed = preprocessing_audio.parse_boundary_textgrid(f.read())
+    assert preprocessing_audio.syllables_from_textgrid(parsed, 0.02) == textgrid_package_syllables(path, 0.02)
+    assert preprocessing_audio.words_from_textgrid(parsed, 0.02) == textgrid_package_words(path, 0.02)
+
+
+def test_synthetic_corpus_matches_textgrid_package(tmp_path):
+    for item in generate_corpus(str(tmp_path), 2, 2, 20, 10):
+        path = item["textgrid_path"]
+        assert preprocessing_audio.extract_syllables(path, 0.02) == textgrid_package_syllables(path, 0.02)
+        assert preprocessing_audio.extract_words(path, 0.02) == textgrid_package_words(path, 0.02)
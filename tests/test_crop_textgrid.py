@@ -0,0 +1,51 @@
+"""
+crop_windows crops each window once and shifts that crop to zero; the result must be the TextGrid a second crop
+with rebase_to_zero=True gives, down to the written text.
+"""
+
+import os
+import random
+
+import pytest
+
+from common.textgrid_io import IntervalTier, PointTier, TextGrid, format_textgrid, read_textgrid
+from data_prepprocessing import crop_textgrid
+from benchmarks.synthetic_corpus import generate_corpus
+
+
+def random_textgrid(rng):
+    edges = sorted({round(rng.uniform(0, 30), rng.choice([2, 5, 9])) for _ in range(60)} | {0.0, 30.0})
+    intervals = [(start, end, rng.choice(["", "a", "bɑ", "t͡s"])) for start, end in zip(edges, edges[1:])]
+    points = sorted({rng.uniform(0, 30) for _ in range(20)})
+    return TextGrid(tiers=[IntervalTier.from_entries("phonetic", intervals),
+                           PointTier.from_entries("events", [(time, "x") for time in points], 0.0, 30.0)])
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_rebased_copy_matches_rebased_crop(seed):
+    rng = random.Random(seed)
+    tg = random_textgrid(rng)
+    windows = [tuple(sorted((rng.uniform(0, 30), rng.uniform(0, 30)))) for _ in range(30)]
+    windows += list(zip(tg[0].starts.tolist(), tg[0].ends.tolist()))
+    for (start, end), (cropped_tg, rebased_tg) in zip(windows, crop_textgrid.crop_windows(tg, windows)):
+        assert format_textgrid(cropped_tg) == format_textgrid(tg.crop(start, end))
+        assert format_textgrid(rebased_tg) == format_textgrid(tg.crop(start, end, rebase_to_zero=True))
+        assert format_textgrid(rebased_tg, "short") == format_textgrid(tg.crop(start, end, rebase_to_zero=True), "short")
+
+
+def test_crop_textgrid_outputs(tmp_path):
+    for item in generate_corpus(str(tmp_path / "corpus"), 1, 2, 20, 10):
+        tg = crop_textgrid.load_textgrid_file(item["textgrid_path"])
+        rebased_directory, cropped_directory = str(tmp_path / "rebased"), str(tmp_path / "cropped")
+        crop_textgrid.crop_textgrid(tg, "phonetic", rebased_directory, item["participant_id"], item["audio_id"], cropped_directory)
+        labels = crop_textgrid.get_labels_from_word_tier(tg)
+        phonetic = tg.get_tier("phonetic")
+        # a repeated word overwrites its earlier crops, so each file holds the last window of its label
+        windows = {label: (start, end) for label, start, end in zip(labels, phonetic.starts.tolist(), phonetic.ends.tolist())}
+        for label, (start, end) in windows.items():
+            filename = f"{item['participant_id']}_{item['audio_id']}_{label}.TextGrid"
+            with open(os.path.join(cropped_directory, filename), encoding="utf-8") as f:
+                assert f.read() == format_textgrid(tg.crop(start, end))
+            with open(os.path.join(rebased_directory, filename), encoding="utf-8") as f:
+                assert f.read() == format_textgrid(tg.crop(start, end, rebase_to_zero=True))
+            assert read_textgrid(os.path.join(rebased_directory, filename)).xmin == 0
@@ -0,0 +1,80 @@
+"""
+The batched edit distance of edit_distance against jiwer, which the agreement rates must match exactly.
+"""
+
+import math
+import random
+
+import pytest
+
+from data_analysis.edit_distance import HITS, SUBSTITUTIONS, DELETIONS, INSERTIONS, compare_with_jiwer, pairwise_error_rates
+
+jiwer = pytest.importorskip("jiwer")
+
+# single- and multi-character IPA tokens, with diacritics and ties
+PHONEMES = ["p", "b", "t", "d", "k", "ɡ", "m", "n", "ŋ", "s", "ʃ", "tʃ", "dʒ", "θ", "ð", "aɪ", "eɪ", "oʊ", "ɑː", "iː", "ə", "ɪ", "ʊ",
+            "æ", "ɛ", "ʌ", "ɹ", "l", "w", "j", "pʰ", "tʰ", "kʰ", "ɾ", "ʔ", "t͡s", "ɚ"]
+
+
+def random_pairs(seed, count=300, max_length=12):
+    rng = random.Random(seed)
+    references, hypotheses = [], []
+    for _ in range(count):
+        reference = [rng.choice(PHONEMES) for _ in range(rng.randint(1, max_length))]
+        # a hypothesis close to the reference (edits of it) or unrelated
+        if rng.random() < 0.7:
+            hypothesis = list(reference)
+            for _ in range(rng.randint(0, 4)):
+                position = rng.randint(0, len(hypothesis))
+                operation = rng.choice(["substitute", "delete", "insert"])
+                if operation == "insert" or not hypothesis:
+                    hypothesis.insert(position, rng.choice(PHONEMES))
+                elif operation == "delete":
+                    del hypothesis[min(position, len(hypothesis) - 1)]
+                else:
+                    hypothesis[min(position, len(hypothesis) - 1)] = rng.choice(PHONEMES)
+        else:
+            hypothesis = [rng.choice(PHONEMES) for _ in range(rng.randint(0, max_length))]
+        references.append(reference)
+        hypotheses.append(hypothesis)
+    return references, hypotheses
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_sequences_match_jiwer(seed):
+    references, hypotheses = random_pairs(seed)
+    assert compare_with_jiwer(references, hypotheses) == []
+
+
+EDGE_CASES = [
+    (["k", "æ", "t"], ["k", "æ", "t"]),                 # equal sequences
+    (["k", "æ", "t"], []),                              # empty hypothesis
+    (["tʃ", "iː", "z"], ["t", "ʃ", "iː", "z"]),         # a multi-character token against its pieces
+    (["aɪ", "s", "k", "ɹ", "iː", "m"], ["aɪ", "s", "kʰ", "ɹ", "i", "m"]),
+    (["b"], ["p", "b", "p"]),                           # insertions on both sides
+    (["b a"], ["b", "a"]),                              # elements split on whitespace, as jiwer does
+    ([" m ", "uː", "n"], ["m", "uː", "n"]),             # elements stripped, as jiwer does
+]
+
+
+def test_edge_cases_match_jiwer():
+    references, hypotheses = map(list, zip(*EDGE_CASES))
+    assert compare_with_jiwer(references, hypotheses) == []
+
+
+def test_empty_reference_is_nan():
+    rates, counts = pairwise_error_rates([[], ["k"]], [["k", "æ"], ["k"]])
+    assert math.isnan(rates[0])
+    assert counts[0].tolist() == [0, 0, 0, 2]
+    assert rates[1] == 0.0
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_counts_match_jiwer_process_words(seed):
+    references, hypotheses = random_pairs(seed + 100)
+    references, hypotheses = references + [pair[0] for pair in EDGE_CASES], hypotheses + [pair[1] for pair in EDGE_CASES]
+    _, counts = pairwise_error_rates(references, hypotheses)
+    for reference, hypothesis, count in zip(references, hypotheses, counts.tolist()):
+        output = jiwer.process_words(" ".join(reference), " ".join(hypothesis))
+        assert (count[SUBSTITUTIONS], count[DELETIONS], count[INSERTIONS]) == (output.substitutions, output.deletions, output.insertions)
+        assert count[HITS] == output.hits